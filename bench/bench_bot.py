@@ -0,0 +1,270 @@
+"""
+Benchmark de extremo a extremo del bot sin red: genera un árbol de recetas
+sintético, crea la aplicación con los mismos manejadores que 'main()' y un Bot
+cuyas peticiones HTTP responde una API de Telegram simulada en local, y
+reproduce sesiones de usuarios (/start, categoría, página siguiente, búsqueda,
+envío de receta, búsqueda inline tecla a tecla y reseteo).
+
+Informa de la latencia p50/p99 por tipo de actualización, de las
+actualizaciones por segundo y de las llamadas a la API por actualización.
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_bot.py --pdfs 1000 --usuarios 50 --sesiones 5
+    python bench/bench_bot.py --pdfs 100000 --sin-indice --latencia-api 30
+    UPDATE_QUEUE_SHED_THRESHOLD=50 python bench/bench_bot.py --rafaga 10 --latencia-api 20
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [os.path.join(RAIZ, "src"), RAIZ, os.path.dirname(os.path.abspath(__file__))]
+from pdf_sintetico import INGREDIENTES, PLATOS, crear_arbol_recetas, percentil  # noqa: E402
+
+BOT_ID = 999
+
+# Tipo de actualización que se está procesando (para atribuirle las llamadas a la API)
+_tipo_actual: contextvars.ContextVar = contextvars.ContextVar("tipo_actual", default="otro")
+
+
+def crear_peticion_local(latencia: float):
+    """
+    Crea la petición HTTP simulada. Se define dentro de una función porque
+    telegram solo se puede importar después de preparar el entorno.
+    """
+    from telegram.request import BaseRequest
+
+    class PeticionLocal(BaseRequest):
+        """API de Telegram simulada: responde a cada método como lo haría Telegram."""
+
+        def __init__(self) -> None:
+            self.llamadas = defaultdict(int)
+            self.llamadas_por_tipo = defaultdict(int)
+            self.ultimo_mensaje = {}
+            self._ids = itertools.count(1000)
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self) -> None:
+            pass
+
+        async def shutdown(self) -> None:
+            pass
+
+        def _mensaje(self, chat_id, message_id=None, **campos):
+            message_id = message_id or next(self._ids)
+            self.ultimo_mensaje[chat_id] = message_id
+            return {"message_id": message_id, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"}, **campos}
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                             connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit("/", 1)[-1]
+            self.llamadas[endpoint] += 1
+            self.llamadas_por_tipo[_tipo_actual.get()] += 1
+            if latencia:
+                await asyncio.sleep(latencia)
+
+            datos = request_data.parameters if request_data else {}
+            chat_id = datos.get("chat_id")
+            if endpoint == "getMe":
+                resultado = {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+            elif endpoint == "sendDocument":
+                n = next(self._ids)
+                resultado = self._mensaje(chat_id, document={"file_id": f"F{n}", "file_unique_id": f"U{n}"})
+            elif endpoint == "sendMediaGroup":
+                resultado = [self._mensaje(chat_id, document={"file_id": f"F{n}", "file_unique_id": f"U{n}"})
+                             for n in (next(self._ids) for _ in datos.get("media", []))]
+            elif endpoint.startswith(("send", "copy", "forward")) and endpoint != "sendChatAction":
+                resultado = self._mensaje(chat_id, text=datos.get("text", ""))
+            elif endpoint.startswith("edit"):
+                resultado = self._mensaje(chat_id, datos.get("message_id"), text=datos.get("text", ""))
+            else:
+                resultado = True
+            return 200, json.dumps({"ok": True, "result": resultado}).encode()
+
+    return PeticionLocal()
+
+
+def actualizacion_mensaje(update_id, chat_id, user_id, texto):
+    """Update con un mensaje de texto (o un comando si empieza por '/')."""
+    mensaje = {"message_id": update_id, "date": int(time.time()), "text": texto,
+               "chat": {"id": chat_id, "type": "private"},
+               "from": {"id": user_id, "is_bot": False, "first_name": "Bench"}}
+    if texto.startswith("/"):
+        mensaje["entities"] = [{"type": "bot_command", "offset": 0, "length": len(texto.split()[0])}]
+    return {"update_id": update_id, "message": mensaje}
+
+
+def actualizacion_boton(update_id, chat_id, user_id, data, message_id):
+    """Update con la pulsación de un botón de un mensaje del bot."""
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": str(chat_id), "data": data,
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+        "message": {"message_id": message_id, "date": int(time.time()), "text": "menú",
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"}}}}
+
+
+def actualizacion_inline(update_id, user_id, texto):
+    """Update con una consulta inline ('@bot texto')."""
+    return {"update_id": update_id, "inline_query": {
+        "id": str(update_id), "query": texto, "offset": "",
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench"}}}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=1000, help="número de PDF sintéticos (1k-100k)")
+    parser.add_argument("--categorias", type=int, default=20, help="número de categorías")
+    parser.add_argument("--usuarios", type=int, default=50, help="usuarios simulados a la vez")
+    parser.add_argument("--sesiones", type=int, default=5, help="sesiones completas por usuario")
+    parser.add_argument("--latencia-api", type=float, default=0, help="ms que tarda cada llamada simulada")
+    parser.add_argument("--sin-indice", action="store_true", help="no indexar el texto de los PDF")
+    parser.add_argument("--con-miniaturas", action="store_true",
+                        help="dibujar las miniaturas antes de medir y pedir una vista previa en cada sesión")
+    parser.add_argument("--con-todas", action="store_true",
+                        help="pedir en cada sesión todas las recetas de la categoría (álbumes de 10)")
+    parser.add_argument("--rafaga", type=int, default=0,
+                        help="búsquedas que cada usuario escribe seguidas, sin esperar, antes de pulsar un botón")
+    parser.add_argument("--con-limites", action="store_true",
+                        help="mantener los límites de envío reales (si no, se desactivan)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    inicio = time.perf_counter()
+    crear_arbol_recetas(os.path.join(tmp.name, "recetas"), args.pdfs, args.categorias)
+    print(f"Generados {args.pdfs} PDF en {time.perf_counter() - inicio:.1f} s")
+
+    # settings usa la ruta relativa 'recetas' y lee su configuración del entorno
+    os.chdir(tmp.name)
+    # Cada usuario simulado tiene su id (las búsquedas inline se ordenan y agrupan por usuario) y se
+    # autoriza en el archivo de usuarios; settings exige además los tres del .env
+    usuarios = os.path.join(tmp.name, "usuarios_autorizados.txt")
+    with open(usuarios, "w") as f:
+        f.writelines(f"{10000 + n}\n" for n in range(args.usuarios))
+    os.environ.update({
+        "TELEGRAM_TOKEN": "123:bench", "USER_ID_R": "1", "USER_ID_C": "2", "USER_ID_E": "3",
+        "AUTHORIZED_USERS_FILE": usuarios,
+        "CACHE_DIR": os.path.join(tmp.name, "cache"), "LOG_FILE": os.path.join(tmp.name, "bot.log"),
+        "SERVING_MODE": "polling", "METRICS_PORT": "0", "PROGRESS_MODE": "accion", "LOG_SAMPLE_RATE": "0",
+    })
+    if not args.con_limites:
+        os.environ.update({"RATE_LIMIT_GLOBAL": "1e9", "RATE_LIMIT_CHAT": "1e9", "RATE_LIMIT_CHAT_BURST": "1e9"})
+
+    import logging
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder
+    import bot
+    from catalogo import catalogo
+    from indice_texto import indice_texto
+    from miniaturas import miniaturas
+    from variantes import variantes_pdf
+
+    # Los registros INFO de cada actualización falsearían las medidas
+    logging.getLogger("TelegramBot").setLevel(logging.WARNING)
+
+    if not args.sin_indice:
+        inicio = time.perf_counter()
+        indice_texto.actualizar(catalogo.base_dir)
+        print(f"Índice de texto construido en {time.perf_counter() - inicio:.1f} s")
+    if args.con_miniaturas:
+        inicio = time.perf_counter()
+        miniaturas.actualizar(catalogo.base_dir)
+        print(f"Miniaturas dibujadas en {time.perf_counter() - inicio:.1f} s")
+    # Así los manejadores no lanzan una indexación en segundo plano durante la medida
+    indice_texto.version_catalogo = catalogo.version
+    miniaturas.version_catalogo = catalogo.version
+    variantes_pdf.version_catalogo = catalogo.version
+
+    peticion = crear_peticion_local(args.latencia_api / 1000)
+    app = bot.crear_aplicacion(ApplicationBuilder().token("123:bench").request(peticion)
+                               .get_updates_request(crear_peticion_local(0)))
+    await app.initialize()
+    llamadas_iniciales = sum(peticion.llamadas.values())
+
+    latencias = defaultdict(list)
+    update_ids = itertools.count(1)
+    categorias = catalogo.categorias()
+
+    async def procesar(tipo, datos):
+        _tipo_actual.set(tipo)
+        update = Update.de_json(datos, app.bot)
+        inicio = time.perf_counter()
+        # Por el mismo camino que en producción: el procesador ordena por chat y limita la concurrencia
+        await app.update_processor.process_update(update, app.process_update(update))
+        latencias[tipo].append((time.perf_counter() - inicio) * 1000)
+
+    async def usuario(n):
+        rng = random.Random(n)
+        chat_id = 10000 + n
+        user_id = chat_id
+        for _ in range(args.sesiones):
+            categoria = rng.choice(categorias)
+            id_categoria = catalogo.ids.id_categoria(categoria)
+            receta = rng.choice(catalogo.recetas(categoria))
+            ultimo = lambda: peticion.ultimo_mensaje.get(chat_id, 1)  # noqa: E731
+            await procesar("start", actualizacion_mensaje(next(update_ids), chat_id, user_id, "/start"))
+            await procesar("categoria", actualizacion_boton(next(update_ids), chat_id, user_id,
+                                                            f"categoria|{id_categoria}", ultimo()))
+            await procesar("pagina", actualizacion_boton(next(update_ids), chat_id, user_id,
+                                                         f"categoria|{id_categoria}|1", ultimo()))
+            if args.con_miniaturas:
+                await procesar("vista", actualizacion_boton(next(update_ids), chat_id, user_id,
+                                                            f"vista|{catalogo.ids.id_receta(categoria, receta)}",
+                                                            ultimo()))
+            if args.con_todas:
+                await procesar("todas", actualizacion_boton(next(update_ids), chat_id, user_id,
+                                                            f"todas|{id_categoria}", ultimo()))
+            if args.rafaga:
+                # Varias búsquedas seguidas y un botón sin esperar las respuestas: se agrupan o se descartan
+                # las búsquedas y el botón no debería esperar a las de los demás usuarios
+                rafaga = [procesar("rafaga", actualizacion_mensaje(next(update_ids), chat_id, user_id,
+                                                                   f"{rng.choice(PLATOS)} {i}".lower()))
+                          for i in range(args.rafaga)]
+                await asyncio.gather(*rafaga, procesar("boton", actualizacion_boton(
+                    next(update_ids), chat_id, user_id, f"categoria|{id_categoria}", ultimo())))
+            consulta = f"{rng.choice(PLATOS)} {rng.choice(INGREDIENTES)}".lower()
+            await procesar("busqueda", actualizacion_mensaje(next(update_ids), chat_id, user_id, consulta))
+            await procesar("receta", actualizacion_boton(next(update_ids), chat_id, user_id,
+                                                         f"receta|{catalogo.ids.id_receta(categoria, receta)}",
+                                                         ultimo()))
+            # Telegram manda una consulta inline por cada tecla
+            for n in range(3, len(consulta) + 1):
+                await procesar("inline", actualizacion_inline(next(update_ids), user_id, consulta[:n]))
+            await procesar("reset", actualizacion_boton(next(update_ids), chat_id, user_id, "reset", ultimo()))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(usuario(n) for n in range(args.usuarios)))
+    total = time.perf_counter() - inicio
+    await app.shutdown()
+
+    n_updates = sum(len(v) for v in latencias.values())
+    n_llamadas = sum(peticion.llamadas.values()) - llamadas_iniciales
+    print(f"{n_updates} actualizaciones en {total:.2f} s: {n_updates / total:.1f} actualizaciones/s, "
+          f"{n_llamadas / n_updates:.2f} llamadas a la API por actualización")
+    todas = [x for v in latencias.values() for x in v]
+    print(f"{'total':>10}: p50 {percentil(todas, 50):7.2f} ms, p99 {percentil(todas, 99):7.2f} ms")
+    for tipo, valores in latencias.items():
+        print(f"{tipo:>10}: p50 {percentil(valores, 50):7.2f} ms, p99 {percentil(valores, 99):7.2f} ms, "
+              f"{peticion.llamadas_por_tipo[tipo] / len(valores):.2f} llamadas/actualización")
+    if app.update_processor.descartadas:
+        print("Descartadas: " + ", ".join(f"{m} {n}" for m, n in sorted(app.update_processor.descartadas.items())))
+    print("Llamadas por método: " + ", ".join(f"{e} {n}" for e, n in sorted(peticion.llamadas.items())))
+    os.chdir(RAIZ)
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark del buscador aproximado de títulos: tiempo de construcción del índice
+de trigramas y latencia por consulta (con tildes omitidas y erratas).
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_buscador.py --titulos 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), "..", "src"), os.path.join(os.path.dirname(__file__), "..")]
+from pdf_sintetico import INGREDIENTES, PLATOS, percentil, titulos_sinteticos  # noqa: E402
+from buscador import BuscadorRecetas  # noqa: E402
+from texto import normalizar  # noqa: E402
+
+
+def con_errata(palabra: str, rng: random.Random) -> str:
+    """Quita las tildes y, a veces, elimina o duplica una letra."""
+    palabra = normalizar(palabra)
+    if len(palabra) > 4 and rng.random() < 0.5:
+        i = rng.randrange(1, len(palabra) - 1)
+        palabra = palabra[:i] + palabra[i + 1:] if rng.random() < 0.5 else palabra[:i] + palabra[i] + palabra[i:]
+    return palabra
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titulos", type=int, default=50000, help="número de títulos sintéticos")
+    parser.add_argument("--consultas", type=int, default=5000, help="número de búsquedas a medir")
+    parser.add_argument("--limite", type=int, default=20, help="resultados por búsqueda")
+    args = parser.parse_args()
+
+    recetas = [(f"Categoria {i % 20:03d}", titulo + ".pdf") for i, titulo in enumerate(titulos_sinteticos(args.titulos))]
+
+    inicio = time.perf_counter()
+    buscador = BuscadorRecetas(recetas)
+    print(f"Índice de {len(recetas)} títulos construido en {time.perf_counter() - inicio:.2f} s")
+
+    rng = random.Random(1)
+    consultas = []
+    for _ in range(args.consultas):
+        palabras = [rng.choice(PLATOS), rng.choice(INGREDIENTES)][:rng.randint(1, 2)]
+        consultas.append(" ".join(con_errata(p, rng) for p in palabras))
+
+    tiempos = []
+    sin_resultados = 0
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultados = buscador.buscar(consulta, args.limite)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        sin_resultados += not resultados
+    print(f"Búsquedas ({len(consultas)}): p50 {percentil(tiempos, 50):.3f} ms, "
+          f"p99 {percentil(tiempos, 99):.3f} ms, máx {max(tiempos):.3f} ms, sin resultados: {sin_resultados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark del índice de texto: tiempo de construcción (completa e incremental)
+y latencia de las búsquedas sobre un árbol de PDF sintéticos.
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_indice_texto.py --pdfs 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), "..", "src"), os.path.join(os.path.dirname(__file__), "..")]
+from pdf_sintetico import INGREDIENTES, crear_arbol_recetas, percentil  # noqa: E402
+
+# settings exige estas variables aunque el benchmark no habla con Telegram
+for variable in ("TELEGRAM_TOKEN", "USER_ID_R", "USER_ID_C", "USER_ID_E"):
+    os.environ.setdefault(variable, "0")
+
+from indice_texto import IndiceTexto  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=10000, help="número de PDF sintéticos")
+    parser.add_argument("--categorias", type=int, default=20, help="número de categorías")
+    parser.add_argument("--consultas", type=int, default=2000, help="número de búsquedas a medir")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos para extraer el texto")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = os.path.join(tmp, "recetas")
+        inicio = time.perf_counter()
+        crear_arbol_recetas(base_dir, args.pdfs, args.categorias)
+        print(f"Generados {args.pdfs} PDF en {time.perf_counter() - inicio:.1f} s")
+
+        indice = IndiceTexto(os.path.join(tmp, "indice_texto.json"))
+
+        inicio = time.perf_counter()
+        indice.actualizar(base_dir, args.procesos)
+        print(f"Construcción completa:   {time.perf_counter() - inicio:8.2f} s")
+
+        inicio = time.perf_counter()
+        indice.actualizar(base_dir, args.procesos)
+        print(f"Actualización sin cambios: {time.perf_counter() - inicio:6.2f} s")
+
+        # Modificar el 1 % de los archivos para medir la reindexación incremental
+        categoria = sorted(os.listdir(base_dir))[0]
+        for nombre in sorted(os.listdir(os.path.join(base_dir, categoria)))[:max(1, args.pdfs // 100)]:
+            ruta = os.path.join(base_dir, categoria, nombre)
+            with open(ruta, "ab") as f:
+                f.write(b"\n% modificado\n")
+        inicio = time.perf_counter()
+        reindexados = indice.actualizar(base_dir, args.procesos)
+        print(f"Reindexación de {reindexados} PDF:  {time.perf_counter() - inicio:6.2f} s")
+
+        inicio = time.perf_counter()
+        recargado = IndiceTexto(indice.ruta_indice)
+        print(f"Carga del índice en disco: {time.perf_counter() - inicio:6.2f} s")
+
+        rng = random.Random(1)
+        consultas = [" ".join(rng.sample(INGREDIENTES, rng.randint(1, 3))) for _ in range(args.consultas)]
+        tiempos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            recargado.buscar(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"Búsquedas ({len(consultas)}): p50 {percentil(tiempos, 50):.3f} ms, "
+              f"p99 {percentil(tiempos, 99):.3f} ms, máx {max(tiempos):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
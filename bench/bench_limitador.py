@@ -0,0 +1,119 @@
+"""
+Simulación del limitador de envíos con un reloj simulado (no hace llamadas reales
+ni espera tiempo real): lanza a la vez una limpieza masiva y respuestas
+interactivas en muchos chats, inyecta un RetryAfter y comprueba los límites.
+
+Uso (desde la raíz del repositorio):
+    python bench/bench_limitador.py --chats 20 --mensajes 5 --borrados 200
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import os
+import sys
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), "..", "src"), os.path.join(os.path.dirname(__file__), "..")]
+from telegram.error import RetryAfter  # noqa: E402
+from limitador import LimitadorEnvios, PRIORIDAD_LIMPIEZA  # noqa: E402
+from pdf_sintetico import percentil  # noqa: E402
+
+
+class RelojSimulado:
+    """
+    Reloj virtual: 'dormir' no espera tiempo real, sino que deja la corrutina
+    dormida hasta que 'ejecutar' adelanta el reloj hasta su hora de despertar.
+    """
+
+    def __init__(self) -> None:
+        self.t = 0.0
+        self._dormidos = []
+        self._orden = itertools.count()
+
+    def ahora(self) -> float:
+        return self.t
+
+    async def dormir(self, segundos: float) -> None:
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._dormidos, (self.t + max(segundos, 0.0), next(self._orden), futuro))
+        await futuro
+
+    async def ejecutar(self, tareas) -> None:
+        """Avanza el reloj de despertar en despertar hasta que terminan todas las tareas."""
+        while not all(t.done() for t in tareas):
+            # Dejar que todo lo que puede avanzar sin esperar avance
+            for _ in range(50):
+                await asyncio.sleep(0)
+            while self._dormidos and self._dormidos[0][2].done():
+                heapq.heappop(self._dormidos)
+            if not self._dormidos:
+                continue
+            t, _, futuro = heapq.heappop(self._dormidos)
+            self.t = max(self.t, t)
+            futuro.set_result(None)
+
+
+def max_en_ventana(instantes, ventana=1.0):
+    """Número máximo de instantes que caen dentro de cualquier ventana de 'ventana' segundos."""
+    instantes = sorted(instantes)
+    maximo, inicio = 0, 0
+    for fin, t in enumerate(instantes):
+        while t - instantes[inicio] >= ventana:
+            inicio += 1
+        maximo = max(maximo, fin - inicio + 1)
+    return maximo
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20, help="chats con respuestas interactivas")
+    parser.add_argument("--mensajes", type=int, default=5, help="mensajes seguidos por chat")
+    parser.add_argument("--borrados", type=int, default=200, help="delete_message de la limpieza")
+    parser.add_argument("--retry-after", type=int, default=2, help="segundos del RetryAfter inyectado")
+    args = parser.parse_args()
+
+    reloj = RelojSimulado()
+    limitador = LimitadorEnvios(ritmo_global=30, rafaga_global=3, ritmo_chat=1, rafaga_chat=3,
+                                reloj=reloj.ahora, dormir=reloj.dormir)
+    await limitador.initialize()
+
+    llamadas = []  # (instante, endpoint, chat_id)
+    retry_pendiente = [True]
+
+    async def api(endpoint, chat_id):
+        # El RetryAfter se inyecta a mitad de la carga
+        if len(llamadas) == 50 and retry_pendiente[0]:
+            retry_pendiente[0] = False
+            raise RetryAfter(args.retry_after)
+        llamadas.append((reloj.ahora(), endpoint, chat_id))
+
+    latencias = {"interactiva": [], "limpieza": []}
+
+    async def llamar(endpoint, chat_id, prioridad, tipo):
+        inicio = reloj.ahora()
+        await limitador.process_request(api, (endpoint, chat_id), {}, endpoint, {"chat_id": chat_id}, prioridad)
+        latencias[tipo].append(reloj.ahora() - inicio)
+
+    tareas = [asyncio.ensure_future(llamar("deleteMessage", 1, PRIORIDAD_LIMPIEZA, "limpieza"))
+              for _ in range(args.borrados)]
+    tareas += [asyncio.ensure_future(llamar("sendMessage", 100 + chat, None, "interactiva"))
+               for chat in range(args.chats) for _ in range(args.mensajes)]
+    await reloj.ejecutar(tareas)
+    await limitador.shutdown()
+
+    instantes = [t for t, _, _ in llamadas]
+    por_chat = max(max_en_ventana([t for t, e, c in llamadas if c == chat and e == "sendMessage"])
+                   for chat in range(100, 100 + args.chats))
+    print(f"Llamadas: {len(llamadas)} en {reloj.ahora():.2f} s simulados")
+    maximo_global = max_en_ventana(instantes)
+    print(f"Máximo en 1 s: global {maximo_global} (límite 30, ráfaga 3 incluida), "
+          f"por chat {por_chat} (ritmo 1 + ráfaga 3)")
+    # Telegram responde con 429 si algún segundo pasa de ~30 llamadas
+    assert maximo_global <= 30, f"el límite global se supera: {maximo_global} llamadas en 1 s"
+    for tipo, valores in latencias.items():
+        print(f"Espera {tipo}: p50 {percentil(valores, 50):.2f} s, p99 {percentil(valores, 99):.2f} s")
+    print(f"Hueco tras el RetryAfter de {args.retry_after} s: {instantes[50] - instantes[49]:.2f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Envía actualizaciones de Telegram (JSON grabados o sintéticos) al servidor del webhook
+del bot y mide cuánto tarda en aceptarlas. Sirve para probar el modo webhook en local.
+
+Arrancar antes el bot con SERVING_MODE=webhook y el mismo WEBHOOK_SECRET. Uso:
+    python bench/bench_webhook.py --url http://127.0.0.1:8443/recetas --secreto XXX
+    python bench/bench_webhook.py --url ... --secreto XXX --update update.json --peticiones 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from pdf_sintetico import percentil
+
+
+def update_sintetico(update_id: int, user_id: int) -> dict:
+    """Crea un Update con un mensaje de texto (una búsqueda) de un usuario."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "lentejas",
+        },
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="URL local del webhook")
+    parser.add_argument("--secreto", required=True, help="valor de WEBHOOK_SECRET")
+    parser.add_argument("--update", help="archivo JSON con un Update grabado (si no, se usa uno sintético)")
+    parser.add_argument("--usuario", type=int, default=1, help="id del usuario de los Update sintéticos")
+    parser.add_argument("--peticiones", type=int, default=100, help="número de Update a enviar")
+    parser.add_argument("--concurrencia", type=int, default=10, help="peticiones simultáneas")
+    args = parser.parse_args()
+
+    grabado = None
+    if args.update:
+        with open(args.update, encoding="utf-8") as f:
+            grabado = json.load(f)
+
+    cabeceras = {"X-Telegram-Bot-Api-Secret-Token": args.secreto}
+    async with httpx.AsyncClient(timeout=30) as cliente:
+        # Sin el token secreto el servidor tiene que rechazar la petición
+        respuesta = await cliente.post(args.url, json=update_sintetico(0, args.usuario))
+        print(f"Petición sin token secreto: HTTP {respuesta.status_code}")
+
+        semaforo = asyncio.Semaphore(args.concurrencia)
+        tiempos, errores = [], 0
+
+        async def enviar(update_id: int) -> None:
+            nonlocal errores
+            update = dict(grabado, update_id=update_id) if grabado else update_sintetico(update_id, args.usuario)
+            async with semaforo:
+                inicio = time.perf_counter()
+                respuesta = await cliente.post(args.url, json=update, headers=cabeceras)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                errores += respuesta.status_code != 200
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(enviar(i) for i in range(1, args.peticiones + 1)))
+        total = time.perf_counter() - inicio
+
+    print(f"Update enviados ({args.peticiones}) en {total:.2f} s: p50 {percentil(tiempos, 50):.2f} ms, "
+          f"p99 {percentil(tiempos, 99):.2f} ms, errores: {errores}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
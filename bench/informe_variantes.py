@@ -0,0 +1,56 @@
+"""
+Genera las versiones optimizadas de los PDF que falten (lo mismo que hace el
+bot en segundo plano) y muestra cuántos bytes se ahorran por categoría.
+
+Uso (desde la raíz del repositorio, con el .env del bot):
+    python bench/informe_variantes.py
+    python bench/informe_variantes.py --sin-actualizar
+"""
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path[:0] = [os.path.join(RAIZ, "src"), RAIZ]
+
+
+def mb(n):
+    """Formatea un número de bytes en MB."""
+    return f"{n / 2 ** 20:.1f} MB"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procesos", type=int, default=None, help="procesos para optimizar (por defecto, uno por CPU)")
+    parser.add_argument("--sin-actualizar", action="store_true", help="solo mostrar el informe de lo ya optimizado")
+    args = parser.parse_args()
+
+    from settings import BASE_DIR
+    from variantes import variantes_pdf
+
+    if not variantes_pdf.activas:
+        print("Para optimizar los PDF hacen falta pypdf y Pillow")
+        return 1
+    if not args.sin_actualizar:
+        inicio = time.perf_counter()
+        procesados = variantes_pdf.actualizar(BASE_DIR, args.procesos)
+        print(f"{procesados} PDF procesados en {time.perf_counter() - inicio:.1f} s "
+              f"(versiones en '{variantes_pdf.dir_variantes}')")
+
+    informe = variantes_pdf.informe()
+    print(f"{'categoría':<25} {'optimizadas':>11} {'originales':>12} {'enviados':>12} {'ahorro':>7}")
+    total_optimizadas = total_originales = total_enviados = 0
+    for categoria, (optimizadas, originales, enviados) in sorted(informe.items()):
+        print(f"{categoria:<25} {optimizadas:>11} {mb(originales):>12} {mb(enviados):>12} "
+              f"{100 * (1 - enviados / originales) if originales else 0:>6.1f}%")
+        total_optimizadas += optimizadas
+        total_originales += originales
+        total_enviados += enviados
+    print(f"{'total':<25} {total_optimizadas:>11} {mb(total_originales):>12} {mb(total_enviados):>12} "
+          f"{100 * (1 - total_enviados / total_originales) if total_originales else 0:>6.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
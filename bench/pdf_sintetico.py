@@ -0,0 +1,131 @@
+"""
+Generación de árboles de recetas sintéticos (categorías con PDF mínimos pero válidos)
+para los benchmarks, y utilidades comunes a todos ellos.
+"""
+import os
+import random
+from typing import List
+
+INGREDIENTES = [
+    "lentejas", "garbanzos", "alubias", "chorizo", "morcilla", "costilla", "pollo", "ternera",
+    "cerdo", "bacalao", "merluza", "lubina", "gambas", "patata", "cebolla", "ajo", "zanahoria",
+    "pimiento", "tomate", "acelga", "espinacas", "calabacín", "berenjena", "arroz", "macarrones",
+    "huevo", "naranja", "limón", "laurel", "comino", "pimentón", "azafrán", "perejil", "orégano",
+    "aceite", "vinagre", "sal", "pimienta", "nata", "queso", "jamón", "setas", "puerro", "apio",
+]
+
+PLATOS = ["Guiso", "Ensalada", "Crema", "Estofado", "Potaje", "Revuelto", "Tortilla", "Asado",
+          "Puré", "Salteado", "Sopa", "Pastel", "Caldo", "Fritura", "Hervido"]
+
+
+def crear_pdf(texto: str) -> bytes:
+    """
+    Crea un PDF de una página con el texto indicado (una línea por cada salto de línea).
+
+    Parameters
+    ----------
+    texto : str
+        Texto de la página.
+
+    Returns
+    -------
+    bytes
+        Contenido del PDF.
+    """
+    lineas = []
+    for linea in texto.split("\n"):
+        linea = linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        lineas.append(f"({linea}) Tj T*")
+    contenido = ("BT /F1 11 Tf 14 TL 50 780 Td " + " ".join(lineas) + " ET").encode("latin-1")
+
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(contenido)).encode() + b" >>\nstream\n" + contenido + b"\nendstream",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for i, objeto in enumerate(objetos, 1):
+        posiciones.append(len(pdf))
+        pdf += f"{i} 0 obj\n".encode() + objeto + b"\nendobj\n"
+    inicio_xref = len(pdf)
+    pdf += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for posicion in posiciones:
+        pdf += f"{posicion:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def titulos_sinteticos(n: int, semilla: int = 0) -> List[str]:
+    """
+    Genera n títulos de receta distintos, del estilo "Guiso de lentejas con chorizo 12".
+
+    Parameters
+    ----------
+    n : int
+        Número de títulos.
+    semilla : int
+        Semilla del generador aleatorio.
+
+    Returns
+    -------
+    List[str]
+        Títulos sin extensión.
+    """
+    rng = random.Random(semilla)
+    return [f"{rng.choice(PLATOS)} de {rng.choice(INGREDIENTES)} con {rng.choice(INGREDIENTES)} {i}"
+            for i in range(n)]
+
+
+def crear_arbol_recetas(base_dir: str, n_pdfs: int, n_categorias: int = 20, semilla: int = 0) -> None:
+    """
+    Crea un árbol 'base_dir/Categoria N/<titulo>.pdf' con PDF sintéticos.
+
+    Parameters
+    ----------
+    base_dir : str
+        Directorio raíz que se crea.
+    n_pdfs : int
+        Número total de PDF.
+    n_categorias : int
+        Número de categorías entre las que se reparten.
+    semilla : int
+        Semilla del generador aleatorio.
+
+    Returns
+    -------
+    None
+    """
+    rng = random.Random(semilla)
+    categorias = [f"Categoria {i:03d}" for i in range(n_categorias)]
+    for categoria in categorias:
+        os.makedirs(os.path.join(base_dir, categoria), exist_ok=True)
+    for i, titulo in enumerate(titulos_sinteticos(n_pdfs, semilla)):
+        ingredientes = rng.sample(INGREDIENTES, 8)
+        texto = titulo + "\nIngredientes:\n" + "\n".join(ingredientes) + "\nPreparación:\nMezclar y cocinar."
+        ruta = os.path.join(base_dir, categorias[i % n_categorias], titulo + ".pdf")
+        with open(ruta, "wb") as f:
+            f.write(crear_pdf(texto))
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """
+    Devuelve el percentil p de una lista de valores (el valor en esa posición, sin interpolar).
+
+    Parameters
+    ----------
+    valores : List[float]
+        Valores medidos (no hace falta que estén ordenados).
+    p : float
+        Percentil (0-100).
+
+    Returns
+    -------
+    float
+        Valor del percentil.
+    """
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
@@ -1,25 +1,123 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+from dotenv import load_dotenv
+
+
+# Campos que los manejadores pueden pasar con 'extra' y que se incluyen en los registros JSON
+CAMPOS_EXTRA = ("user_id", "handler", "latency_ms")
+
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro como una línea JSON (con los campos extra que tenga)."""
+
+    def format(self, record):
+        """
+        Parameters
+        ----------
+        record : logging.LogRecord
+            Registro a formatear.
+
+        Returns
+        -------
+        str
+            Línea JSON.
+        """
+        datos = {
+            "time": self.formatTime(record),
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for campo in CAMPOS_EXTRA:
+            if hasattr(record, campo):
+                datos[campo] = getattr(record, campo)
+        if record.exc_info:
+            datos["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False)
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar solo una parte de los registros marcados con extra={"muestrear": True}
+    (eventos muy frecuentes, como las búsquedas). El resto pasan siempre.
+    """
+
+    def __init__(self, proporcion):
+        """
+        Parameters
+        ----------
+        proporcion : float
+            Fracción (0-1) de los registros marcados que se conservan.
+
+        Returns
+        -------
+        None
+        """
+        super().__init__()
+        self.proporcion = proporcion
+
+    def filter(self, record):
+        """
+        Parameters
+        ----------
+        record : logging.LogRecord
+            Registro a filtrar.
+
+        Returns
+        -------
+        bool
+            True si el registro se conserva.
+        """
+        return not getattr(record, "muestrear", False) or random.random() < self.proporcion
 
 
 def setup_logger():
-    """Configuración de logging. 
+    """Configuración de logging.
+
+    Los manejadores solo meten los registros en una cola; un hilo aparte
+    (QueueListener) los escribe en consola y en el archivo, de modo que
+    registrar algo nunca bloquea el bucle de eventos con escrituras a disco.
+    El archivo rota por tamaño o por tiempo. Se configura con variables de
+    entorno (o del archivo .env):
+
+    - LOG_FILE: ruta del archivo (por defecto 'log/bot.log').
+    - LOG_ROTATION: 'size' (por defecto) o 'time'.
+    - LOG_MAX_BYTES / LOG_BACKUP_COUNT: tamaño máximo y copias que se guardan.
+    - LOG_WHEN: cuándo rota con LOG_ROTATION=time (p. ej. 'midnight').
+    - LOG_FORMAT: 'text' (por defecto) o 'json'.
+    - LOG_SAMPLE_RATE: fracción de los eventos frecuentes que se registran.
 
     Parameters
     ----------
-    None 
-    
+    None
+
     Returns
     -------
     logger
         El logger ya configurado y listo para usar.
     """
+    # El logger se crea antes que settings, así que lee el .env por su cuenta
+    load_dotenv()
+
     logger = logging.getLogger("TelegramBot")  # Usamos un nombre específico para el logger
     logger.setLevel(logging.INFO)  # Configuramos el nivel global
 
     # Manejador para los logs en archivo
     # log_file = '../log/bot.log' <- Para server
-    log_file = 'log/bot.log'
-    file_handler = logging.FileHandler(log_file)
+    log_file = os.getenv('LOG_FILE', 'log/bot.log')
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    if os.getenv('LOG_ROTATION', 'size') == 'time':
+        file_handler = logging.handlers.TimedRotatingFileHandler(log_file, when=os.getenv('LOG_WHEN', 'midnight'),
+                                                                 backupCount=backup_count, encoding="utf-8")
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 << 20))),
+                                                            backupCount=backup_count, encoding="utf-8")
     file_handler.setLevel(logging.INFO)  # Puedes personalizar el nivel para cada manejador
 
     # Manejador para mostrar logs en consola
@@ -27,13 +125,24 @@ def setup_logger():
     console_handler.setLevel(logging.INFO)
 
     # Formato de los logs
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if os.getenv('LOG_FORMAT', 'text') == 'json':
+        formatter = FormateadorJSON()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Agregar los manejadores al logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # El logger solo encola; el QueueListener escribe en los manejadores desde su hilo.
+    # El muestreo se aplica antes de encolar, así los registros descartados no cuestan nada más
+    cola = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(cola)
+    queue_handler.addFilter(FiltroMuestreo(float(os.getenv('LOG_SAMPLE_RATE', '1'))))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(cola, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # Al salir se vacía la cola antes de terminar
+    atexit.register(listener.stop)
 
     return logger
 
@@ -42,4 +151,4 @@ def setup_logger():
 # llamar a la función desde otros archivos. Así conseguimos que
 # se cree una única vez y se utilice en todo el programa (si no,
 # se crearía un logger cada que se llama a la función setup_logger())
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
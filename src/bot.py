@@ -1,14 +1,33 @@
 import sys
 import os
+from typing import List, Optional, Tuple
 # Agregar el directorio raíz al sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+from telegram.constants import ChatAction
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes, InlineQueryHandler, MessageHandler, TypeHandler, ApplicationHandlerStop, filters
 from telegram.error import BadRequest
 from settings import *
+from catalogo import catalogo
+from busqueda_inline import PREFIJO_ENLACE_RECETA, buscar_inline, resultados_inline
+from cache_archivos import cache_file_id, enviar_documento, enviar_documentos
+from cache_lru import cache_busquedas
+from disco import leer_archivo, stat as stat_async
+from indice_texto import indice_texto
+from limitador import LimitadorEnvios, PRIORIDAD_ENVIO_MASIVO, PRIORIDAD_LIMPIEZA
+from metricas import metricas
+from miniaturas import miniaturas
+from persistencia import PersistenciaSQLite
+from procesador import ProcesadorPorChat
+from registro_mensajes import registro_mensajes
+from teclados import cache_teclados
+from texto import clave_consulta
+from usuarios import usuarios_autorizados
+from variantes import variantes_pdf
 from log.logger import logger
 import asyncio
+import time
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -27,7 +46,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     None
     """
     user_id = update.effective_user.id
-    logger.info(f"Usuario {user_id} ejecutó /start")
+    logger.info(f"Usuario {user_id} ejecutó /start", extra={"user_id": user_id, "handler": "start"})
 
     # Limpiar el chat: eliminar el mensaje anterior si existe
     if update.message:
@@ -36,51 +55,24 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         except Exception as e:
             logger.error(f"No se pudo eliminar el mensaje anterior: {e}")
 
-    if user_id in AUTHORIZED_USERS:
-        # Verificamos si update.message está disponible, si no, usamos query.message
-        if update.message:
-            await update.message.reply_text(WELCOME_MESSAGE, parse_mode="Markdown")
-        else:
-            # Si update.message es None, se puede usar query.message (cuando el comando es desde un callback)
-            # pero prefiero que no muestre ningún mensaje, porque este caso se da cuando el usuario 'vuelve'
-            # al menú principal:
-            # await update.callback_query.message.reply_text(f"🍽 *EPA* 🍽\n\n¿Qué receta buscas?", parse_mode="Markdown")
-            pass
-    else:
-        logger.warning(f"Usuario no autorizado {user_id} intentó iniciar el bot")
-        await update.message.reply_text(UNAUTHORIZED_MESSAGE)
-        # Si el usuario no está autorizado no se continúa
+    # Enlace de un resultado de la búsqueda inline: se envía directamente la receta pedida
+    if context.args and context.args[0].startswith(PREFIJO_ENLACE_RECETA):
+        await enviar_receta_enlace(update, context, context.args[0][len(PREFIJO_ENLACE_RECETA):])
         return
 
-    # Obtener las categorías (subdirectorios en BASE_DIR)
-    # categorias = [d for d in os.listdir(BASE_DIR) if os.path.isdir(os.path.join(BASE_DIR, d))]
-
-    # Obtener todas las categorías asegurando que estén ordenadas
-    categorias = sorted(
-        [d for d in os.listdir(BASE_DIR) if os.path.exists(os.path.join(BASE_DIR, d)) and os.path.isdir(os.path.join(BASE_DIR, d))],
-        key=lambda x: x.lower()
-    )
+    # Verificamos si update.message está disponible, si no, usamos query.message
+    if update.message:
+        await update.message.reply_text(WELCOME_MESSAGE, parse_mode="Markdown")
+    else:
+        # Si update.message es None, se puede usar query.message (cuando el comando es desde un callback)
+        # pero prefiero que no muestre ningún mensaje, porque este caso se da cuando el usuario 'vuelve'
+        # al menú principal:
+        # await update.callback_query.message.reply_text(f"🍽 *EPA* 🍽\n\n¿Qué receta buscas?", parse_mode="Markdown")
+        pass
 
-    # # Crear botones para cada categoría en una columna
-    # keyboard = [[InlineKeyboardButton(categoria.capitalize(), callback_data=f"categoria|{categoria}")]
-    #             for categoria in categorias]
-
-    # Creo el menú con doble botonera
-    keyboard = []
-    row = []
-    for i, categoria in enumerate(categorias, 1):
-        row.append(InlineKeyboardButton(f"📂 {categoria.capitalize()}", callback_data=f"categoria|{categoria}"))
-        if i % 2 == 0:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-
-    # Agregar un botón para buscar recetas y el botón de reiniciar
-    keyboard.append([InlineKeyboardButton("🔍 Buscar recetas", callback_data="buscar_recetas")])
-    keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Menú con las categorías del catálogo en memoria (se construye solo cuando cambian las recetas)
+    await catalogo.refrescar_async()
+    reply_markup = cache_teclados.menu_principal()
 
     # Verificamos nuevamente si update.message está disponible (venimos de inicio)
     if update.message:
@@ -88,61 +80,98 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     else:
         # Si no, usamos query.message (venimos de 'volver' en el menú)
         await update.callback_query.message.reply_text("Selecciona una categoría o busca una receta (usa palabras representativas)", reply_markup=reply_markup)
-        keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
 
 
-async def mostrar_recetas(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+def programar_actualizaciones() -> None:
     """
-    Muestra las recetas disponibles en una categoría seleccionada.
+    Si ha cambiado el catálogo o hace tiempo del último repaso (para ver los
+    PDF sobrescritos), pone al día en segundo plano el índice de texto, las
+    miniaturas y las versiones optimizadas (nunca se hace mientras se
+    atiende al usuario).
 
     Parameters
     ----------
-    update : Update
-        Objeto de actualización de Telegram.
-    context : ContextTypes.DEFAULT_TYPE
-        Contexto de ejecución del bot.
+    None
 
     Returns
     -------
     None
     """
-    query = update.callback_query
-    await query.answer()
+    for indice in (indice_texto, miniaturas, variantes_pdf):
+        if indice.pendiente(catalogo.version):
+            indice.programar_actualizacion(BASE_DIR, catalogo.version)
 
-    # Obtener la categoría seleccionada del callback_data
-    _, categoria = query.data.split("|")
-    categoria_path = os.path.join(BASE_DIR, categoria)
 
-    # Listar los archivos PDF en la categoría seleccionada
-    # recetas = [f for f in os.listdir(categoria_path) if f.endswith(".pdf")]
-    # Lo mismo pero con las recetas ordenadas
-    recetas = sorted([f for f in os.listdir(categoria_path) if f.endswith(".pdf")], key=lambda x: x.lower())
+def ids_callback(data: str, maximo: int = 1) -> Optional[List[int]]:
+    """
+    Lee los números que siguen al prefijo de un callback_data ('receta|12',
+    'categoria|3|1'...).
 
-    # Crear una estructura de teclado que simule un submenú con los botones desplazados a la derecha
-    keyboard = []
+    Los botones que ya estaban en los chats antes de usar identificadores
+    llevan nombres ('categoria|Postres', 'receta|Postres|flan.pdf'): se tratan
+    igual que un identificador que ya no existe.
 
-    # Agregar una fila con un espacio vacío al principio para "desplazar" los botones
-    for receta in recetas:
-        # Agregar una columna vacía al principio para desplazar los botones a la derecha
-        row = [InlineKeyboardButton(f" - {receta.replace('.pdf', '').capitalize()}",
-                                    callback_data=f"receta|{categoria}|{receta}")]
-        keyboard.append(row)
+    Parameters
+    ----------
+    data : str
+        callback_data del botón pulsado.
+    maximo : int
+        Números que puede llevar como mucho (al menos lleva uno).
 
-    # Agregar un botón para volver al menú principal
-    keyboard.append([InlineKeyboardButton("⬅️ Volver al menú principal", callback_data="volver")])
-    keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
+    Returns
+    -------
+    Optional[List[int]]
+        Los números, o None si el formato no es el esperado.
+    """
+    partes = data.split("|")[1:]
+    if not 1 <= len(partes) <= maximo or not all(parte.isdigit() for parte in partes):
+        return None
+    return [int(parte) for parte in partes]
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    # Editar el mensaje anterior para mostrar las recetas disponibles
-    await query.edit_message_text(f"📂 *Recetas en la categoría* _{categoria.capitalize()}_:",
-                                  reply_markup=reply_markup, parse_mode="Markdown")
+def version_busquedas() -> tuple:
+    """
+    Devuelve la versión de los datos de los que dependen los resultados de
+    búsqueda: cambia cuando cambian las recetas o el índice de texto.
 
+    Parameters
+    ----------
+    None
 
-async def enviar_receta(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    Returns
+    -------
+    tuple
+        Versiones del catálogo y del índice de texto.
     """
-    Envía el archivo PDF de la receta seleccionada. Muestra una barra de progreso
-    animada para que el usuario entienda que se está descargando.
+    return catalogo.version, indice_texto.version
+
+
+def buscar_recetas(clave: str) -> tuple:
+    """
+    Busca recetas por nombre y por contenido, usando la caché de búsquedas.
+
+    Parameters
+    ----------
+    clave : str
+        Consulta normalizada (ver texto.clave_consulta).
+
+    Returns
+    -------
+    tuple
+        Pares (categoria, receta): primero los que coinciden por nombre, de
+        más a menos parecido, y después los que contienen la consulta en su texto.
+    """
+    def calcular() -> tuple:
+        resultados = catalogo.buscar(clave, SEARCH_LIMIT)
+        vistos = set(resultados)
+        return tuple(resultados + [r for r in indice_texto.buscar(clave, SEARCH_LIMIT) if r not in vistos])
+
+    return cache_busquedas.obtener(("texto", clave), version_busquedas(), calcular)
+
+
+async def mostrar_recetas(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Muestra las recetas disponibles en una categoría seleccionada.
 
     Parameters
     ----------
@@ -158,10 +187,46 @@ async def enviar_receta(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     query = update.callback_query
     await query.answer()
 
-    # Obtener la categoría y el nombre del archivo PDF del callback_data
-    _, categoria, receta_pdf = query.data.split("|")
-    receta_path = os.path.join(BASE_DIR, categoria, receta_pdf)
+    # Obtener la categoría (y la página, si se viene de los botones de navegación) del callback_data
+    ids = ids_callback(query.data, 2)
+    await catalogo.refrescar_async()
+    categoria = catalogo.categoria_por_id(ids[0]) if ids else None
+    pagina = ids[1] if ids and len(ids) > 1 else 0
+    if categoria is None:
+        await query.edit_message_text("Esta categoría ya no existe. Vuelve a empezar con /start")
+        return
+
+    # Solo se construye el teclado de la página visible (y se reutiliza si ya se construyó antes)
+    programar_actualizaciones()
+    reply_markup, pagina, total_paginas = cache_teclados.pagina_categoria(categoria, pagina)
+
+    titulo = f"📂 *Recetas en la categoría* _{categoria.capitalize()}_:"
+    if total_paginas > 1:
+        titulo += f" ({pagina + 1}/{total_paginas})"
+
+    # Editar el mensaje anterior para mostrar las recetas disponibles
+    try:
+        await query.edit_message_text(titulo, reply_markup=reply_markup, parse_mode="Markdown")
+    except BadRequest as e:
+        # Pulsar dos veces el mismo botón no cambia el mensaje y Telegram lo rechaza
+        if "not modified" not in str(e):
+            raise
+
+
+async def animar_progreso(query) -> None:
+    """
+    Muestra una barra de progreso simulada (5 segundos y 10 ediciones del mensaje).
+    Solo se usa si PROGRESS_MODE = "animacion".
 
+    Parameters
+    ----------
+    query : CallbackQuery
+        Consulta del botón pulsado, cuyo mensaje se edita.
+
+    Returns
+    -------
+    None
+    """
     # Mensaje inicial con barra vacía
     progress_template = "Preparando receta: [{bar}] {percent}%"
     progress_bar = "░░░░░░░░░░"  # 10 bloques vacíos
@@ -176,6 +241,79 @@ async def enviar_receta(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await asyncio.sleep(0.5)  # Pequeño retraso para la animación
         await message.edit_text(progress_template.format(bar=step, percent=(i + 1) * 10))
 
+
+async def rutas_envio(categoria: str, receta: str, original: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    Devuelve el PDF que se envía de una receta (la versión optimizada si existe
+    y corresponde al original actual, y si no, el original) y su miniatura,
+    si corresponde al original actual.
+
+    Parameters
+    ----------
+    categoria : str
+        Nombre de la categoría.
+    receta : str
+        Nombre del archivo PDF.
+    original : bool
+        Si es True se devuelve siempre el PDF original.
+
+    Returns
+    -------
+    Tuple[str, Optional[str]]
+        Ruta del PDF que se envía y de la miniatura (None si no la hay).
+    """
+    ruta = catalogo.ruta(categoria, receta)
+    optimizada = variantes_pdf.activas and not original
+    if not optimizada and not miniaturas.activas:
+        return ruta, None
+    try:
+        stat = await stat_async(ruta)
+    except OSError:
+        # Se envía el original sin miniatura (y el envío dará el error)
+        return ruta, None
+    variante = variantes_pdf.ruta(categoria, receta, stat) if optimizada else None
+    return variante or ruta, miniaturas.ruta(categoria, receta, stat)
+
+
+async def enviar_receta(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Envía el archivo PDF de la receta seleccionada. Mientras se envía, Telegram
+    muestra al usuario el indicador de "enviando archivo" (o la barra de progreso
+    animada si PROGRESS_MODE = "animacion").
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    query = update.callback_query
+    await query.answer()
+
+    # Obtener la categoría y el nombre del archivo PDF a partir del identificador del callback_data
+    ids = ids_callback(query.data)
+    await catalogo.refrescar_async()
+    receta = catalogo.receta_por_id(ids[0]) if ids else None
+    if receta is None:
+        await query.edit_message_text("Esta receta ya no existe. Vuelve a empezar con /start")
+        return
+    categoria, receta_pdf = receta
+
+    if PROGRESS_MODE == "animacion":
+        await animar_progreso(query)
+    else:
+        # Se quita el teclado (para evitar pulsaciones repetidas) y se activa el indicador
+        # de subida; el indicador desaparece en cuanto llega el documento
+        await asyncio.gather(
+            query.edit_message_text(f"📤 Enviando receta: {receta_pdf.replace('.pdf', '').capitalize()}"),
+            context.bot.send_chat_action(chat_id=query.message.chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+        )
+
     # Crear botón para volver al menú principal
     # keyboard = [[InlineKeyboardButton("⬅️ Volver al menú principal", callback_data="volver")]]
     keyboard = [
@@ -184,15 +322,190 @@ async def enviar_receta(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    # Enviar el archivo PDF después de completar la "descarga"
+    # Enviar el archivo PDF
     try:
-        await context.bot.send_document(chat_id=query.message.chat_id, document=open(receta_path, "rb"))
+        # Se envía la versión optimizada si la hay, y si la receta ya se subió antes,
+        # se reutiliza su file_id en lugar de subir el PDF de nuevo
+        receta_path, miniatura = await rutas_envio(categoria, receta_pdf)
+        await enviar_documento(context.bot, query.message.chat_id, receta_path, cache_file_id, miniatura=miniatura)
+        if receta_path != catalogo.ruta(categoria, receta_pdf):
+            # El original sigue disponible si el usuario lo pide
+            keyboard.insert(0, [InlineKeyboardButton("📄 Descargar el original (más pesado)",
+                                                     callback_data=f"original|{id_receta}")])
+            reply_markup = InlineKeyboardMarkup(keyboard)
         await query.message.reply_text("Ya puedes descargar la receta 😊", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error al enviar la receta {receta_pdf}: {e}")
         await query.message.reply_text("❌ Hubo un error al enviar la receta. Inténtalo nuevamente más tarde.", reply_markup=reply_markup)
 
 
+async def enviar_categoria(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Envía todas las recetas de una categoría en álbumes de hasta 10 documentos
+    (una llamada a la API por cada 10 recetas en lugar de una por receta).
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    query = update.callback_query
+    await query.answer()
+
+    ids = ids_callback(query.data)
+    await catalogo.refrescar_async()
+    categoria = catalogo.categoria_por_id(ids[0]) if ids else None
+    if categoria is None:
+        await query.edit_message_text("Esta categoría ya no existe. Vuelve a empezar con /start")
+        return
+    recetas = catalogo.recetas(categoria)
+    chat_id = query.message.chat_id
+    logger.info(f"Usuario {update.effective_user.id} ha pedido las {len(recetas)} recetas de {categoria}",
+                extra={"user_id": update.effective_user.id, "handler": "enviar_categoria"})
+
+    await asyncio.gather(
+        query.edit_message_text(f"📤 Enviando {len(recetas)} recetas de _{categoria.capitalize()}_",
+                                parse_mode="Markdown"),
+        context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+    )
+
+    keyboard = [
+        [InlineKeyboardButton("⬅️ Volver al menú principal", callback_data="volver")],
+        [InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    # Los álbumes van con prioridad baja en el limitador: no retrasan a los demás usuarios
+    try:
+        documentos = [await rutas_envio(categoria, receta) for receta in recetas]
+        await enviar_documentos(context.bot, chat_id, documentos, cache_file_id, rate_limit_args=PRIORIDAD_ENVIO_MASIVO)
+        await query.message.reply_text("Ya puedes descargar las recetas 😊", reply_markup=reply_markup)
+    except Exception as e:
+        logger.error(f"Error al enviar las recetas de {categoria}: {e}")
+        await query.message.reply_text("❌ Hubo un error al enviar las recetas. Inténtalo nuevamente más tarde.",
+                                       reply_markup=reply_markup)
+
+
+async def enviar_original(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Envía el PDF original de una receta (sin optimizar) cuando el usuario lo pide.
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    query = update.callback_query
+    await query.answer()
+
+    ids = ids_callback(query.data)
+    await catalogo.refrescar_async()
+    receta = catalogo.receta_por_id(ids[0]) if ids else None
+    if receta is None:
+        await query.message.reply_text("Esta receta ya no existe. Vuelve a empezar con /start")
+        return
+    categoria, receta_pdf = receta
+
+    await context.bot.send_chat_action(chat_id=query.message.chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+    try:
+        ruta, miniatura = await rutas_envio(categoria, receta_pdf, original=True)
+        await enviar_documento(context.bot, query.message.chat_id, ruta, cache_file_id, miniatura=miniatura)
+    except Exception as e:
+        logger.error(f"Error al enviar el original de la receta {receta_pdf}: {e}")
+        await query.message.reply_text("❌ Hubo un error al enviar la receta. Inténtalo nuevamente más tarde.")
+
+
+async def vista_previa(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Muestra la miniatura de la primera página de una receta, sin enviar el PDF.
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    query = update.callback_query
+    await query.answer()
+
+    ids = ids_callback(query.data)
+    await catalogo.refrescar_async()
+    receta = catalogo.receta_por_id(ids[0]) if ids else None
+    ruta_miniatura = (await rutas_envio(*receta, original=True))[1] if receta else None
+    if ruta_miniatura is None:
+        await query.message.reply_text("La vista previa de esta receta no está disponible.")
+        return
+    titulo = receta[1].replace('.pdf', '').capitalize()
+
+    # La miniatura también se sube una sola vez y luego se reutiliza su file_id
+    try:
+        stat = await stat_async(ruta_miniatura)
+        file_id = cache_file_id.obtener(ruta_miniatura, stat)
+        if file_id:
+            await context.bot.send_photo(query.message.chat_id, photo=file_id, caption=titulo)
+            return
+        message = await context.bot.send_photo(query.message.chat_id, photo=await leer_archivo(ruta_miniatura),
+                                               caption=titulo)
+        if message.photo:
+            cache_file_id.guardar(ruta_miniatura, message.photo[-1].file_id, stat)
+    except Exception as e:
+        logger.error(f"Error al enviar la vista previa de {receta[1]}: {e}")
+        await query.message.reply_text("La vista previa de esta receta no está disponible.")
+
+
+async def enviar_receta_enlace(update: Update, context: ContextTypes.DEFAULT_TYPE, id_receta: str) -> None:
+    """
+    Envía la receta pedida con el enlace de un resultado de la búsqueda inline
+    (las que aún no tienen file_id no se pueden enviar directamente desde el
+    modo inline).
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+    id_receta : str
+        Identificador de la receta que trae el enlace.
+
+    Returns
+    -------
+    None
+    """
+    chat_id = update.effective_chat.id
+    await catalogo.refrescar_async()
+    receta = catalogo.receta_por_id(int(id_receta)) if id_receta.isdigit() else None
+    if receta is None:
+        await context.bot.send_message(chat_id, "Esta receta ya no existe. Vuelve a empezar con /start")
+        return
+    categoria, receta_pdf = receta
+
+    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+    try:
+        receta_path, miniatura = await rutas_envio(categoria, receta_pdf)
+        await enviar_documento(context.bot, chat_id, receta_path, cache_file_id, miniatura=miniatura)
+    except Exception as e:
+        logger.error(f"Error al enviar la receta {receta_pdf}: {e}")
+        await context.bot.send_message(chat_id, "❌ Hubo un error al enviar la receta. Inténtalo nuevamente más tarde.")
+
+
 async def volver_menu_principal(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Vuelve al menú principal desde cualquier parte del bot.
@@ -212,7 +525,8 @@ async def volver_menu_principal(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
 
     user_id = update.effective_user.id
-    logger.info(f"Usuario {user_id} ha vuelto al menú principal.")
+    logger.info(f"Usuario {user_id} ha vuelto al menú principal.",
+                extra={"user_id": user_id, "handler": "volver_menu_principal"})
 
     # Limpiar el chat: eliminar el mensaje anterior si existe
     try:
@@ -221,12 +535,8 @@ async def volver_menu_principal(update: Update, context: ContextTypes.DEFAULT_TY
     except Exception as e:
         logger.error(f"No se pudo eliminar el mensaje anterior: {e}")
 
-    if user_id in AUTHORIZED_USERS:
-        # Reutilizamos el 'context' para enviar el mensaje
-        await start(update, context)
-    else:
-        logger.warning(f"Usuario no autorizado {user_id} intentó volver al menú principal.")
-        await query.message.reply_text(UNAUTHORIZED_MESSAGE)
+    # Reutilizamos el 'context' para enviar el mensaje
+    await start(update, context)
 
 
 async def search_recipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -247,47 +557,31 @@ async def search_recipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = update.effective_user.id
     query = update.message.text.lower()
 
-    if user_id not in AUTHORIZED_USERS:
-        logger.warning(f"Usuario no autorizado {user_id} intentó buscar recetas.")
-        await update.message.reply_text(UNAUTHORIZED_MESSAGE)
-        return
-
-    logger.info(f"Usuario {user_id} busca recetas con: {query}")
+    # Buscar en el catálogo en memoria (resultados ordenados de más a menos parecido)
+    inicio = time.perf_counter()
+    await catalogo.refrescar_async()
 
-    # Obtener todas las categorías (subdirectorios en BASE_DIR)
-    # categorias = [d for d in os.listdir(BASE_DIR) if os.path.isdir(os.path.join(BASE_DIR, d))]
+    # Si han cambiado las recetas, el índice de texto y las miniaturas se ponen al día en segundo plano
+    programar_actualizaciones()
 
-    # Obtener todas las categorías asegurando que también se incluyan carpetas vacías y estén ordenadas
-    categorias = sorted(
-        [d for d in os.listdir(BASE_DIR) if os.path.exists(os.path.join(BASE_DIR, d)) and os.path.isdir(os.path.join(BASE_DIR, d))],
-        key=lambda x: x.lower()
-    )
+    # Por nombre y por contenido (ingredientes, preparación...); las consultas repetidas salen de la caché
+    clave = clave_consulta(query)
+    resultados = buscar_recetas(clave)
 
-    # Buscar recetas que coincidan con la consulta en cada categoría
-    resultados = []
-    for categoria in categorias:
-        categoria_path = os.path.join(BASE_DIR, categoria)
-        for receta in os.listdir(categoria_path):
-            if receta.endswith(".pdf") and query in receta.lower():
-                resultados.append((categoria, receta))
-
-    # Ordena por nombre de receta (ignorando mayúsculas)
-    resultados.sort(key=lambda x: x[1].lower())
+    # Las búsquedas son el evento más frecuente: solo se registra una muestra (LOG_SAMPLE_RATE)
+    logger.info(f"Usuario {user_id} busca recetas con: {query} ({len(resultados)} resultados)",
+                extra={"user_id": user_id, "handler": "search_recipe", "muestrear": True,
+                       "latency_ms": round((time.perf_counter() - inicio) * 1000, 2)})
 
     # Verificar si se encontraron resultados
     if resultados:
-        # Crear botones con los resultados encontrados
-        keyboard = [
-            [InlineKeyboardButton(f" - {receta.replace('.pdf', '').capitalize()}",
-                                 callback_data=f"receta|{categoria}|{receta}")]
-            for categoria, receta in resultados
-        ]
-
-        keyboard.append([InlineKeyboardButton("⬅️ Volver al menú principal", callback_data="volver")])
-        keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(f"📝 Resultados para '{query}':", reply_markup=reply_markup)
+        # Se guarda la consulta para cambiar de página (los resultados están en la caché de búsquedas)
+        context.user_data["busqueda"] = query
+        reply_markup, _, total_paginas = cache_teclados.pagina_busqueda(clave, version_busquedas(), resultados, 0)
+        titulo = f"📝 Resultados para '{query}':"
+        if total_paginas > 1:
+            titulo += f" (1/{total_paginas})"
+        await update.message.reply_text(titulo, reply_markup=reply_markup)
 
     else:
         keyboard = [
@@ -298,6 +592,70 @@ async def search_recipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await update.message.reply_text(f"No se encontraron recetas que coincidan con '{query}'. Puedes seguir buscando o usar los botones:", reply_markup=reply_markup)
 
 
+async def busqueda_inline(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Responde a las búsquedas inline ('@bot lentejas' desde cualquier chat)
+    mientras el usuario escribe.
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    inline_query = update.inline_query
+    await catalogo.refrescar_async()
+    resultados = buscar_inline(inline_query.query)
+    respuesta = await resultados_inline(resultados, cache_file_id, context.bot.username)
+    # is_personal: la respuesta no se comparte con otros usuarios (que podrían no estar autorizados)
+    await inline_query.answer(respuesta, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
+async def paginar_busqueda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Muestra otra página de los resultados de la última búsqueda del usuario.
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    query = update.callback_query
+    await query.answer()
+
+    # La búsqueda se pierde al reiniciar la sesión
+    busqueda = context.user_data.get("busqueda")
+    if busqueda is None:
+        await query.edit_message_text("La búsqueda ha caducado. Escribe de nuevo lo que buscas.")
+        return
+
+    # Las sesiones guardadas antes de la caché de búsquedas tienen (consulta, resultados)
+    texto = busqueda[0] if isinstance(busqueda, tuple) else busqueda
+    clave = clave_consulta(texto)
+    await catalogo.refrescar_async()
+    resultados = buscar_recetas(clave)
+    _, pagina = query.data.split("|")
+    reply_markup, pagina, total_paginas = cache_teclados.pagina_busqueda(clave, version_busquedas(), resultados,
+                                                                         int(pagina))
+    try:
+        await query.edit_message_text(f"📝 Resultados para '{texto}': ({pagina + 1}/{total_paginas})",
+                                      reply_markup=reply_markup)
+    except BadRequest as e:
+        if "not modified" not in str(e):
+            raise
+
+
 async def iniciar_busqueda(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Inicia la búsqueda de recetas cuando el usuario presiona el botón de 'Buscar recetas'.
@@ -317,7 +675,8 @@ async def iniciar_busqueda(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.answer()
 
     user_id = update.effective_user.id
-    logger.info(f"Usuario {user_id} ha iniciado la búsqueda de recetas.")
+    logger.info(f"Usuario {user_id} ha iniciado la búsqueda de recetas.",
+                extra={"user_id": user_id, "handler": "iniciar_busqueda"})
 
     # Limpiar el chat: eliminar el mensaje anterior si existe
     try:
@@ -326,11 +685,7 @@ async def iniciar_busqueda(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     except Exception as e:
         logger.error(f"No se pudo eliminar el mensaje anterior: {e}")
 
-    if user_id in AUTHORIZED_USERS:
-        await query.message.reply_text("Indica alguna palabra representativa de la receta que buscas", parse_mode="Markdown")
-    else:
-        logger.warning(f"Usuario no autorizado {user_id} intentó buscar recetas.")
-        await query.message.reply_text(UNAUTHORIZED_MESSAGE)
+    await query.message.reply_text("Indica alguna palabra representativa de la receta que buscas", parse_mode="Markdown")
 
 
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -353,28 +708,82 @@ async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     user_id = update.effective_user.id
     chat_id = query.message.chat_id
-    logger.info(f"Usuario {user_id} ha solicitado un reseteo completo del chat.")
+    logger.info(f"Usuario {user_id} ha solicitado un reseteo completo del chat.",
+                extra={"user_id": user_id, "handler": "reset"})
 
     # Limpiar los datos almacenados del usuario
     context.user_data.clear()
 
-    # Intentar eliminar los últimos mensajes del bot en paralelo
-    try:
-        message_id = query.message.message_id
-        delete_tasks = []
+    # Borrar exactamente los mensajes registrados del chat, de 100 en 100 (máximo de delete_messages)
+    message_ids = registro_mensajes.extraer(chat_id)
+    if query.message.message_id not in message_ids:
+        message_ids.append(query.message.message_id)
+    for inicio in range(0, len(message_ids), 100):
+        try:
+            await context.bot.delete_messages(chat_id=chat_id, message_ids=message_ids[inicio:inicio + 100],
+                                              rate_limit_args=PRIORIDAD_LIMPIEZA)
+        except BadRequest as e:
+            # Telegram ya omite los mensajes que no existen; esto solo pasa si no se puede borrar ninguno
+            logger.warning(f"No se pudieron borrar los mensajes del chat {chat_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error al intentar limpiar el chat: {e}")
 
-        # Intentamos eliminar los últimos 200 mensajes del bot (ajustable según necesidad)
-        for msg_id in range(message_id, message_id - 200, -1):
-            delete_tasks.append(context.bot.delete_message(chat_id=chat_id, message_id=msg_id))
 
-        # Ejecutamos todas las eliminaciones en paralelo
-        await asyncio.gather(*delete_tasks)
+async def autorizar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Rechaza las actualizaciones de usuarios no autorizados antes de que las
+    procese cualquier otro manejador (así no cuestan lecturas de disco ni
+    llamadas a la API más allá del aviso).
 
-    except BadRequest as e:
-        logger.warning(f"Finalizada limpieza")
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
 
-    except Exception as e:
-        logger.error(f"Error al intentar limpiar el chat: {e}")
+    Returns
+    -------
+    None
+    """
+    user = update.effective_user
+    if user is not None and await usuarios_autorizados.autorizado(user.id):
+        return
+
+    if user is not None:
+        logger.warning(f"Usuario no autorizado {user.id} ha intentado usar el bot",
+                       extra={"user_id": user.id, "handler": "autorizar", "muestrear": True})
+        try:
+            if update.callback_query:
+                await update.callback_query.answer(UNAUTHORIZED_MESSAGE, show_alert=True)
+            elif update.message:
+                await update.message.reply_text(UNAUTHORIZED_MESSAGE)
+            elif update.inline_query:
+                await update.inline_query.answer([], cache_time=0, is_personal=True)
+        except Exception as e:
+            logger.error(f"No se pudo avisar al usuario no autorizado {user.id}: {e}")
+    # Ningún otro manejador procesa la actualización
+    raise ApplicationHandlerStop
+
+
+async def registrar_mensaje(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Anota en el registro de mensajes los que escribe el usuario (los del bot
+    se anotan al enviarlos), para poder borrarlos al reiniciar.
+
+    Parameters
+    ----------
+    update : Update
+        Objeto de actualización de Telegram.
+    context : ContextTypes.DEFAULT_TYPE
+        Contexto de ejecución del bot.
+
+    Returns
+    -------
+    None
+    """
+    if update.message:
+        registro_mensajes.anotar(update.message.chat_id, update.message.message_id)
 
 
 async def info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -429,22 +838,88 @@ async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(help_message, parse_mode="Markdown")
 
 
-def main() -> None:
+async def inicializar(app) -> None:
     """
-    Función principal para ejecutar el bot.
+    Tareas que se ejecutan una vez inicializada la aplicación, antes de recibir actualizaciones.
 
     Parameters
     ----------
+    app : Application
+        Aplicación del bot.
+
+    Returns
+    -------
     None
+    """
+    # Indexar en segundo plano el texto de los PDF nuevos o modificados, dibujar sus miniaturas
+    # y crear sus versiones optimizadas
+    indice_texto.programar_actualizacion(BASE_DIR, catalogo.version)
+    miniaturas.programar_actualizacion(BASE_DIR, catalogo.version)
+    variantes_pdf.programar_actualizacion(BASE_DIR, catalogo.version)
+
+    # Publicar las métricas en local, si están activadas
+    if metricas.activas:
+        await metricas.iniciar_servidor(METRICS_HOST, METRICS_PORT)
+
+
+async def finalizar(app) -> None:
+    """
+    Tareas que se ejecutan al detener la aplicación.
+
+    Parameters
+    ----------
+    app : Application
+        Aplicación del bot.
 
     Returns
     -------
     None
     """
-    logger.info("Iniciando el bot...")
+    # Escribir en disco lo que quede pendiente del registro de mensajes y de la caché de file_id
+    await registro_mensajes.guardar()
+    await cache_file_id.volcar()
+
+    # Cerrar el servidor de métricas para liberar el puerto
+    await metricas.detener_servidor()
 
-    # Crear la aplicación del bot con el token
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+
+def crear_aplicacion(builder: ApplicationBuilder) -> Application:
+    """
+    Crea la aplicación del bot con todos sus manejadores. Se separa de 'main'
+    para que los benchmarks puedan usar los mismos manejadores con un Bot local.
+
+    Parameters
+    ----------
+    builder : ApplicationBuilder
+        Constructor ya configurado con el token (y, en los benchmarks, con la
+        petición HTTP simulada).
+
+    Returns
+    -------
+    Application
+        Aplicación lista para arrancar.
+    """
+    # Todas las llamadas a Telegram pasan por el limitador (límite global, por chat y RetryAfter)
+    # y anota en el registro de mensajes los que se envían y se borran
+    limitador = LimitadorEnvios(RATE_LIMIT_GLOBAL, RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_CHAT, RATE_LIMIT_CHAT_BURST,
+                                RATE_LIMIT_RETRIES, registro=registro_mensajes,
+                                metricas=metricas if metricas.activas else None)
+    builder = builder.post_init(inicializar).post_shutdown(finalizar).rate_limiter(limitador)
+    # user_data, chat_data y bot_data se conservan entre reinicios
+    builder = builder.persistence(PersistenciaSQLite(PERSISTENCE_PATH, PERSISTENCE_INTERVAL))
+    # Los chats distintos se atienden en paralelo y las actualizaciones de un mismo chat, en orden. Los botones
+    # pasan antes que las búsquedas, que se agrupan si llegan seguidas y se descartan si el bot está saturado
+    procesador = ProcesadorPorChat(CONCURRENT_UPDATES, CHAT_QUEUE_LIMIT, UPDATE_QUEUE_LIMIT,
+                                   UPDATE_QUEUE_SHED_THRESHOLD, SEARCH_DEBOUNCE)
+    metricas.procesador = procesador
+    builder = builder.concurrent_updates(procesador)
+    app = builder.build()
+
+    # Rechazar a los usuarios no autorizados antes que nada (ni siquiera se registran sus mensajes)
+    app.add_handler(TypeHandler(Update, autorizar), group=-2)
+
+    # Registrar los mensajes del usuario antes de que los procese cualquier otro manejador
+    app.add_handler(TypeHandler(Update, registrar_mensaje), group=-1)
 
     # Configurar los manejadores de comandos y mensajes
     app.add_handler(CommandHandler("start", start))
@@ -457,13 +932,52 @@ def main() -> None:
     # CallbackQueryHandlers para manejar interacciones con botones
     app.add_handler(CallbackQueryHandler(mostrar_recetas, pattern="^categoria\\|"))
     app.add_handler(CallbackQueryHandler(enviar_receta, pattern="^receta\\|"))
+    app.add_handler(CallbackQueryHandler(vista_previa, pattern="^vista\\|"))
+    app.add_handler(CallbackQueryHandler(enviar_original, pattern="^original\\|"))
+    app.add_handler(CallbackQueryHandler(enviar_categoria, pattern="^todas\\|"))
+    app.add_handler(CallbackQueryHandler(paginar_busqueda, pattern="^busqueda\\|"))
     app.add_handler(CallbackQueryHandler(volver_menu_principal, pattern="^volver$"))
     app.add_handler(CallbackQueryHandler(reset, pattern="^reset$"))
     app.add_handler(CallbackQueryHandler(iniciar_busqueda, pattern="^buscar_recetas$"))
 
-    # Iniciar el bot en modo polling (consulta continua)
+    # Búsqueda inline desde cualquier chat
+    app.add_handler(InlineQueryHandler(busqueda_inline))
+
+    # Medir la latencia y los errores de cada manejador (no hace nada si las métricas están desactivadas)
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            handler.callback = metricas.instrumentar(handler.callback)
+
+    return app
+
+
+def main() -> None:
+    """
+    Función principal para ejecutar el bot.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    logger.info("Iniciando el bot...")
+
+    # Crear la aplicación del bot con el token
+    app = crear_aplicacion(ApplicationBuilder().token(TELEGRAM_TOKEN))
+
     logger.info("Bot iniciado y ejecutándose...")
-    app.run_polling()
+    if SERVING_MODE == "webhook":
+        # Servidor HTTP de PTB: registra la URL en Telegram y comprueba el token secreto de cada petición
+        logger.info(f"Modo webhook: escuchando en {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+        app.run_webhook(listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH,
+                        webhook_url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+                        allowed_updates=Update.ALL_TYPES)
+    else:
+        # Iniciar el bot en modo polling (consulta continua)
+        app.run_polling()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+from texto import normalizar, tokenizar
+
+
+# Similitud mínima (coeficiente de Dice sobre trigramas) para considerar que dos palabras coinciden
+SIMILITUD_MINIMA = 0.45
+
+# Similitud que se asigna cuando la palabra buscada es el comienzo de una palabra del título
+SIMILITUD_PREFIJO = 0.9
+
+
+def trigramas(palabra: str) -> Set[str]:
+    """
+    Devuelve los trigramas de una palabra, con un espacio de relleno a cada lado
+    para que el principio y el final de la palabra pesen más.
+
+    Parameters
+    ----------
+    palabra : str
+        Palabra ya normalizada.
+
+    Returns
+    -------
+    Set[str]
+        Trigramas de la palabra.
+    """
+    palabra = f" {palabra} "
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+class BuscadorRecetas:
+    """
+    Buscador aproximado de recetas por título, insensible a tildes y a pequeñas erratas.
+
+    Cada título se normaliza (minúsculas, sin tildes) y se divide en palabras.
+    Las palabras de la consulta se comparan con el vocabulario de los títulos
+    mediante un índice de trigramas, así que el coste depende del tamaño del
+    vocabulario y no del número de recetas. Las recetas candidatas se agrupan
+    por puntuación con operaciones de conjuntos, sin recorrerlas una a una.
+    """
+
+    def __init__(self, recetas: Iterable[Tuple[str, str]]) -> None:
+        """
+        Parameters
+        ----------
+        recetas : Iterable[Tuple[str, str]]
+            Pares (categoria, receta) a indexar.
+
+        Returns
+        -------
+        None
+        """
+        # Los identificadores siguen el orden alfabético, así que ordenar por id es ordenar por nombre
+        self._recetas: List[Tuple[str, str]] = sorted(recetas, key=lambda x: (x[1].lower(), x[0].lower()))
+        self._normalizados: List[str] = [normalizar(receta) for _, receta in self._recetas]
+        # Palabra normalizada -> recetas cuyo título la contiene
+        vocabulario: Dict[str, Set[int]] = {}
+        for id_receta, (_, receta) in enumerate(self._recetas):
+            for palabra in tokenizar(receta[:-len(".pdf")] if receta.endswith(".pdf") else receta):
+                vocabulario.setdefault(palabra, set()).add(id_receta)
+        self._vocabulario: Dict[str, FrozenSet[int]] = {p: frozenset(ids) for p, ids in vocabulario.items()}
+        # Trigrama -> palabras del vocabulario que lo contienen
+        self._trigramas: Dict[str, List[str]] = {}
+        self._n_trigramas: Dict[str, int] = {}
+        for palabra in self._vocabulario:
+            propios = trigramas(palabra)
+            self._n_trigramas[palabra] = len(propios)
+            for trigrama in propios:
+                self._trigramas.setdefault(trigrama, []).append(palabra)
+
+    def palabras_similares(self, palabra: str) -> Dict[str, float]:
+        """
+        Busca en el vocabulario las palabras parecidas a una palabra de la consulta.
+
+        Parameters
+        ----------
+        palabra : str
+            Palabra ya normalizada.
+
+        Returns
+        -------
+        Dict[str, float]
+            Palabra del vocabulario -> similitud (entre SIMILITUD_MINIMA y 1).
+        """
+        propios = trigramas(palabra)
+        comunes: Counter = Counter()
+        for trigrama in propios:
+            comunes.update(self._trigramas.get(trigrama, ()))
+
+        similares = {}
+        for candidata, n_comunes in comunes.items():
+            if candidata == palabra:
+                similitud = 1.0
+            else:
+                similitud = 2 * n_comunes / (len(propios) + self._n_trigramas[candidata])
+                if len(palabra) >= 3 and candidata.startswith(palabra):
+                    similitud = max(similitud, SIMILITUD_PREFIJO)
+            if similitud >= SIMILITUD_MINIMA:
+                similares[candidata] = similitud
+        return similares
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[Tuple[str, str]]:
+        """
+        Devuelve las recetas que mejor coinciden con la consulta.
+
+        Si hay recetas que coinciden con todas las palabras de la consulta solo
+        se devuelven esas; si no, las que coinciden con alguna. La puntuación de
+        una receta es la suma, para cada palabra de la consulta, de la mejor
+        similitud con alguna palabra de su título. Los empates se ordenan por nombre.
+
+        Parameters
+        ----------
+        consulta : str
+            Texto de la búsqueda.
+        limite : int
+            Número máximo de resultados.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            Pares (categoria, receta) de mayor a menor puntuación.
+        """
+        palabras = list(dict.fromkeys(tokenizar(consulta)))
+        if not palabras:
+            # Consultas sin palabras útiles (p. ej. solo "de"): coincidencia literal
+            texto = normalizar(consulta).strip()
+            return [r for r, n in zip(self._recetas, self._normalizados) if texto and texto in n][:limite]
+
+        # Para cada palabra de la consulta, niveles de similitud: [(similitud, recetas), ...] de mayor a menor
+        niveles_por_palabra = []
+        for palabra in palabras:
+            similares = self.palabras_similares(palabra)
+            niveles: Dict[float, Set[int]] = {}
+            for candidata, similitud in similares.items():
+                niveles.setdefault(similitud, set()).update(self._vocabulario[candidata])
+            niveles_por_palabra.append(sorted(niveles.items(), reverse=True))
+
+        coincidencias = [set().union(*(ids for _, ids in niveles)) for niveles in niveles_por_palabra]
+        candidatas = set.intersection(*coincidencias)
+        if not candidatas:
+            candidatas = set.union(*coincidencias)
+        if not candidatas:
+            return []
+
+        # Agrupar las candidatas por puntuación: cada palabra reparte a las recetas en niveles
+        grupos: Dict[float, Set[int]] = {0.0: candidatas}
+        for niveles in niveles_por_palabra:
+            nuevos: Dict[float, Set[int]] = {}
+            for puntuacion, grupo in grupos.items():
+                restantes = grupo
+                for similitud, ids in niveles:
+                    dentro = restantes & ids
+                    if dentro:
+                        nuevos.setdefault(puntuacion + similitud, set()).update(dentro)
+                        restantes = restantes - dentro
+                if restantes:
+                    nuevos.setdefault(puntuacion, set()).update(restantes)
+            grupos = nuevos
+
+        resultados: List[Tuple[str, str]] = []
+        for puntuacion in sorted(grupos, reverse=True):
+            for id_receta in sorted(grupos[puntuacion])[:limite - len(resultados)]:
+                resultados.append(self._recetas[id_receta])
+            if len(resultados) >= limite:
+                break
+        return resultados
@@ -0,0 +1,114 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+from telegram import (InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResult, InlineQueryResultArticle,
+                      InlineQueryResultCachedDocument, InputTextMessageContent)
+from settings import INLINE_RESULTS
+from catalogo import catalogo
+from cache_archivos import CacheFileId
+from cache_lru import cache_busquedas
+from disco import en_hilo
+from texto import clave_consulta
+from variantes import variantes_pdf
+
+
+# Prefijo del parámetro de /start con el que se pide una receta desde un resultado inline
+PREFIJO_ENLACE_RECETA = "receta_"
+
+
+def buscar_inline(consulta: str) -> List[Tuple[str, str]]:
+    """
+    Busca las recetas de una consulta inline. Al escribir '@bot lentejas'
+    Telegram manda una consulta por cada tecla, y las más repetidas (y los
+    prefijos comunes) se sirven desde la caché de búsquedas sin buscar de nuevo.
+
+    Parameters
+    ----------
+    consulta : str
+        Texto escrito por el usuario.
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        Pares (categoria, receta) de más a menos parecido.
+    """
+    clave = clave_consulta(consulta)
+    if not clave:
+        return []
+    return cache_busquedas.obtener(("inline", clave), catalogo.version,
+                                   lambda: catalogo.buscar(clave, INLINE_RESULTS))
+
+
+def _stats(rutas: Sequence[str]) -> List[Optional[os.stat_result]]:
+    """
+    Hace os.stat de varias rutas (se ejecuta en el pool de disco).
+
+    Parameters
+    ----------
+    rutas : Sequence[str]
+        Rutas de los archivos.
+
+    Returns
+    -------
+    List[Optional[os.stat_result]]
+        Resultado de os.stat de cada ruta (None si no existe).
+    """
+    stats = []
+    for ruta in rutas:
+        try:
+            stats.append(os.stat(ruta))
+        except OSError:
+            stats.append(None)
+    return stats
+
+
+async def resultados_inline(resultados: Sequence[Tuple[str, str]], cache: CacheFileId,
+                            nombre_bot: str) -> List[InlineQueryResult]:
+    """
+    Convierte los resultados de una búsqueda en resultados de una consulta inline.
+
+    Las recetas que ya se subieron alguna vez se ofrecen como documento con su
+    file_id, así que al elegirlas Telegram envía el PDF directamente, sin pasar
+    por el bot. Las demás se ofrecen como un mensaje con un enlace que abre el
+    bot y le pide la receta (al enviarla queda su file_id para la próxima vez).
+
+    Parameters
+    ----------
+    resultados : Sequence[Tuple[str, str]]
+        Pares (categoria, receta) encontrados.
+    cache : CacheFileId
+        Caché de file_id.
+    nombre_bot : str
+        Nombre de usuario del bot (para los enlaces).
+
+    Returns
+    -------
+    List[InlineQueryResult]
+        Resultados para answer_inline_query.
+    """
+    # Los file_id solo valen si el PDF no ha cambiado; los stat se hacen juntos en el pool de disco
+    rutas = [catalogo.ruta(categoria, receta) for categoria, receta in resultados]
+    stats = await en_hilo(_stats, rutas)
+
+    # Se ofrece el mismo PDF que envía el bot: la versión optimizada, si la hay
+    envios = [(stat and variantes_pdf.ruta(categoria, receta, stat)) or ruta
+              for (categoria, receta), ruta, stat in zip(resultados, rutas, stats)]
+    if envios != rutas:
+        rutas, stats = envios, await en_hilo(_stats, envios)
+
+    respuesta = []
+    for (categoria, receta), ruta, stat in zip(resultados, rutas, stats):
+        if stat is None:
+            continue
+        id_receta = catalogo.ids.id_receta(categoria, receta)
+        titulo = receta.replace(".pdf", "").capitalize()
+        file_id = cache.obtener(ruta, stat)
+        if file_id:
+            respuesta.append(InlineQueryResultCachedDocument(
+                id=f"r{id_receta}", title=titulo, document_file_id=file_id, description=categoria.capitalize()))
+        else:
+            enlace = f"https://t.me/{nombre_bot}?start={PREFIJO_ENLACE_RECETA}{id_receta}"
+            respuesta.append(InlineQueryResultArticle(
+                id=f"r{id_receta}", title=titulo, description=categoria.capitalize(),
+                input_message_content=InputTextMessageContent(f"📄 Receta: {titulo}"),
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("📥 Descargar la receta", url=enlace)]])))
+    return respuesta
@@ -0,0 +1,255 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from telegram import InputMediaDocument, Message
+from telegram.error import BadRequest
+from disco import EscritorDiferido, leer_archivo, stat as stat_async
+from metricas import metricas
+from settings import FILE_ID_CACHE_PATH
+from log.logger import logger
+
+
+class CacheFileId:
+    """
+    Caché persistente (SQLite) de los file_id que devuelve Telegram al subir un PDF.
+
+    Cada entrada se guarda junto con el tamaño y el mtime del archivo, de
+    modo que si el PDF cambia en disco la entrada deja de ser válida y se
+    vuelve a subir.
+
+    Se consulta en cada envío y en cada resultado inline, así que las
+    entradas se cargan en memoria al arrancar (una por PDF subido) y los
+    cambios se escriben en SQLite de forma diferida.
+    """
+
+    def __init__(self, ruta_db: str, intervalo: float = 2.0) -> None:
+        """
+        Parameters
+        ----------
+        ruta_db : str
+            Ruta del archivo SQLite (':memory:' para una caché temporal).
+        intervalo : float
+            Segundos entre dos escrituras de los cambios acumulados.
+
+        Returns
+        -------
+        None
+        """
+        self._escritor = EscritorDiferido(ruta_db, intervalo, "la caché de file_id")
+        conexion = self._escritor.conexion
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            "ruta TEXT PRIMARY KEY, tamano INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, file_id TEXT NOT NULL)"
+        )
+        conexion.commit()
+        # Ruta -> (tamaño, mtime_ns, file_id)
+        filas = conexion.execute("SELECT ruta, tamano, mtime_ns, file_id FROM file_ids")
+        self._entradas: Dict[str, Tuple[int, int, str]] = {fila[0]: fila[1:] for fila in filas}
+
+    def obtener(self, ruta: str, stat: Optional[os.stat_result] = None) -> Optional[str]:
+        """
+        Devuelve el file_id de un archivo si sigue siendo válido.
+
+        Parameters
+        ----------
+        ruta : str
+            Ruta del archivo en disco.
+        stat : Optional[os.stat_result]
+            Resultado de os.stat del archivo, si ya se tiene (si no, se calcula).
+
+        Returns
+        -------
+        Optional[str]
+            El file_id, o None si no existe o el archivo ha cambiado.
+        """
+        if stat is None:
+            try:
+                stat = os.stat(ruta)
+            except OSError:
+                return None
+        entrada = self._entradas.get(ruta)
+        if entrada is None or entrada[0] != stat.st_size or entrada[1] != stat.st_mtime_ns:
+            return None
+        return entrada[2]
+
+    def guardar(self, ruta: str, file_id: str, stat: Optional[os.stat_result] = None) -> None:
+        """
+        Guarda (o reemplaza) el file_id de un archivo con su tamaño y mtime actuales.
+
+        Parameters
+        ----------
+        ruta : str
+            Ruta del archivo en disco.
+        file_id : str
+            Identificador devuelto por Telegram.
+        stat : Optional[os.stat_result]
+            Resultado de os.stat del archivo, si ya se tiene (si no, se calcula).
+
+        Returns
+        -------
+        None
+        """
+        if stat is None:
+            stat = os.stat(ruta)
+        self._entradas[ruta] = (stat.st_size, stat.st_mtime_ns, file_id)
+        self._escritor.anotar("INSERT OR REPLACE INTO file_ids (ruta, tamano, mtime_ns, file_id) VALUES (?, ?, ?, ?)",
+                              (ruta, stat.st_size, stat.st_mtime_ns, file_id))
+
+    def invalidar(self, ruta: str) -> None:
+        """
+        Elimina la entrada de un archivo.
+
+        Parameters
+        ----------
+        ruta : str
+            Ruta del archivo en disco.
+
+        Returns
+        -------
+        None
+        """
+        self._entradas.pop(ruta, None)
+        self._escritor.anotar("DELETE FROM file_ids WHERE ruta = ?", (ruta,))
+
+    async def volcar(self) -> None:
+        """
+        Escribe ya en SQLite los cambios pendientes (al detener la aplicación).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        await self._escritor.guardar()
+
+
+async def enviar_documento(bot, chat_id: int, ruta: str, cache: CacheFileId,
+                           miniatura: Optional[str] = None, rate_limit_args: Optional[int] = None) -> Message:
+    """
+    Envía un PDF reutilizando su file_id si ya se subió antes; si no, lo sube
+    (con su miniatura, si la tiene) y guarda el file_id.
+
+    Parameters
+    ----------
+    bot : telegram.Bot
+        Bot con el que se envía (o cualquier objeto con un 'send_document' compatible).
+    chat_id : int
+        Chat de destino.
+    ruta : str
+        Ruta del PDF en disco.
+    cache : CacheFileId
+        Caché de file_id.
+    miniatura : Optional[str]
+        Ruta de la miniatura JPEG que se adjunta al subir el PDF (Telegram la
+        conserva con el file_id, así que solo se manda en la subida).
+    rate_limit_args : Optional[int]
+        Prioridad de las llamadas en el limitador de envíos.
+
+    Returns
+    -------
+    Message
+        Mensaje enviado por Telegram.
+    """
+    # Los accesos a disco (stat y lectura del PDF) se hacen en el pool de disco
+    stat = await stat_async(ruta)
+    file_id = cache.obtener(ruta, stat)
+    if file_id:
+        try:
+            message = await bot.send_document(chat_id=chat_id, document=file_id, rate_limit_args=rate_limit_args)
+            metricas.observar_envio(stat.st_size, desde_cache=True)
+            return message
+        except BadRequest as e:
+            # El file_id ya no es válido para Telegram: se descarta y se sube de nuevo
+            logger.warning(f"file_id no válido para {ruta}, se vuelve a subir: {e}")
+            cache.invalidar(ruta)
+
+    contenido = await leer_archivo(ruta)
+    thumbnail = None
+    if miniatura:
+        try:
+            thumbnail = await leer_archivo(miniatura)
+        except OSError as e:
+            logger.warning(f"No se pudo leer la miniatura de {ruta}, se envía sin ella: {e}")
+    message = await bot.send_document(chat_id=chat_id, document=contenido, filename=os.path.basename(ruta),
+                                      thumbnail=thumbnail, rate_limit_args=rate_limit_args)
+    metricas.observar_envio(len(contenido), desde_cache=False)
+    if message.document:
+        cache.guardar(ruta, message.document.file_id, stat)
+    return message
+
+
+async def enviar_documentos(bot, chat_id: int, documentos: Sequence[Tuple[str, Optional[str]]], cache: CacheFileId,
+                            rate_limit_args: Optional[int] = None) -> List[Message]:
+    """
+    Envía varios PDF en álbumes (send_media_group) de hasta 10 documentos, reutilizando
+    los file_id que ya se tengan y guardando los de los PDF que se suben.
+
+    Parameters
+    ----------
+    bot : telegram.Bot
+        Bot con el que se envía.
+    chat_id : int
+        Chat de destino.
+    documentos : Sequence[Tuple[str, Optional[str]]]
+        Ruta de cada PDF y de su miniatura (None si no tiene).
+    cache : CacheFileId
+        Caché de file_id.
+    rate_limit_args : Optional[int]
+        Prioridad de las llamadas en el limitador de envíos.
+
+    Returns
+    -------
+    List[Message]
+        Mensajes enviados por Telegram.
+    """
+    mensajes = []
+    for inicio in range(0, len(documentos), 10):
+        lote = documentos[inicio:inicio + 10]
+        # Telegram no admite álbumes de un solo documento
+        if len(lote) == 1:
+            ruta, miniatura = lote[0]
+            mensajes.append(await enviar_documento(bot, chat_id, ruta, cache, miniatura, rate_limit_args))
+            continue
+
+        # Los stat y las lecturas se hacen en el pool de disco
+        media, stats = [], []
+        for ruta, miniatura in lote:
+            stat = await stat_async(ruta)
+            stats.append(stat)
+            file_id = cache.obtener(ruta, stat)
+            if file_id:
+                media.append(InputMediaDocument(file_id))
+                continue
+            thumbnail = None
+            if miniatura:
+                try:
+                    thumbnail = await leer_archivo(miniatura)
+                except OSError as e:
+                    logger.warning(f"No se pudo leer la miniatura de {ruta}, se envía sin ella: {e}")
+            media.append(InputMediaDocument(await leer_archivo(ruta), filename=os.path.basename(ruta),
+                                            thumbnail=thumbnail))
+
+        # El limitador cuenta cada documento del álbum como un mensaje del chat
+        try:
+            enviados = await bot.send_media_group(chat_id=chat_id, media=media, rate_limit_args=rate_limit_args)
+        except BadRequest as e:
+            # Algún file_id ya no es válido: este lote se envía uno a uno (enviar_documento los renueva)
+            logger.warning(f"No se pudo enviar el álbum, se envían los PDF uno a uno: {e}")
+            for ruta, miniatura in lote:
+                mensajes.append(await enviar_documento(bot, chat_id, ruta, cache, miniatura, rate_limit_args))
+            continue
+
+        for (ruta, _), stat, elemento, message in zip(lote, stats, media, enviados):
+            desde_cache = isinstance(elemento.media, str)
+            metricas.observar_envio(stat.st_size, desde_cache=desde_cache)
+            if not desde_cache and message.document:
+                cache.guardar(ruta, message.document.file_id, stat)
+        mensajes.extend(enviados)
+    return mensajes
+
+
+# Instancia única de la caché que comparten todos los manejadores
+cache_file_id = CacheFileId(FILE_ID_CACHE_PATH)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from settings import SEARCH_CACHE_SIZE, MENU_CACHE_SIZE
+from metricas import metricas
+
+
+class CacheLRU:
+    """
+    Caché en memoria de tamaño acotado que descarta primero lo usado hace más
+    tiempo, con contadores de aciertos y fallos.
+
+    Cada entrada se guarda junto con la versión de los datos con los que se
+    calculó (p. ej. la del catálogo). Cuando la versión cambia las entradas
+    antiguas ya no coinciden, se vuelven a calcular y las viejas acaban
+    saliendo por el final del LRU.
+    """
+
+    def __init__(self, nombre: str, capacidad: int) -> None:
+        """
+        Parameters
+        ----------
+        nombre : str
+            Nombre de la caché (para las métricas).
+        capacidad : int
+            Número máximo de entradas.
+
+        Returns
+        -------
+        None
+        """
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def obtener(self, clave: Hashable, version: Hashable, calcular: Callable[[], Any]) -> Any:
+        """
+        Devuelve el valor de una clave, calculándolo solo si no está en la caché
+        para la versión indicada.
+
+        Parameters
+        ----------
+        clave : Hashable
+            Clave de la entrada (p. ej. ('busqueda', 'lentejas')).
+        version : Hashable
+            Versión de los datos de los que depende el valor.
+        calcular : Callable[[], Any]
+            Función que calcula el valor si no está en la caché.
+
+        Returns
+        -------
+        Any
+            El valor guardado o recién calculado (no se debe modificar: se comparte).
+        """
+        clave = (clave, version)
+        try:
+            valor = self._entradas[clave]
+        except KeyError:
+            self.fallos += 1
+            valor = self._entradas[clave] = calcular()
+            if len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+            return valor
+        self.aciertos += 1
+        self._entradas.move_to_end(clave)
+        return valor
+
+    def vaciar(self) -> None:
+        """
+        Elimina todas las entradas (los contadores se conservan).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self._entradas.clear()
+
+
+# Instancias únicas: resultados de búsqueda (por consulta normalizada) y teclados ya construidos
+cache_busquedas = CacheLRU("busquedas", SEARCH_CACHE_SIZE)
+cache_menus = CacheLRU("menus", MENU_CACHE_SIZE)
+metricas.registrar_cache(cache_busquedas)
+metricas.registrar_cache(cache_menus)
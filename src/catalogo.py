@@ -0,0 +1,317 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from settings import BASE_DIR, CATALOG_REFRESH_INTERVAL
+from buscador import BuscadorRecetas
+from disco import en_hilo
+from identificadores import TablaIds, tabla_ids
+from log.logger import logger
+
+
+class Catalogo:
+    """
+    Índice en memoria de las recetas (categorías -> recetas).
+
+    Se construye una única vez al arrancar y se mantiene actualizado
+    comparando los mtime de los directorios: un directorio cambia su mtime
+    cuando se añaden, eliminan o renombran entradas, así que basta con un
+    stat por directorio para saber si hay que volver a listarlo. Las
+    comprobaciones se limitan a una cada 'intervalo_refresco' segundos para
+    no tocar el disco (o el recurso de red) en cada actualización.
+    """
+
+    def __init__(self, base_dir: str, intervalo_refresco: float = 5.0, ids: TablaIds = None) -> None:
+        """
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        intervalo_refresco : float
+            Segundos mínimos entre dos comprobaciones de cambios en disco.
+        ids : TablaIds
+            Tabla donde se asigna un identificador a cada categoría y receta
+            (por defecto, una tabla temporal en memoria).
+
+        Returns
+        -------
+        None
+        """
+        self.base_dir = base_dir
+        self.intervalo_refresco = intervalo_refresco
+        self.ids = ids if ids is not None else TablaIds(":memory:")
+        # Número que se incrementa cada vez que cambia el contenido del catálogo
+        self.version = 0
+        self._recetas: Dict[str, List[str]] = {}
+        self._categorias: List[str] = []
+        self._mtimes: Dict[str, float] = {}
+        self._ultima_comprobacion = 0.0
+        # Comprobación de cambios en curso en el pool de disco (la comparten todos los manejadores)
+        self._refresco: Optional[asyncio.Future] = None
+        # El buscador se reconstruye junto con el catálogo, fuera del bucle de eventos
+        self._buscador = BuscadorRecetas([])
+        self.reconstruir()
+
+    def reconstruir(self) -> None:
+        """
+        Recorre por completo BASE_DIR y regenera el índice.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        mtimes = {self.base_dir: os.stat(self.base_dir).st_mtime}
+        recetas = {}
+        for categoria in os.listdir(self.base_dir):
+            categoria_path = os.path.join(self.base_dir, categoria)
+            if os.path.isdir(categoria_path):
+                mtimes[categoria_path], recetas[categoria] = self._cargar_categoria(categoria)
+        self._publicar(recetas, mtimes)
+        self._ultima_comprobacion = time.monotonic()
+        logger.info(f"Catálogo construido: {len(self._categorias)} categorías, "
+                    f"{sum(len(r) for r in self._recetas.values())} recetas")
+
+    def refrescar(self, forzar: bool = False) -> bool:
+        """
+        Comprueba si ha cambiado algún directorio y actualiza solo lo necesario.
+
+        Parameters
+        ----------
+        forzar : bool
+            Si es True se ignora el intervalo mínimo entre comprobaciones.
+
+        Returns
+        -------
+        bool
+            True si el catálogo ha cambiado.
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_comprobacion < self.intervalo_refresco:
+            return False
+        self._ultima_comprobacion = ahora
+
+        try:
+            mtime_base = os.stat(self.base_dir).st_mtime
+        except OSError as e:
+            logger.error(f"No se pudo comprobar la ruta de recetas '{self.base_dir}': {e}")
+            return False
+
+        # Se trabaja sobre copias (esto se ejecuta en un hilo mientras el bucle de eventos
+        # recorre el catálogo) y se sustituyen de una vez al final
+        cambiado = False
+        recetas = dict(self._recetas)
+        mtimes = dict(self._mtimes)
+
+        # Se han añadido o eliminado categorías
+        if mtime_base != mtimes.get(self.base_dir):
+            mtimes[self.base_dir] = mtime_base
+            actuales = {d for d in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, d))}
+            for categoria in set(recetas) - actuales:
+                del recetas[categoria]
+                mtimes.pop(os.path.join(self.base_dir, categoria), None)
+            for categoria in actuales - set(recetas):
+                mtimes[os.path.join(self.base_dir, categoria)], recetas[categoria] = self._cargar_categoria(categoria)
+            cambiado = True
+
+        # Se han añadido o eliminado recetas dentro de alguna categoría
+        for categoria in list(recetas):
+            categoria_path = os.path.join(self.base_dir, categoria)
+            try:
+                mtime = os.stat(categoria_path).st_mtime
+            except OSError:
+                continue
+            if mtime != mtimes.get(categoria_path):
+                mtimes[categoria_path], recetas[categoria] = self._cargar_categoria(categoria)
+                cambiado = True
+
+        if cambiado:
+            self._publicar(recetas, mtimes)
+            logger.info(f"Catálogo actualizado (versión {self.version})")
+        return cambiado
+
+    async def refrescar_async(self, forzar: bool = False) -> bool:
+        """
+        Igual que 'refrescar', pero los accesos a disco se hacen en el pool de
+        hilos de disco. Si ya hay una comprobación en curso se espera a esa en
+        lugar de lanzar otra.
+
+        Parameters
+        ----------
+        forzar : bool
+            Si es True se ignora el intervalo mínimo entre comprobaciones.
+
+        Returns
+        -------
+        bool
+            True si el catálogo ha cambiado.
+        """
+        # Lo habitual es que no toque comprobar nada: se resuelve sin salir del bucle de eventos
+        if not forzar and time.monotonic() - self._ultima_comprobacion < self.intervalo_refresco:
+            return False
+        if self._refresco is None or self._refresco.done():
+            self._refresco = asyncio.ensure_future(en_hilo(self.refrescar, forzar))
+        # shield: si se cancela un manejador, la comprobación sigue para los demás
+        return await asyncio.shield(self._refresco)
+
+    def categorias(self) -> List[str]:
+        """
+        Devuelve las categorías ordenadas (incluidas las vacías).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[str]
+            Nombres de las categorías.
+        """
+        return self._categorias
+
+    def recetas(self, categoria: str) -> List[str]:
+        """
+        Devuelve los PDF de una categoría, ordenados por nombre.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+
+        Returns
+        -------
+        List[str]
+            Nombres de los archivos PDF (lista vacía si no existe la categoría).
+        """
+        return self._recetas.get(categoria, [])
+
+    def buscar(self, texto: str, limite: int = 20) -> List[Tuple[str, str]]:
+        """
+        Busca recetas por nombre, sin tener en cuenta tildes y tolerando pequeñas erratas.
+
+        Parameters
+        ----------
+        texto : str
+            Texto a buscar.
+        limite : int
+            Número máximo de resultados.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            Pares (categoria, receta) de más a menos parecido.
+        """
+        return self._buscador.buscar(texto, limite)
+
+    def categoria_por_id(self, id_categoria: int) -> Optional[str]:
+        """
+        Devuelve la categoría con un identificador, si sigue existiendo.
+
+        Parameters
+        ----------
+        id_categoria : int
+            Identificador de la categoría (los de la tabla no se borran nunca).
+
+        Returns
+        -------
+        Optional[str]
+            Nombre de la categoría, o None si el identificador no existe o la
+            categoría ya no está en el catálogo.
+        """
+        categoria = self.ids.categoria(id_categoria)
+        if categoria is None or categoria not in self._recetas:
+            return None
+        return categoria
+
+    def receta_por_id(self, id_receta: int) -> Optional[Tuple[str, str]]:
+        """
+        Devuelve la categoría y el archivo de la receta con un identificador, si sigue existiendo.
+
+        Parameters
+        ----------
+        id_receta : int
+            Identificador de la receta (los de la tabla no se borran nunca).
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            Par (categoria, receta), o None si el identificador no existe o la
+            receta ya no está en el catálogo.
+        """
+        receta = self.ids.receta(id_receta)
+        if receta is None or receta[1] not in self.recetas(receta[0]):
+            return None
+        return receta
+
+    def ruta(self, categoria: str, receta: str) -> str:
+        """
+        Devuelve la ruta en disco de una receta.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        receta : str
+            Nombre del archivo PDF.
+
+        Returns
+        -------
+        str
+            Ruta al archivo PDF.
+        """
+        return os.path.join(self.base_dir, categoria, receta)
+
+    def _cargar_categoria(self, categoria: str) -> Tuple[float, List[str]]:
+        """
+        Lista (de nuevo) los PDF de una categoría y asigna identificador a las recetas nuevas.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+
+        Returns
+        -------
+        Tuple[float, List[str]]
+            mtime del directorio y nombres de los PDF ordenados.
+        """
+        categoria_path = os.path.join(self.base_dir, categoria)
+        mtime = os.stat(categoria_path).st_mtime
+        recetas = sorted([f for f in os.listdir(categoria_path) if f.endswith(".pdf")], key=lambda x: x.lower())
+        self.ids.registrar(categoria, recetas)
+        return mtime, recetas
+
+    def _publicar(self, recetas: Dict[str, List[str]], mtimes: Dict[str, float]) -> None:
+        """
+        Construye el buscador del nuevo contenido, lo sustituye todo y
+        incrementa la versión (se ejecuta en el hilo que refresca el catálogo:
+        con decenas de miles de recetas el buscador tarda más de un segundo).
+
+        Los diccionarios publicados no se vuelven a modificar. La versión se
+        incrementa la última: quien ve la versión nueva ve también los datos
+        nuevos, así que las cachés nunca guardan datos viejos con ella.
+
+        Parameters
+        ----------
+        recetas : Dict[str, List[str]]
+            Categoría -> PDF ordenados.
+        mtimes : Dict[str, float]
+            Directorio -> mtime con el que se listó.
+
+        Returns
+        -------
+        None
+        """
+        buscador = BuscadorRecetas((categoria, receta) for categoria, lista in recetas.items() for receta in lista)
+        self._categorias = sorted(recetas, key=lambda x: x.lower())
+        self._buscador = buscador
+        self._recetas = recetas
+        self._mtimes = mtimes
+        self.version += 1
+
+
+# Instancia única del catálogo (igual que con el logger) que comparten todos los manejadores
+catalogo = Catalogo(BASE_DIR, CATALOG_REFRESH_INTERVAL, tabla_ids)
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from settings import IO_WORKERS, IO_CHUNK_SIZE
+from log.logger import logger
+
+
+# Pool de hilos acotado para las operaciones de disco: una lectura atascada
+# ocupa un hilo, pero no detiene el bucle de eventos (ni al resto de chats)
+_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="disco")
+
+
+async def en_hilo(funcion: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Ejecuta una función bloqueante en el pool de hilos de disco.
+
+    Parameters
+    ----------
+    funcion : Callable[..., Any]
+        Función que se ejecuta.
+    *args : Any
+        Argumentos posicionales de la función.
+    **kwargs : Any
+        Argumentos con nombre de la función.
+
+    Returns
+    -------
+    Any
+        Lo que devuelve la función.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_pool, functools.partial(funcion, *args, **kwargs))
+
+
+def _leer_por_bloques(ruta: str, tam_bloque: int) -> bytes:
+    """
+    Lee un archivo entero por bloques y lo cierra (se ejecuta en el pool).
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del archivo.
+    tam_bloque : int
+        Bytes que se leen en cada llamada a read.
+
+    Returns
+    -------
+    bytes
+        Contenido del archivo.
+    """
+    contenido = bytearray()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(tam_bloque), b""):
+            contenido += bloque
+    return bytes(contenido)
+
+
+async def leer_archivo(ruta: str, tam_bloque: int = IO_CHUNK_SIZE) -> bytes:
+    """
+    Lee un archivo sin bloquear el bucle de eventos.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del archivo.
+    tam_bloque : int
+        Bytes que se leen en cada llamada a read.
+
+    Returns
+    -------
+    bytes
+        Contenido del archivo.
+    """
+    return await en_hilo(_leer_por_bloques, ruta, tam_bloque)
+
+
+async def stat(ruta: str) -> os.stat_result:
+    """
+    Hace os.stat de una ruta sin bloquear el bucle de eventos.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del archivo o directorio.
+
+    Returns
+    -------
+    os.stat_result
+        Resultado de os.stat.
+    """
+    return await en_hilo(os.stat, ruta)
+
+
+async def listar(ruta: str) -> List[str]:
+    """
+    Lista un directorio sin bloquear el bucle de eventos.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del directorio.
+
+    Returns
+    -------
+    List[str]
+        Nombres de las entradas del directorio.
+    """
+    return await en_hilo(os.listdir, ruta)
+
+
+def recorrer_pdfs(base_dir: str) -> Dict[str, os.stat_result]:
+    """
+    Recorre el árbol de recetas guardando el tamaño y el mtime de cada PDF
+    (para los procesos en segundo plano que solo rehacen lo que ha cambiado).
+
+    Parameters
+    ----------
+    base_dir : str
+        Ruta donde se encuentran las recetas organizadas por categorías.
+
+    Returns
+    -------
+    Dict[str, os.stat_result]
+        Resultado de os.stat de cada PDF, con la ruta relativa 'categoria/receta.pdf' como clave.
+    """
+    en_disco: Dict[str, os.stat_result] = {}
+    for categoria in os.scandir(base_dir):
+        if not categoria.is_dir():
+            continue
+        for receta in os.scandir(categoria.path):
+            if receta.name.endswith(".pdf") and receta.is_file():
+                en_disco[f"{categoria.name}/{receta.name}"] = receta.stat()
+    return en_disco
+
+
+class EscritorDiferido:
+    """
+    Conexión SQLite cuyas escrituras se acumulan y se hacen juntas, en una
+    sola transacción cada 'intervalo' segundos desde el pool de disco: un
+    commit espera a que el disco confirme la escritura, y eso no se puede
+    hacer en el bucle de eventos con cada mensaje o cada envío.
+
+    Quien lo usa mantiene sus datos en memoria (la fuente de verdad mientras
+    el bot está en marcha) y solo lee de la base de datos al arrancar.
+    """
+
+    def __init__(self, ruta_db: str, intervalo: float = 2.0, nombre: str = "base de datos") -> None:
+        """
+        Parameters
+        ----------
+        ruta_db : str
+            Ruta del archivo SQLite (':memory:' para una base de datos temporal).
+        intervalo : float
+            Segundos entre dos escrituras de los cambios acumulados.
+        nombre : str
+            Qué se guarda (para los mensajes del log).
+
+        Returns
+        -------
+        None
+        """
+        self.intervalo = intervalo
+        self.nombre = nombre
+        if ruta_db != ":memory:":
+            os.makedirs(os.path.dirname(ruta_db) or ".", exist_ok=True)
+        # Se escribe desde el pool de disco, siempre con el lock adquirido
+        self.conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        # Cambios pendientes de escribir, en orden: (sentencia SQL, parámetros)
+        self._pendientes: List[Tuple[str, tuple]] = []
+        self._volcado: Optional[asyncio.Task] = None
+        # Adelanta la escritura programada (al detener la aplicación); se crea con cada una
+        self._despertar: Optional[asyncio.Event] = None
+
+    def anotar(self, sql: str, parametros: tuple = ()) -> None:
+        """
+        Añade un cambio a los pendientes y programa su escritura. Fuera del
+        bucle de eventos (al cargar o en scripts) se escribe en el momento.
+
+        Parameters
+        ----------
+        sql : str
+            Sentencia que modifica la base de datos.
+        parametros : tuple
+            Parámetros de la sentencia.
+
+        Returns
+        -------
+        None
+        """
+        self._pendientes.append((sql, parametros))
+        if self._volcado is not None and not self._volcado.done():
+            return
+        try:
+            bucle = asyncio.get_running_loop()
+        except RuntimeError:
+            self._escribir(self._sacar_pendientes())
+            return
+        self._despertar = asyncio.Event()
+        self._volcado = bucle.create_task(self._volcar(self._despertar))
+
+    async def guardar(self) -> None:
+        """
+        Escribe ya todo lo pendiente, sin esperar al intervalo (al detener la aplicación).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._volcado is not None and not self._volcado.done():
+            self._despertar.set()
+            await self._volcado
+        await en_hilo(self._escribir, self._sacar_pendientes())
+
+    async def _volcar(self, despertar: asyncio.Event) -> None:
+        """
+        Espera 'intervalo' segundos (o a que se pida 'guardar') y escribe los
+        cambios acumulados en el pool de disco.
+
+        Parameters
+        ----------
+        despertar : asyncio.Event
+            Evento que adelanta la escritura.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            await asyncio.wait_for(despertar.wait(), self.intervalo)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await en_hilo(self._escribir, self._sacar_pendientes())
+        except Exception as e:
+            logger.error(f"Error al guardar {self.nombre}: {e}")
+
+    def _sacar_pendientes(self) -> List[Tuple[str, tuple]]:
+        """
+        Devuelve los cambios pendientes y vacía la lista.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[Tuple[str, tuple]]
+            Cambios pendientes, en orden.
+        """
+        pendientes, self._pendientes = self._pendientes, []
+        return pendientes
+
+    def _escribir(self, pendientes: List[Tuple[str, tuple]]) -> None:
+        """
+        Escribe un lote de cambios, en orden, en una sola transacción.
+
+        Parameters
+        ----------
+        pendientes : List[Tuple[str, tuple]]
+            Cambios a escribir: (sentencia SQL, parámetros).
+
+        Returns
+        -------
+        None
+        """
+        if not pendientes:
+            return
+        with self._lock, self.conexion:
+            for sql, parametros in pendientes:
+                self.conexion.execute(sql, parametros)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from settings import ID_TABLE_PATH
+
+
+class TablaIds:
+    """
+    Tabla persistente (SQLite) de identificadores numéricos de categorías y recetas.
+
+    Los botones llevan en su callback_data estos identificadores en lugar de
+    los nombres de archivo, que con títulos largos superan los 64 bytes que
+    permite Telegram. Los identificadores no se reutilizan ni se borran, así
+    que los botones de mensajes antiguos siguen apuntando a la misma receta
+    tras reiniciar el bot. Toda la tabla se mantiene también en memoria, de
+    modo que resolver un identificador es una consulta a un diccionario.
+    """
+
+    def __init__(self, ruta_db: str) -> None:
+        """
+        Parameters
+        ----------
+        ruta_db : str
+            Ruta del archivo SQLite (':memory:' para una tabla temporal).
+
+        Returns
+        -------
+        None
+        """
+        if ruta_db != ":memory:":
+            os.makedirs(os.path.dirname(ruta_db) or ".", exist_ok=True)
+        # El catálogo registra las recetas desde el pool de disco y los manejadores desde el bucle de eventos
+        self._conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conexion.execute("CREATE TABLE IF NOT EXISTS categorias (id INTEGER PRIMARY KEY, nombre TEXT NOT NULL UNIQUE)")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS recetas ("
+            "id INTEGER PRIMARY KEY, categoria TEXT NOT NULL, receta TEXT NOT NULL, "
+            "UNIQUE (categoria, receta))"
+        )
+        self._conexion.commit()
+
+        self._id_categoria: Dict[str, int] = {}
+        self._categorias: Dict[int, str] = {}
+        for id_categoria, nombre in self._conexion.execute("SELECT id, nombre FROM categorias"):
+            self._id_categoria[nombre] = id_categoria
+            self._categorias[id_categoria] = nombre
+
+        self._id_receta: Dict[Tuple[str, str], int] = {}
+        self._recetas: Dict[int, Tuple[str, str]] = {}
+        for id_receta, categoria, receta in self._conexion.execute("SELECT id, categoria, receta FROM recetas"):
+            self._id_receta[(categoria, receta)] = id_receta
+            self._recetas[id_receta] = (categoria, receta)
+
+    def registrar(self, categoria: str, recetas: Iterable[str]) -> None:
+        """
+        Asigna identificador a una categoría y a sus recetas (solo a las que aún no lo tienen).
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        recetas : Iterable[str]
+            Nombres de los archivos PDF de la categoría.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            nuevas = [receta for receta in recetas if (categoria, receta) not in self._id_receta]
+            if categoria in self._id_categoria and not nuevas:
+                return
+            if categoria not in self._id_categoria:
+                cursor = self._conexion.execute("INSERT INTO categorias (nombre) VALUES (?)", (categoria,))
+                self._id_categoria[categoria] = cursor.lastrowid
+                self._categorias[cursor.lastrowid] = categoria
+            for receta in nuevas:
+                cursor = self._conexion.execute("INSERT INTO recetas (categoria, receta) VALUES (?, ?)", (categoria, receta))
+                self._id_receta[(categoria, receta)] = cursor.lastrowid
+                self._recetas[cursor.lastrowid] = (categoria, receta)
+            self._conexion.commit()
+
+    def id_categoria(self, categoria: str) -> int:
+        """
+        Devuelve el identificador de una categoría (asignándolo si no lo tiene).
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+
+        Returns
+        -------
+        int
+            Identificador de la categoría.
+        """
+        if categoria not in self._id_categoria:
+            self.registrar(categoria, [])
+        return self._id_categoria[categoria]
+
+    def id_receta(self, categoria: str, receta: str) -> int:
+        """
+        Devuelve el identificador de una receta (asignándolo si no lo tiene).
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        receta : str
+            Nombre del archivo PDF.
+
+        Returns
+        -------
+        int
+            Identificador de la receta.
+        """
+        clave = (categoria, receta)
+        if clave not in self._id_receta:
+            self.registrar(categoria, [receta])
+        return self._id_receta[clave]
+
+    def categoria(self, id_categoria: int) -> Optional[str]:
+        """
+        Devuelve el nombre de la categoría con un identificador.
+
+        Parameters
+        ----------
+        id_categoria : int
+            Identificador de la categoría.
+
+        Returns
+        -------
+        Optional[str]
+            Nombre de la categoría, o None si el identificador no existe.
+        """
+        return self._categorias.get(id_categoria)
+
+    def receta(self, id_receta: int) -> Optional[Tuple[str, str]]:
+        """
+        Devuelve la categoría y el archivo de la receta con un identificador.
+
+        Parameters
+        ----------
+        id_receta : int
+            Identificador de la receta.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            Par (categoria, receta), o None si el identificador no existe.
+        """
+        return self._recetas.get(id_receta)
+
+
+# Instancia única de la tabla que comparten el catálogo y los manejadores
+tabla_ids = TablaIds(ID_TABLE_PATH)
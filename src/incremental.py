@@ -0,0 +1,300 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from settings import PDF_RESCAN_INTERVAL
+from disco import recorrer_pdfs
+from log.logger import logger
+
+
+def procesar_en_paralelo(funcion: Callable[..., Any], procesos: Optional[int], *argumentos: Sequence[Any]) -> List[Any]:
+    """
+    Aplica una función a cada PDF en un pool de procesos, en lotes para no
+    pagar el envío entre procesos por cada archivo.
+
+    Parameters
+    ----------
+    funcion : Callable[..., Any]
+        Función que procesa un PDF (debe poder importarse desde los procesos hijos).
+    procesos : Optional[int]
+        Número de procesos (None = uno por CPU).
+    *argumentos : Sequence[Any]
+        Un argumento de la función por PDF, como en 'map'.
+
+    Returns
+    -------
+    List[Any]
+        Resultado de cada PDF, en el mismo orden.
+    """
+    chunksize = max(1, len(argumentos[0]) // ((procesos or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return list(pool.map(funcion, *argumentos, chunksize=chunksize))
+
+
+class IndiceIncremental:
+    """
+    Base de lo que se calcula en segundo plano a partir de cada PDF (índice
+    de texto, miniaturas, versiones optimizadas) y se guarda en un índice JSON.
+
+    Solo se vuelven a procesar los PDF cuyo tamaño o mtime han cambiado
+    desde la última vez. Se repasan cuando cambia el catálogo y, además,
+    cada 'intervalo_revision' segundos: un PDF sobrescrito cambia su mtime
+    pero no el de su directorio, así que el catálogo no lo nota.
+
+    Cada subclase indica cómo se procesan los PDF ('_procesar'), cómo se
+    incorporan los resultados ('_aplicar') y qué se guarda en disco
+    ('_serializar' y '_restaurar').
+    """
+
+    # Qué se actualiza (para los mensajes del log)
+    descripcion = "índice"
+
+    def __init__(self, ruta_indice: str, procesos: Optional[int] = None,
+                 intervalo_revision: float = PDF_RESCAN_INTERVAL) -> None:
+        """
+        Parameters
+        ----------
+        ruta_indice : str
+            Archivo JSON donde se guarda el índice.
+        procesos : Optional[int]
+            Número de procesos de las actualizaciones en segundo plano (None = uno por CPU).
+        intervalo_revision : float
+            Segundos tras los que se vuelven a repasar los PDF aunque no cambie el catálogo.
+
+        Returns
+        -------
+        None
+        """
+        self.ruta_indice = ruta_indice
+        self.procesos = procesos
+        self.intervalo_revision = intervalo_revision
+        # Cambia cada vez que se modifica el índice (para las cachés)
+        self.version = 0
+        # Versión del catálogo con la que se lanzó la última actualización
+        self.version_catalogo: Optional[int] = None
+        # Instante del último repaso programado (el primero se lanza al arrancar la aplicación)
+        self._ultima_revision = time.monotonic()
+        # 'categoria/receta.pdf' -> al menos el tamaño y el mtime con los que se procesó
+        self._documentos: Dict[str, dict] = {}
+        self._tarea: Optional[asyncio.Task] = None
+
+    @property
+    def activas(self) -> bool:
+        """True si están instaladas las librerías que necesita (por defecto, ninguna)."""
+        return True
+
+    def actualizar(self, base_dir: str, procesos: Optional[int] = None) -> int:
+        """
+        Procesa los PDF nuevos o modificados y elimina del índice los que ya no existen.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        procesos : Optional[int]
+            Número de procesos (None = uno por CPU).
+
+        Returns
+        -------
+        int
+            Número de archivos que se han vuelto a procesar.
+        """
+        if not self.activas:
+            return 0
+
+        # Recorrer el árbol de recetas guardando tamaño y mtime de cada PDF
+        en_disco = recorrer_pdfs(base_dir)
+
+        eliminados = [clave for clave in self._documentos if clave not in en_disco]
+        pendientes = [clave for clave, stat in en_disco.items()
+                      if clave not in self._documentos
+                      or self._documentos[clave]["tamano"] != stat.st_size
+                      or self._documentos[clave]["mtime_ns"] != stat.st_mtime_ns]
+
+        if not eliminados and not pendientes:
+            return 0
+
+        resultados = self._procesar(base_dir, pendientes, procesos) if pendientes else []
+        procesados = self._aplicar(en_disco, eliminados, pendientes, resultados)
+        # La versión se incrementa después de sustituir los datos: quien ve la nueva ve también los datos nuevos
+        self.version += 1
+
+        # Solo este hilo modifica el índice (nunca hay dos actualizaciones a la vez)
+        self._guardar()
+        logger.info(f"Actualización de {self.descripcion}: {procesados} recetas procesadas, "
+                    f"{len(eliminados)} eliminadas")
+        return procesados
+
+    def pendiente(self, version_catalogo: int) -> bool:
+        """
+        Indica si toca repasar los PDF: ha cambiado el catálogo o ha pasado
+        'intervalo_revision' desde el último repaso.
+
+        Parameters
+        ----------
+        version_catalogo : int
+            Versión actual del catálogo.
+
+        Returns
+        -------
+        bool
+            True si hay que llamar a 'programar_actualizacion'.
+        """
+        return self.activas and (self.version_catalogo != version_catalogo
+                                 or time.monotonic() - self._ultima_revision >= self.intervalo_revision)
+
+    def programar_actualizacion(self, base_dir: str, version_catalogo: int) -> None:
+        """
+        Lanza 'actualizar' en un hilo aparte para no bloquear el bucle de eventos.
+        Si ya hay una actualización en curso no hace nada.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        version_catalogo : int
+            Versión del catálogo que se va a procesar.
+
+        Returns
+        -------
+        None
+        """
+        if not self.activas or (self._tarea is not None and not self._tarea.done()):
+            return
+        self.version_catalogo = version_catalogo
+        self._ultima_revision = time.monotonic()
+        self._tarea = asyncio.get_running_loop().create_task(self._actualizar_en_hilo(base_dir))
+
+    async def _actualizar_en_hilo(self, base_dir: str) -> None:
+        """
+        Ejecuta 'actualizar' en el pool de hilos por defecto del bucle de eventos.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.actualizar, base_dir, self.procesos)
+        except Exception as e:
+            logger.error(f"Error en la actualización de {self.descripcion}: {e}")
+
+    def _procesar(self, base_dir: str, pendientes: List[str], procesos: Optional[int]) -> List[Any]:
+        """
+        Procesa los PDF nuevos o modificados (normalmente con 'procesar_en_paralelo').
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        pendientes : List[str]
+            Rutas relativas 'categoria/receta.pdf' que hay que procesar.
+        procesos : Optional[int]
+            Número de procesos (None = uno por CPU).
+
+        Returns
+        -------
+        List[Any]
+            Resultado de cada PDF, en el mismo orden que 'pendientes'.
+        """
+        raise NotImplementedError
+
+    def _aplicar(self, en_disco: Dict[str, os.stat_result], eliminados: List[str], pendientes: List[str],
+                 resultados: List[Any]) -> int:
+        """
+        Incorpora los resultados al índice, sin dejar nunca a la vista del
+        bucle de eventos un índice a medias.
+
+        Parameters
+        ----------
+        en_disco : Dict[str, os.stat_result]
+            Resultado de os.stat de cada PDF que hay ahora en disco.
+        eliminados : List[str]
+            PDF del índice que ya no existen.
+        pendientes : List[str]
+            PDF que se han procesado.
+        resultados : List[Any]
+            Resultado de cada PDF de 'pendientes'.
+
+        Returns
+        -------
+        int
+            Número de archivos que se han vuelto a procesar.
+        """
+        raise NotImplementedError
+
+    def _serializar(self) -> Any:
+        """
+        Devuelve lo que se guarda en el archivo JSON (por defecto, los documentos).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Any
+            Datos que se pueden convertir a JSON.
+        """
+        return self._documentos
+
+    def _restaurar(self, datos: Any) -> None:
+        """
+        Carga lo leído del archivo JSON (por defecto, los documentos).
+
+        Parameters
+        ----------
+        datos : Any
+            Lo que devolvió '_serializar', o None para empezar con el índice vacío.
+
+        Returns
+        -------
+        None
+        """
+        self._documentos = datos if datos is not None else {}
+
+    def _cargar(self) -> None:
+        """
+        Carga el índice desde disco, si existe.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if not os.path.exists(self.ruta_indice):
+            return
+        try:
+            with open(self.ruta_indice, encoding="utf-8") as f:
+                self._restaurar(json.load(f))
+        except Exception as e:
+            # Un índice dañado no es grave: se vuelven a procesar los PDF
+            logger.warning(f"No se pudo cargar el índice de {self.descripcion}, se reconstruirá: {e}")
+            self._restaurar(None)
+
+    def _guardar(self) -> None:
+        """
+        Escribe el índice en disco de forma atómica (archivo temporal + os.replace).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        os.makedirs(os.path.dirname(self.ruta_indice) or ".", exist_ok=True)
+        temporal = self.ruta_indice + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._serializar(), f, ensure_ascii=False)
+        os.replace(temporal, self.ruta_indice)
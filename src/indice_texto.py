@@ -0,0 +1,363 @@
+import hashlib
+import heapq
+import math
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+from settings import TEXT_INDEX_PATH, INDEX_WORKERS
+from incremental import IndiceIncremental, procesar_en_paralelo
+from texto import tokenizar
+from log.logger import logger
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    # Sin pypdf solo se indexan los títulos de las recetas
+    PdfReader = None
+
+
+# Parámetros de la puntuación BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def hash_archivo(ruta: str) -> str:
+    """
+    Calcula el SHA-1 de un archivo leyéndolo por bloques.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del archivo.
+
+    Returns
+    -------
+    str
+        Hash en hexadecimal.
+    """
+    sha1 = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 16), b""):
+            sha1.update(bloque)
+    return sha1.hexdigest()
+
+
+def extraer_terminos(ruta: str, hash_previo: Optional[str]) -> Tuple[str, Optional[Dict[str, int]]]:
+    """
+    Extrae las palabras (título y contenido) de un PDF. Se ejecuta en el pool de procesos.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del PDF.
+    hash_previo : Optional[str]
+        Hash con el que se indexó el archivo la última vez (None si es nuevo).
+
+    Returns
+    -------
+    Tuple[str, Optional[Dict[str, int]]]
+        El hash actual y la frecuencia de cada palabra, o None si el contenido
+        no ha cambiado desde la última indexación.
+    """
+    hash_actual = hash_archivo(ruta)
+    if hash_actual == hash_previo:
+        return hash_actual, None
+
+    texto = os.path.basename(ruta)[:-len(".pdf")]
+    if PdfReader is not None:
+        try:
+            texto += "\n" + "\n".join(pagina.extract_text() or "" for pagina in PdfReader(ruta).pages)
+        except Exception:
+            # PDF dañado o sin texto: se indexa al menos el título
+            pass
+    return hash_actual, dict(Counter(tokenizar(texto)))
+
+
+class IndiceTexto(IndiceIncremental):
+    """
+    Índice invertido (palabra -> recetas) del texto de los PDF, guardado en disco.
+
+    Las claves de los documentos son rutas relativas 'categoria/receta.pdf'.
+    Solo se vuelven a procesar los archivos cuyo tamaño o mtime han cambiado,
+    y de ellos solo los que además tienen un hash distinto.
+
+    Las actualizaciones (en un hilo) construyen diccionarios nuevos y los
+    sustituyen de una vez, así que las búsquedas (en el bucle de eventos) no
+    esperan a ningún lock ni ven nunca el índice a medias.
+    """
+
+    descripcion = "índice de texto"
+
+    def __init__(self, ruta_indice: str, procesos: Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        ruta_indice : str
+            Archivo JSON donde se guarda el índice.
+        procesos : Optional[int]
+            Número de procesos para extraer el texto (None = uno por CPU).
+
+        Returns
+        -------
+        None
+        """
+        super().__init__(ruta_indice, procesos)
+        self._longitud_total = 0
+        # Lo que consultan las búsquedas, en una sola tupla para sustituirlo de una vez: palabra -> (receta ->
+        # frecuencia) y normalización por longitud de BM25 de cada documento
+        self._vista: Tuple[Dict[str, Dict[str, int]], Dict[str, float]] = ({}, {})
+        self._cargar()
+
+    def _procesar(self, base_dir: str, pendientes: List[str], procesos: Optional[int]) -> List[Any]:
+        """
+        Extrae las palabras de los PDF nuevos o modificados en el pool de procesos.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        pendientes : List[str]
+            Rutas relativas 'categoria/receta.pdf' que hay que procesar.
+        procesos : Optional[int]
+            Número de procesos (None = uno por CPU).
+
+        Returns
+        -------
+        List[Any]
+            Hash y frecuencia de cada palabra de cada PDF (ver 'extraer_terminos').
+        """
+        rutas = [os.path.join(base_dir, *clave.split("/", 1)) for clave in pendientes]
+        hashes = [self._documentos.get(clave, {}).get("hash") for clave in pendientes]
+        return procesar_en_paralelo(extraer_terminos, procesos, rutas, hashes)
+
+    def _aplicar(self, en_disco: Dict[str, os.stat_result], eliminados: List[str], pendientes: List[str],
+                 resultados: List[Any]) -> int:
+        """
+        Quita del índice los PDF eliminados y los modificados y añade su nuevo contenido.
+
+        Parameters
+        ----------
+        en_disco : Dict[str, os.stat_result]
+            Resultado de os.stat de cada PDF que hay ahora en disco.
+        eliminados : List[str]
+            PDF del índice que ya no existen.
+        pendientes : List[str]
+            PDF que se han procesado.
+        resultados : List[Any]
+            Resultado de 'extraer_terminos' para cada PDF de 'pendientes'.
+
+        Returns
+        -------
+        int
+            Número de archivos que se han vuelto a indexar (sin contar los que solo han cambiado de mtime).
+        """
+        # Se copian los diccionarios (y solo las listas de apariciones de las palabras que cambian)
+        # y se sustituyen al final
+        documentos = dict(self._documentos)
+        terminos = dict(self._vista[0])
+        copiadas: Set[str] = set()
+        longitud_total = self._longitud_total
+        reindexados = 0
+        for clave in eliminados:
+            longitud_total -= self._quitar(documentos, terminos, copiadas, clave)
+        for clave, (hash_actual, frecuencias) in zip(pendientes, resultados):
+            stat = en_disco[clave]
+            if frecuencias is None:
+                # Solo ha cambiado el mtime: el contenido es el mismo
+                documentos[clave] = dict(documentos[clave], tamano=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                continue
+            longitud_total -= self._quitar(documentos, terminos, copiadas, clave)
+            longitud_total += self._anadir(documentos, terminos, copiadas, clave, stat, hash_actual, frecuencias)
+            reindexados += 1
+        self._documentos = documentos
+        self._longitud_total = longitud_total
+        self._vista = (terminos, self._calcular_normas(documentos, longitud_total))
+        return reindexados
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[Tuple[str, str]]:
+        """
+        Busca recetas que contengan las palabras de la consulta, ordenadas por relevancia (BM25).
+
+        Parameters
+        ----------
+        consulta : str
+            Texto de la búsqueda.
+        limite : int
+            Número máximo de resultados.
+
+        Returns
+        -------
+        List[Tuple[str, str]]
+            Pares (categoria, receta) de mayor a menor relevancia.
+        """
+        palabras = set(tokenizar(consulta))
+        # Una sola lectura: si termina una actualización mientras tanto, se sigue con la versión anterior
+        terminos, normas = self._vista
+        n_documentos = len(normas)
+        if not palabras or not n_documentos:
+            return []
+        puntuaciones: Dict[str, float] = {}
+        for palabra in palabras:
+            apariciones = terminos.get(palabra)
+            if not apariciones:
+                continue
+            idf = math.log(1 + (n_documentos - len(apariciones) + 0.5) / (len(apariciones) + 0.5))
+            for clave, frecuencia in apariciones.items():
+                puntuaciones[clave] = puntuaciones.get(clave, 0.0) + idf * frecuencia * (BM25_K1 + 1) / (frecuencia + normas[clave])
+
+        # Solo se ordenan los 'limite' mejores (a igualdad de puntuación, por nombre)
+        mejores = heapq.nsmallest(limite, puntuaciones.items(), key=lambda x: (-x[1], x[0].lower()))
+        return [tuple(clave.split("/", 1)) for clave, _ in mejores]
+
+    @staticmethod
+    def _apariciones(terminos: Dict[str, Dict[str, int]], copiadas: Set[str], palabra: str) -> Dict[str, int]:
+        """
+        Devuelve una copia propia de las apariciones de una palabra que se puede
+        modificar sin afectar a las búsquedas en curso.
+
+        Parameters
+        ----------
+        terminos : Dict[str, Dict[str, int]]
+            Copia del índice de palabras que se está construyendo.
+        copiadas : Set[str]
+            Palabras cuyas apariciones ya se han copiado en esta actualización.
+        palabra : str
+            Palabra a modificar.
+
+        Returns
+        -------
+        Dict[str, int]
+            Apariciones de la palabra (receta -> frecuencia), ya en 'terminos'.
+        """
+        if palabra not in copiadas:
+            copiadas.add(palabra)
+            terminos[palabra] = dict(terminos.get(palabra, {}))
+        return terminos[palabra]
+
+    def _anadir(self, documentos: Dict[str, dict], terminos: Dict[str, Dict[str, int]], copiadas: Set[str],
+                clave: str, stat: os.stat_result, hash_actual: str, frecuencias: Dict[str, int]) -> int:
+        """
+        Añade un documento a las copias del índice que se están construyendo.
+
+        Parameters
+        ----------
+        documentos : Dict[str, dict]
+            Copia de los documentos.
+        terminos : Dict[str, Dict[str, int]]
+            Copia del índice de palabras.
+        copiadas : Set[str]
+            Palabras cuyas apariciones ya se han copiado en esta actualización.
+        clave : str
+            Ruta relativa 'categoria/receta.pdf'.
+        stat : os.stat_result
+            Resultado de os.stat del archivo.
+        hash_actual : str
+            Hash del contenido.
+        frecuencias : Dict[str, int]
+            Frecuencia de cada palabra en el documento.
+
+        Returns
+        -------
+        int
+            Longitud (número de palabras) del documento añadido.
+        """
+        longitud = sum(frecuencias.values())
+        documentos[clave] = {"tamano": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                             "hash": hash_actual, "longitud": longitud, "terminos": list(frecuencias)}
+        for palabra, frecuencia in frecuencias.items():
+            self._apariciones(terminos, copiadas, palabra)[clave] = frecuencia
+        return longitud
+
+    def _quitar(self, documentos: Dict[str, dict], terminos: Dict[str, Dict[str, int]], copiadas: Set[str],
+                clave: str) -> int:
+        """
+        Elimina un documento, si existe, de las copias del índice que se están construyendo.
+
+        Parameters
+        ----------
+        documentos : Dict[str, dict]
+            Copia de los documentos.
+        terminos : Dict[str, Dict[str, int]]
+            Copia del índice de palabras.
+        copiadas : Set[str]
+            Palabras cuyas apariciones ya se han copiado en esta actualización.
+        clave : str
+            Ruta relativa 'categoria/receta.pdf'.
+
+        Returns
+        -------
+        int
+            Longitud del documento eliminado (0 si no estaba).
+        """
+        documento = documentos.pop(clave, None)
+        if documento is None:
+            return 0
+        for palabra in documento["terminos"]:
+            if palabra in terminos:
+                apariciones = self._apariciones(terminos, copiadas, palabra)
+                apariciones.pop(clave, None)
+                if not apariciones:
+                    del terminos[palabra]
+                    copiadas.discard(palabra)
+        return documento["longitud"]
+
+    @staticmethod
+    def _calcular_normas(documentos: Dict[str, dict], longitud_total: int) -> Dict[str, float]:
+        """
+        Precalcula el término de normalización por longitud de BM25 de cada documento.
+
+        Parameters
+        ----------
+        documentos : Dict[str, dict]
+            Documentos del índice.
+        longitud_total : int
+            Suma de las longitudes de todos los documentos.
+
+        Returns
+        -------
+        Dict[str, float]
+            Normalización de cada documento.
+        """
+        longitud_media = longitud_total / len(documentos) if documentos else 1
+        return {clave: BM25_K1 * (1 - BM25_B + BM25_B * documento["longitud"] / longitud_media)
+                for clave, documento in documentos.items()}
+
+    def _serializar(self) -> Any:
+        """
+        Devuelve los documentos y las palabras para guardarlos en el JSON.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Any
+            Diccionario con 'documentos' y 'terminos'.
+        """
+        return {"documentos": self._documentos, "terminos": self._vista[0]}
+
+    def _restaurar(self, datos: Any) -> None:
+        """
+        Carga los documentos y las palabras leídos del JSON y recalcula lo que se deriva de ellos.
+
+        Parameters
+        ----------
+        datos : Any
+            Diccionario con 'documentos' y 'terminos', o None para empezar con el índice vacío.
+
+        Returns
+        -------
+        None
+        """
+        if datos is None:
+            self._documentos, self._longitud_total, self._vista = {}, 0, ({}, {})
+            return
+        self._documentos = datos["documentos"]
+        self._longitud_total = sum(d["longitud"] for d in self._documentos.values())
+        self._vista = (datos["terminos"], self._calcular_normas(self._documentos, self._longitud_total))
+        logger.info(f"Índice de texto cargado: {len(self._documentos)} recetas")
+
+
+# Instancia única del índice que comparten todos los manejadores
+indice_texto = IndiceTexto(TEXT_INDEX_PATH, INDEX_WORKERS)
@@ -0,0 +1,436 @@
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from log.logger import logger
+
+
+# Prioridades de las llamadas (menor número = antes). Se indican con 'rate_limit_args'
+# en cada llamada al bot, p. ej. bot.delete_message(..., rate_limit_args=PRIORIDAD_LIMPIEZA)
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_LIMPIEZA = 1
+PRIORIDAD_ENVIO_MASIVO = 2
+
+# Métodos que cuentan para el límite por chat (los que envían o cambian mensajes)
+PREFIJOS_LIMITADOS_POR_CHAT = ("send", "edit", "forward", "copy")
+# ... salvo los que empiezan igual pero no envían ningún mensaje
+METODOS_SIN_LIMITE_POR_CHAT = ("sendChatAction",)
+
+# Métodos que envían varios mensajes de una vez: cuentan tantos como elementos lleven en 'media'
+METODOS_CON_VARIOS_MENSAJES = ("sendMediaGroup",)
+
+# Margen para los errores de redondeo al rellenar los cubos
+EPSILON = 1e-9
+
+# Número máximo de cubos por chat que se guardan antes de descartar los que están llenos
+MAX_CUBOS_CHAT = 1000
+
+
+class CuboTokens:
+    """
+    Cubo de tokens: se rellena a 'ritmo' tokens por segundo hasta 'capacidad'
+    y cada llamada consume uno por mensaje. Una llamada que envía más mensajes
+    de los que caben en el cubo espera a que esté lleno y lo deja en negativo:
+    las siguientes esperan hasta haber pagado la diferencia.
+    """
+
+    def __init__(self, ritmo: float, capacidad: float, ahora: float) -> None:
+        """
+        Parameters
+        ----------
+        ritmo : float
+            Tokens que se añaden por segundo.
+        capacidad : float
+            Tokens máximos (ráfaga permitida).
+        ahora : float
+            Instante actual según el reloj del limitador.
+
+        Returns
+        -------
+        None
+        """
+        self.ritmo = ritmo
+        self.capacidad = capacidad
+        self.tokens = capacidad
+        self._ultimo = ahora
+
+    def espera(self, ahora: float, tokens: int = 1) -> float:
+        """
+        Devuelve los segundos que faltan para poder gastar 'tokens' (0 si ya se puede).
+
+        Parameters
+        ----------
+        ahora : float
+            Instante actual según el reloj del limitador.
+        tokens : int
+            Tokens que se van a gastar (si no caben en el cubo, basta con que esté lleno).
+
+        Returns
+        -------
+        float
+            Segundos de espera.
+        """
+        self._rellenar(ahora)
+        necesarios = min(tokens, self.capacidad)
+        return 0.0 if self.tokens >= necesarios - EPSILON else (necesarios - self.tokens) / self.ritmo
+
+    def consumir(self, ahora: float, tokens: int = 1) -> None:
+        """
+        Gasta tokens (hay que comprobar antes con 'espera' que se puede).
+
+        Parameters
+        ----------
+        ahora : float
+            Instante actual según el reloj del limitador.
+        tokens : int
+            Tokens que se gastan.
+
+        Returns
+        -------
+        None
+        """
+        self._rellenar(ahora)
+        self.tokens -= tokens
+
+    def lleno(self, ahora: float) -> bool:
+        """
+        Indica si el cubo está lleno (y por tanto se puede descartar sin perder nada).
+
+        Parameters
+        ----------
+        ahora : float
+            Instante actual según el reloj del limitador.
+
+        Returns
+        -------
+        bool
+            True si tiene todos sus tokens.
+        """
+        self._rellenar(ahora)
+        return self.tokens >= self.capacidad - EPSILON
+
+    def _rellenar(self, ahora: float) -> None:
+        """
+        Añade los tokens generados desde la última vez.
+
+        Parameters
+        ----------
+        ahora : float
+            Instante actual según el reloj del limitador.
+
+        Returns
+        -------
+        None
+        """
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.ritmo)
+        self._ultimo = ahora
+
+
+class LimitadorEnvios(BaseRateLimiter[int]):
+    """
+    Planificador de todas las llamadas que el bot hace a la API de Telegram.
+
+    Cada llamada espera su turno en una cola con prioridad. Un único
+    despachador concede los turnos respetando un cubo de tokens global y
+    otro por chat, de modo que las llamadas de un chat saturado no frenan
+    a las de los demás y las respuestas interactivas pasan por delante de
+    la limpieza. Si se le pasa un registro de mensajes, anota en él los
+    mensajes enviados y borrados, y si se le pasan unas métricas, mide cada
+    llamada. Si Telegram responde con RetryAfter se detienen todos los
+    envíos durante el tiempo indicado (más una espera creciente) y se
+    reintenta la llamada.
+
+    El reloj y la función de espera se pueden sustituir para probar el
+    limitador con un reloj simulado.
+    """
+
+    def __init__(self, ritmo_global: float = 30, rafaga_global: float = 3, ritmo_chat: float = 1,
+                 rafaga_chat: float = 3, max_reintentos: int = 3, espera_base: float = 0.5, registro=None, metricas=None,
+                 reloj: Callable[[], float] = time.monotonic,
+                 dormir: Callable[[float], Awaitable[Any]] = asyncio.sleep) -> None:
+        """
+        Parameters
+        ----------
+        ritmo_global : float
+            Llamadas permitidas en total en cualquier segundo (ráfaga incluida).
+        rafaga_global : float
+            Llamadas seguidas que se permiten tras un rato sin llamadas; el resto
+            de 'ritmo_global' se reparte a lo largo del segundo.
+        ritmo_chat : float
+            Mensajes por segundo permitidos en un mismo chat.
+        rafaga_chat : float
+            Mensajes seguidos que se permiten en un chat antes de aplicar 'ritmo_chat'.
+        max_reintentos : int
+            Veces que se reintenta una llamada rechazada con RetryAfter.
+        espera_base : float
+            Segundos que se añaden al RetryAfter en el primer reintento (se duplican en cada uno).
+        registro : RegistroMensajes
+            Registro de mensajes por chat que se actualiza con cada respuesta (None = ninguno).
+        metricas : Metricas
+            Métricas en las que se registra la latencia de cada llamada (None = ninguna).
+        reloj : Callable[[], float]
+            Función que devuelve el instante actual en segundos.
+        dormir : Callable[[float], Awaitable[Any]]
+            Corrutina que espera los segundos indicados.
+
+        Returns
+        -------
+        None
+        """
+        self.ritmo_chat = ritmo_chat
+        self.rafaga_chat = rafaga_chat
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self._registro = registro
+        self._metricas = metricas
+        self._reloj = reloj
+        self._dormir = dormir
+        # Con el cubo lleno caben 'rafaga_global' llamadas al instante y, durante el resto del segundo, las
+        # que se rellenan al ritmo (ritmo_global - rafaga_global): ningún segundo supera 'ritmo_global'
+        rafaga_global = min(rafaga_global, ritmo_global / 2)
+        self._global = CuboTokens(ritmo_global - rafaga_global, rafaga_global, reloj())
+        self._chats: Dict[int, CuboTokens] = {}
+        # Cada entrada es [prioridad, orden de llegada, chat_id (o None), future que se resuelve al dar el turno,
+        # mensajes que envía la llamada]
+        self._cola: List[list] = []
+        self._orden = itertools.count()
+        self._pausa_hasta = 0.0
+        self._aviso: Optional[asyncio.Event] = None
+        self._despachador: Optional[asyncio.Task] = None
+
+    async def initialize(self) -> None:
+        """
+        Arranca el despachador de turnos.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        # El Bot de la aplicación y el del Updater son el mismo, así que se puede llamar dos veces
+        if self._despachador is not None and not self._despachador.done():
+            return
+        self._aviso = asyncio.Event()
+        self._despachador = asyncio.get_running_loop().create_task(self._despachar())
+
+    async def shutdown(self) -> None:
+        """
+        Detiene el despachador y cancela las llamadas que seguían esperando turno.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._despachador is not None:
+            self._despachador.cancel()
+            try:
+                await self._despachador
+            except asyncio.CancelledError:
+                pass
+            self._despachador = None
+        for entrada in self._cola:
+            entrada[3].cancel()
+        self._cola.clear()
+
+    async def process_request(self, callback: Callable[..., Awaitable[Any]], args: Any, kwargs: Dict[str, Any],
+                              endpoint: str, data: Dict[str, Any], rate_limit_args: Optional[int]) -> Any:
+        """
+        Espera turno, hace la llamada y la repite si Telegram responde con RetryAfter.
+
+        Parameters
+        ----------
+        callback : Callable[..., Awaitable[Any]]
+            Corrutina que hace la petición a Telegram.
+        args : Any
+            Argumentos posicionales de 'callback'.
+        kwargs : Dict[str, Any]
+            Argumentos con nombre de 'callback'.
+        endpoint : str
+            Método de la API (p. ej. 'sendMessage').
+        data : Dict[str, Any]
+            Parámetros de la llamada (de aquí se saca el chat_id).
+        rate_limit_args : Optional[int]
+            Prioridad de la llamada (PRIORIDAD_INTERACTIVA si es None).
+
+        Returns
+        -------
+        Any
+            Resultado de 'callback'.
+        """
+        prioridad = PRIORIDAD_INTERACTIVA if rate_limit_args is None else rate_limit_args
+        chat_id = None
+        if endpoint.startswith(PREFIJOS_LIMITADOS_POR_CHAT) and endpoint not in METODOS_SIN_LIMITE_POR_CHAT:
+            chat_id = data.get("chat_id")
+        # Telegram cuenta cada documento de un álbum como un mensaje, tanto en el límite global como en el del chat
+        peso = max(1, len(data.get("media") or ())) if endpoint in METODOS_CON_VARIOS_MENSAJES else 1
+
+        for intento in range(self.max_reintentos + 1):
+            await self._esperar_turno(prioridad, chat_id, peso)
+            inicio = time.perf_counter()
+            try:
+                resultado = await callback(*args, **kwargs)
+            except Exception as e:
+                if self._metricas is not None:
+                    self._metricas.observar_api(endpoint, time.perf_counter() - inicio, error=True)
+                if not isinstance(e, RetryAfter):
+                    raise
+                if intento == self.max_reintentos:
+                    raise
+                pausa = e.retry_after + self.espera_base * 2 ** intento
+                logger.warning(f"Límite de Telegram alcanzado en {endpoint}, se reintenta en {pausa:.1f} s")
+                self._pausa_hasta = max(self._pausa_hasta, self._reloj() + pausa)
+                self._avisar()
+                continue
+            if self._metricas is not None:
+                self._metricas.observar_api(endpoint, time.perf_counter() - inicio, error=False)
+            if self._registro is not None:
+                self._registro.anotar_respuesta(endpoint, data, resultado)
+            return resultado
+
+    async def _esperar_turno(self, prioridad: int, chat_id: Optional[int], peso: int = 1) -> None:
+        """
+        Pone la llamada en la cola y espera a que el despachador le dé turno.
+
+        Parameters
+        ----------
+        prioridad : int
+            Prioridad de la llamada.
+        chat_id : Optional[int]
+            Chat al que va dirigida (None si no cuenta para el límite por chat).
+        peso : int
+            Mensajes que envía (tokens que gasta).
+
+        Returns
+        -------
+        None
+        """
+        entrada = [prioridad, next(self._orden), chat_id, asyncio.get_running_loop().create_future(), peso]
+        self._cola.append(entrada)
+        self._avisar()
+        try:
+            await entrada[3]
+        finally:
+            # Si la llamada se cancela mientras espera, deja la cola
+            if not entrada[3].done() or entrada[3].cancelled():
+                try:
+                    self._cola.remove(entrada)
+                except ValueError:
+                    pass
+
+    async def _despachar(self) -> None:
+        """
+        Bucle que concede los turnos: la llamada de más prioridad (y más antigua)
+        cuyo chat tenga tokens, siempre que queden tokens globales para ella.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        while True:
+            self._aviso.clear()
+            if not self._cola:
+                await self._aviso.wait()
+                continue
+
+            ahora = self._reloj()
+            espera = max(self._pausa_hasta - ahora, self._global.espera(ahora))
+            if espera <= 0:
+                listas = [e for e in self._cola
+                          if e[2] is None or self._cubo_chat(e[2], ahora).espera(ahora, e[4]) == 0]
+                if listas:
+                    entrada = min(listas, key=lambda e: (e[0], e[1]))
+                    # Un álbum puede necesitar más tokens globales de los que hay: se le
+                    # esperan (sin dejar pasar antes a las llamadas de menos prioridad)
+                    espera = self._global.espera(ahora, entrada[4])
+                    if espera <= 0:
+                        self._cola.remove(entrada)
+                        if entrada[3].done():
+                            # La llamada se canceló mientras esperaba: no gasta tokens
+                            continue
+                        self._global.consumir(ahora, entrada[4])
+                        if entrada[2] is not None:
+                            self._chats[entrada[2]].consumir(ahora, entrada[4])
+                        entrada[3].set_result(None)
+                        self._descartar_cubos_llenos(ahora)
+                        continue
+                else:
+                    # Todas las llamadas pendientes son de chats sin tokens
+                    espera = min(self._chats[e[2]].espera(ahora, e[4]) for e in self._cola)
+
+            # Se duerme hasta que haya tokens, salvo que llegue antes una llamada nueva
+            dormir = asyncio.ensure_future(self._dormir(espera))
+            aviso = asyncio.ensure_future(self._aviso.wait())
+            try:
+                await asyncio.wait({dormir, aviso}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                dormir.cancel()
+                aviso.cancel()
+
+    def _cubo_chat(self, chat_id: int, ahora: float) -> CuboTokens:
+        """
+        Devuelve el cubo de tokens de un chat, creándolo si no existe.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        ahora : float
+            Instante actual según el reloj del limitador.
+
+        Returns
+        -------
+        CuboTokens
+            Cubo del chat.
+        """
+        cubo = self._chats.get(chat_id)
+        if cubo is None:
+            cubo = self._chats[chat_id] = CuboTokens(self.ritmo_chat, self.rafaga_chat, ahora)
+        return cubo
+
+    def _descartar_cubos_llenos(self, ahora: float) -> None:
+        """
+        Limita la memoria: si hay demasiados cubos por chat, descarta los que
+        están llenos (volver a crearlos no cambia nada).
+
+        Parameters
+        ----------
+        ahora : float
+            Instante actual según el reloj del limitador.
+
+        Returns
+        -------
+        None
+        """
+        if len(self._chats) <= MAX_CUBOS_CHAT:
+            return
+        pendientes = {e[2] for e in self._cola}
+        for chat_id in [c for c, cubo in self._chats.items() if c not in pendientes and cubo.lleno(ahora)]:
+            del self._chats[chat_id]
+
+    def _avisar(self) -> None:
+        """
+        Despierta al despachador (hay una llamada nueva o ha cambiado la pausa).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._aviso is not None:
+            self._aviso.set()
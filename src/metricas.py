@@ -0,0 +1,338 @@
+import asyncio
+import contextvars
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram.ext import ApplicationHandlerStop
+from settings import METRICS_PORT
+from log.logger import logger
+
+
+# Límites superiores (en segundos) de los intervalos de los histogramas de latencia
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Manejador que se está ejecutando en la tarea actual (para atribuirle las llamadas a la API)
+_manejador_actual: contextvars.ContextVar = contextvars.ContextVar("manejador_actual", default="ninguno")
+
+
+class Histograma:
+    """Histograma acumulativo con intervalos fijos, como los de Prometheus."""
+
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_LATENCIA) -> None:
+        """
+        Parameters
+        ----------
+        limites : Tuple[float, ...]
+            Límites superiores de los intervalos (sin incluir +Inf).
+
+        Returns
+        -------
+        None
+        """
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        """
+        Añade una observación.
+
+        Parameters
+        ----------
+        valor : float
+            Valor observado.
+
+        Returns
+        -------
+        None
+        """
+        self.cuentas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre: str, etiquetas: str) -> List[str]:
+        """
+        Devuelve las líneas del histograma en formato de texto de Prometheus.
+
+        Parameters
+        ----------
+        nombre : str
+            Nombre de la métrica.
+        etiquetas : str
+            Etiquetas ya formateadas (p. ej. 'handler="start"').
+
+        Returns
+        -------
+        List[str]
+            Líneas _bucket, _sum y _count.
+        """
+        lineas = []
+        acumulado = 0
+        for limite, cuenta in zip([*map(str, self.limites), "+Inf"], self.cuentas):
+            acumulado += cuenta
+            lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f"{nombre}_sum{{{etiquetas}}} {self.suma}")
+        lineas.append(f"{nombre}_count{{{etiquetas}}} {self.total}")
+        return lineas
+
+
+class Metricas:
+    """
+    Métricas del bot: latencia y errores de cada manejador y de cada método
+    de la API, llamadas a la API hechas por cada manejador y bytes de PDF
+    subidos frente a servidos con el file_id en caché.
+
+    Si están desactivadas no se envuelve ningún manejador y las funciones de
+    registro vuelven sin hacer nada, así que no cuestan nada.
+    """
+
+    def __init__(self, activas: bool) -> None:
+        """
+        Parameters
+        ----------
+        activas : bool
+            Si es False no se registra nada.
+
+        Returns
+        -------
+        None
+        """
+        self.activas = activas
+        self.manejadores: Dict[str, Histograma] = {}
+        self.errores_manejador: Dict[str, int] = {}
+        self.api: Dict[str, Histograma] = {}
+        self.errores_api: Dict[str, int] = {}
+        self.llamadas_api: Dict[Tuple[str, str], int] = {}
+        self.bytes_subidos = 0
+        self.bytes_cache = 0
+        # Cachés en memoria cuyos aciertos y fallos se publican
+        self.caches: List[Any] = []
+        # Procesador de actualizaciones cuya cola y descartes se publican (lo asigna bot.crear_aplicacion)
+        self.procesador: Optional[Any] = None
+        self._servidor: Optional[asyncio.AbstractServer] = None
+
+    def instrumentar(self, callback: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """
+        Envuelve un manejador para medir su latencia y sus errores.
+
+        Parameters
+        ----------
+        callback : Callable[..., Awaitable]
+            Manejador (corrutina) original.
+
+        Returns
+        -------
+        Callable[..., Awaitable]
+            El manejador envuelto (o el original si las métricas están desactivadas).
+        """
+        if not self.activas:
+            return callback
+        nombre = callback.__name__
+
+        @functools.wraps(callback)
+        async def envoltorio(*args, **kwargs):
+            token = _manejador_actual.set(nombre)
+            inicio = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except ApplicationHandlerStop:
+                # No es un error: el manejador corta el procesamiento de la actualización
+                raise
+            except Exception:
+                self.errores_manejador[nombre] = self.errores_manejador.get(nombre, 0) + 1
+                raise
+            finally:
+                self.manejadores.setdefault(nombre, Histograma()).observar(time.perf_counter() - inicio)
+                _manejador_actual.reset(token)
+
+        return envoltorio
+
+    def observar_api(self, endpoint: str, segundos: float, error: bool) -> None:
+        """
+        Registra una llamada a la API de Telegram.
+
+        Parameters
+        ----------
+        endpoint : str
+            Método de la API (p. ej. 'sendMessage').
+        segundos : float
+            Duración de la llamada (sin contar la espera en el limitador).
+        error : bool
+            Si la llamada ha fallado.
+
+        Returns
+        -------
+        None
+        """
+        if not self.activas:
+            return
+        self.api.setdefault(endpoint, Histograma()).observar(segundos)
+        if error:
+            self.errores_api[endpoint] = self.errores_api.get(endpoint, 0) + 1
+        clave = (_manejador_actual.get(), endpoint)
+        self.llamadas_api[clave] = self.llamadas_api.get(clave, 0) + 1
+
+    def observar_envio(self, tamano: int, desde_cache: bool) -> None:
+        """
+        Registra el envío de un PDF.
+
+        Parameters
+        ----------
+        tamano : int
+            Tamaño del PDF en bytes.
+        desde_cache : bool
+            True si se ha enviado con el file_id en caché (sin subir los bytes).
+
+        Returns
+        -------
+        None
+        """
+        if not self.activas:
+            return
+        if desde_cache:
+            self.bytes_cache += tamano
+        else:
+            self.bytes_subidos += tamano
+
+    def registrar_cache(self, cache: Any) -> None:
+        """
+        Añade una caché a las métricas (sus contadores se leen al publicarlas,
+        así que registrarla no cuesta nada en cada consulta).
+
+        Parameters
+        ----------
+        cache : Any
+            Caché con atributos 'nombre', 'aciertos' y 'fallos' y tamaño (len).
+
+        Returns
+        -------
+        None
+        """
+        self.caches.append(cache)
+
+    def texto_prometheus(self) -> str:
+        """
+        Devuelve todas las métricas en formato de texto de Prometheus.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        str
+            Texto para el endpoint /metrics.
+        """
+        lineas = ["# HELP recetas_handler_seconds Latencia de los manejadores.",
+                  "# TYPE recetas_handler_seconds histogram"]
+        for nombre, histograma in sorted(self.manejadores.items()):
+            lineas += histograma.lineas("recetas_handler_seconds", f'handler="{nombre}"')
+        lineas += ["# HELP recetas_handler_errors_total Excepciones no capturadas en los manejadores.",
+                   "# TYPE recetas_handler_errors_total counter"]
+        lineas += [f'recetas_handler_errors_total{{handler="{n}"}} {v}' for n, v in sorted(self.errores_manejador.items())]
+        lineas += ["# HELP recetas_api_seconds Latencia de las llamadas a la API de Telegram.",
+                   "# TYPE recetas_api_seconds histogram"]
+        for endpoint, histograma in sorted(self.api.items()):
+            lineas += histograma.lineas("recetas_api_seconds", f'endpoint="{endpoint}"')
+        lineas += ["# HELP recetas_api_errors_total Llamadas a la API de Telegram que han fallado.",
+                   "# TYPE recetas_api_errors_total counter"]
+        lineas += [f'recetas_api_errors_total{{endpoint="{e}"}} {v}' for e, v in sorted(self.errores_api.items())]
+        lineas += ["# HELP recetas_api_calls_total Llamadas a la API de Telegram por manejador.",
+                   "# TYPE recetas_api_calls_total counter"]
+        lineas += [f'recetas_api_calls_total{{handler="{h}",endpoint="{e}"}} {v}'
+                   for (h, e), v in sorted(self.llamadas_api.items())]
+        lineas += ["# HELP recetas_document_bytes_total Bytes de PDF enviados, subidos o reutilizando el file_id.",
+                   "# TYPE recetas_document_bytes_total counter",
+                   f'recetas_document_bytes_total{{origen="subida"}} {self.bytes_subidos}',
+                   f'recetas_document_bytes_total{{origen="cache"}} {self.bytes_cache}']
+        lineas += ["# HELP recetas_cache_hits_total Consultas resueltas desde las cachés en memoria.",
+                   "# TYPE recetas_cache_hits_total counter"]
+        lineas += [f'recetas_cache_hits_total{{cache="{c.nombre}"}} {c.aciertos}' for c in self.caches]
+        lineas += ["# HELP recetas_cache_misses_total Consultas que no estaban en las cachés en memoria.",
+                   "# TYPE recetas_cache_misses_total counter"]
+        lineas += [f'recetas_cache_misses_total{{cache="{c.nombre}"}} {c.fallos}' for c in self.caches]
+        lineas += ["# HELP recetas_cache_entries Entradas guardadas en las cachés en memoria.",
+                   "# TYPE recetas_cache_entries gauge"]
+        lineas += [f'recetas_cache_entries{{cache="{c.nombre}"}} {len(c)}' for c in self.caches]
+        if self.procesador is not None:
+            lineas += ["# HELP recetas_updates_pending Actualizaciones en curso o esperando turno.",
+                       "# TYPE recetas_updates_pending gauge",
+                       f"recetas_updates_pending {self.procesador.pendientes}",
+                       "# HELP recetas_updates_dropped_total Actualizaciones descartadas sin procesar, por motivo.",
+                       "# TYPE recetas_updates_dropped_total counter"]
+            lineas += [f'recetas_updates_dropped_total{{motivo="{m}"}} {v}'
+                       for m, v in sorted(self.procesador.descartadas.items())]
+        return "\n".join(lineas) + "\n"
+
+    async def iniciar_servidor(self, host: str, puerto: int) -> None:
+        """
+        Arranca un servidor HTTP mínimo que responde a GET /metrics.
+
+        Parameters
+        ----------
+        host : str
+            Dirección en la que escucha (normalmente 127.0.0.1).
+        puerto : int
+            Puerto en el que escucha.
+
+        Returns
+        -------
+        None
+        """
+        self._servidor = await asyncio.start_server(self._atender, host, puerto)
+        logger.info(f"Métricas disponibles en http://{host}:{puerto}/metrics")
+
+    async def detener_servidor(self) -> None:
+        """
+        Cierra el servidor de métricas, si está arrancado, y libera el puerto.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._servidor is None:
+            return
+        self._servidor.close()
+        await self._servidor.wait_closed()
+        self._servidor = None
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        """
+        Responde a una petición HTTP al servidor de métricas.
+
+        Parameters
+        ----------
+        lector : asyncio.StreamReader
+            Flujo de entrada de la conexión.
+        escritor : asyncio.StreamWriter
+            Flujo de salida de la conexión.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            peticion = await asyncio.wait_for(lector.readuntil(b"\r\n\r\n"), timeout=5)
+            partes = peticion.split(b" ", 2)
+            if len(partes) > 1 and partes[0] == b"GET" and partes[1].split(b"?")[0] == b"/metrics":
+                cuerpo = self.texto_prometheus().encode()
+                cabecera = "HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            else:
+                cuerpo = b"Not Found\n"
+                cabecera = "HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+            escritor.write(f"{cabecera}Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode() + cuerpo)
+            await escritor.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+
+# Instancia única de las métricas (activas solo si se ha configurado METRICS_PORT)
+metricas = Metricas(METRICS_PORT > 0)
@@ -0,0 +1,232 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from settings import THUMBNAIL_DIR, THUMBNAIL_INDEX_PATH, THUMBNAIL_SIZE, THUMBNAIL_QUALITY, THUMBNAIL_WORKERS
+from incremental import IndiceIncremental, procesar_en_paralelo
+from indice_texto import hash_archivo
+from log.logger import logger
+
+try:
+    import pypdfium2 as pdfium
+    from PIL import Image  # noqa: F401 (pypdfium2 la necesita para convertir la página en imagen)
+except ImportError:
+    # Sin pypdfium2 o sin Pillow las recetas se envían sin miniatura
+    pdfium = None
+
+
+def crear_miniatura(ruta: str, dir_miniaturas: str, lado: int, calidad: int) -> Tuple[str, bool]:
+    """
+    Dibuja la primera página de un PDF como una miniatura JPEG. Se ejecuta en el pool de procesos.
+
+    La miniatura se guarda con el hash del PDF como nombre, así que los PDF
+    con el mismo contenido comparten miniatura y si ya existe no se vuelve a
+    dibujar.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del PDF.
+    dir_miniaturas : str
+        Directorio donde se guardan las miniaturas.
+    lado : int
+        Tamaño máximo en píxeles del lado mayor de la miniatura.
+    calidad : int
+        Calidad JPEG (1-95).
+
+    Returns
+    -------
+    Tuple[str, bool]
+        El hash del PDF y si la miniatura existe (False si no se ha podido dibujar).
+    """
+    hash_actual = hash_archivo(ruta)
+    destino = os.path.join(dir_miniaturas, f"{hash_actual}.jpg")
+    if os.path.exists(destino):
+        return hash_actual, True
+    try:
+        pdf = pdfium.PdfDocument(ruta)
+        try:
+            pagina = pdf[0]
+            ancho, alto = pagina.get_size()
+            imagen = pagina.render(scale=lado / max(ancho, alto)).to_pil()
+        finally:
+            pdf.close()
+        # El redondeo al dibujar puede pasarse de un píxel
+        imagen.thumbnail((lado, lado))
+        # Cada proceso escribe su temporal: dos PDF iguales pueden procesarse a la vez
+        temporal = f"{destino}.{os.getpid()}.tmp"
+        imagen.convert("RGB").save(temporal, "JPEG", quality=calidad, optimize=True)
+        os.replace(temporal, destino)
+        return hash_actual, True
+    except Exception:
+        # PDF dañado o sin páginas: la receta se sigue enviando, sin miniatura
+        return hash_actual, False
+
+
+class Miniaturas(IndiceIncremental):
+    """
+    Miniaturas JPEG de la primera página de cada receta, guardadas en disco
+    con el hash del PDF como nombre.
+
+    Se generan en segundo plano y de forma incremental: solo se vuelven a
+    procesar los PDF cuyo tamaño o mtime han cambiado. Consultar si una
+    receta tiene miniatura no toca el disco.
+    """
+
+    descripcion = "miniaturas"
+
+    def __init__(self, dir_miniaturas: str, ruta_indice: str, lado: int = 320, calidad: int = 80,
+                 procesos: Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        dir_miniaturas : str
+            Directorio donde se guardan las miniaturas.
+        ruta_indice : str
+            Archivo JSON con el hash y la fecha de cada PDF procesado.
+        lado : int
+            Tamaño máximo en píxeles del lado mayor (Telegram admite hasta 320).
+        calidad : int
+            Calidad JPEG (1-95).
+        procesos : Optional[int]
+            Número de procesos para dibujar los PDF (None = uno por CPU).
+
+        Returns
+        -------
+        None
+        """
+        super().__init__(ruta_indice, procesos)
+        self.dir_miniaturas = dir_miniaturas
+        self.lado = min(lado, 320)
+        self.calidad = calidad
+        # Los documentos guardan también el hash con el que se nombra la miniatura (None si no se pudo
+        # dibujar) y la versión cambia cuando aparecen o desaparecen miniaturas (para rehacer los teclados)
+        self._cargar()
+
+    @property
+    def activas(self) -> bool:
+        """True si están instaladas las librerías para dibujar los PDF."""
+        return pdfium is not None
+
+    def tiene(self, categoria: str, receta: str) -> bool:
+        """
+        Indica si una receta tiene miniatura, sin comprobar si corresponde al
+        PDF actual (para los teclados, que no tocan el disco).
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        receta : str
+            Nombre del archivo PDF.
+
+        Returns
+        -------
+        bool
+            True si se ha generado una miniatura de la receta.
+        """
+        documento = self._documentos.get(f"{categoria}/{receta}")
+        return documento is not None and documento["hash"] is not None
+
+    def ruta(self, categoria: str, receta: str, stat: os.stat_result) -> Optional[str]:
+        """
+        Devuelve la ruta de la miniatura de una receta, si ya se ha generado y
+        corresponde al PDF actual.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        receta : str
+            Nombre del archivo PDF.
+        stat : os.stat_result
+            Resultado de os.stat del PDF (si ha cambiado, la miniatura es de su contenido anterior).
+
+        Returns
+        -------
+        Optional[str]
+            Ruta del JPEG, o None si la receta aún no tiene miniatura.
+        """
+        documento = self._documentos.get(f"{categoria}/{receta}")
+        if (documento is None or documento["hash"] is None
+                or documento["tamano"] != stat.st_size or documento["mtime_ns"] != stat.st_mtime_ns):
+            return None
+        return os.path.join(self.dir_miniaturas, f"{documento['hash']}.jpg")
+
+    def _procesar(self, base_dir: str, pendientes: List[str], procesos: Optional[int]) -> List[Any]:
+        """
+        Dibuja las miniaturas de los PDF nuevos o modificados en el pool de procesos.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        pendientes : List[str]
+            Rutas relativas 'categoria/receta.pdf' que hay que procesar.
+        procesos : Optional[int]
+            Número de procesos (None = uno por CPU).
+
+        Returns
+        -------
+        List[Any]
+            Hash de cada PDF y si tiene miniatura (ver 'crear_miniatura').
+        """
+        os.makedirs(self.dir_miniaturas, exist_ok=True)
+        rutas = [os.path.join(base_dir, *clave.split("/", 1)) for clave in pendientes]
+        n = len(rutas)
+        return procesar_en_paralelo(crear_miniatura, procesos, rutas, [self.dir_miniaturas] * n,
+                                    [self.lado] * n, [self.calidad] * n)
+
+    def _aplicar(self, en_disco: Dict[str, os.stat_result], eliminados: List[str], pendientes: List[str],
+                 resultados: List[Any]) -> int:
+        """
+        Sustituye el índice de miniaturas por uno nuevo y borra las que ya no se usan.
+
+        Parameters
+        ----------
+        en_disco : Dict[str, os.stat_result]
+            Resultado de os.stat de cada PDF que hay ahora en disco.
+        eliminados : List[str]
+            PDF del índice que ya no existen.
+        pendientes : List[str]
+            PDF que se han procesado.
+        resultados : List[Any]
+            Resultado de 'crear_miniatura' para cada PDF de 'pendientes'.
+
+        Returns
+        -------
+        int
+            Número de archivos que se han vuelto a procesar.
+        """
+        # Se construye un diccionario nuevo y se sustituye de una vez: las consultas
+        # desde el bucle de eventos nunca ven el índice a medias
+        documentos = {clave: documento for clave, documento in self._documentos.items() if clave in en_disco}
+        for clave, (hash_actual, creada) in zip(pendientes, resultados):
+            stat = en_disco[clave]
+            documentos[clave] = {"tamano": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                 "hash": hash_actual if creada else None}
+        self._documentos = documentos
+        self._borrar_sobrantes()
+        return len(pendientes)
+
+    def _borrar_sobrantes(self) -> None:
+        """
+        Borra del disco las miniaturas que ya no corresponden a ningún PDF.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        en_uso = {f"{documento['hash']}.jpg" for documento in self._documentos.values() if documento["hash"]}
+        for nombre in os.listdir(self.dir_miniaturas) if os.path.isdir(self.dir_miniaturas) else []:
+            if nombre.endswith(".jpg") and nombre not in en_uso:
+                try:
+                    os.remove(os.path.join(self.dir_miniaturas, nombre))
+                except OSError as e:
+                    logger.warning(f"No se pudo borrar la miniatura {nombre}: {e}")
+
+
+# Instancia única de las miniaturas que comparten todos los manejadores
+miniaturas = Miniaturas(THUMBNAIL_DIR, THUMBNAIL_INDEX_PATH, THUMBNAIL_SIZE, THUMBNAIL_QUALITY, THUMBNAIL_WORKERS)
@@ -0,0 +1,419 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from disco import en_hilo
+from log.logger import logger
+
+
+class PersistenciaSQLite(BasePersistence):
+    """
+    Persistencia de user_data, chat_data y bot_data en SQLite (modo WAL).
+
+    PTB ya agrupa los cambios: cada 'update_interval' segundos pasa los
+    datos de los usuarios y chats que han cambiado. Aquí esos cambios se
+    acumulan y se escriben todos juntos en una sola transacción desde el
+    pool de disco, sin bloquear el bucle de eventos. Los datos que no han
+    cambiado (bot_data se pasa siempre) no se vuelven a escribir.
+    """
+
+    def __init__(self, ruta_db: str, intervalo: float = 30) -> None:
+        """
+        Parameters
+        ----------
+        ruta_db : str
+            Ruta del archivo SQLite.
+        intervalo : float
+            Segundos entre dos escrituras de los datos modificados.
+
+        Returns
+        -------
+        None
+        """
+        super().__init__(store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True,
+                                                     callback_data=False),
+                         update_interval=intervalo)
+        os.makedirs(os.path.dirname(ruta_db) or ".", exist_ok=True)
+        # Se escribe desde el pool de disco, siempre con el lock adquirido
+        self._conexion = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS estado ("
+            "tipo TEXT NOT NULL, id INTEGER NOT NULL, datos BLOB NOT NULL, PRIMARY KEY (tipo, id))"
+        )
+        self._conexion.commit()
+        self._lock = threading.Lock()
+        # Lo último que hay (o habrá) en disco de cada clave, para no reescribir datos iguales
+        self._escrito: Dict[Tuple[str, int], bytes] = {}
+        # Cambios pendientes de escribir: clave -> datos serializados (None = borrar)
+        self._pendientes: Dict[Tuple[str, int], Optional[bytes]] = {}
+        self._volcado: Optional[asyncio.Task] = None
+
+    def _cargar(self, tipo: str) -> Dict[int, dict]:
+        """
+        Lee de la base de datos todos los datos de un tipo.
+
+        Parameters
+        ----------
+        tipo : str
+            'user', 'chat' o 'bot'.
+
+        Returns
+        -------
+        Dict[int, dict]
+            Datos de cada id.
+        """
+        datos = {}
+        with self._lock:
+            filas = self._conexion.execute("SELECT id, datos FROM estado WHERE tipo = ?", (tipo,)).fetchall()
+        for id_, blob in filas:
+            try:
+                datos[id_] = pickle.loads(blob)
+                self._escrito[(tipo, id_)] = blob
+            except Exception as e:
+                logger.warning(f"No se pudieron cargar los datos guardados de {tipo} {id_}: {e}")
+        return datos
+
+    # Interfaz de BasePersistence
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        """
+        Devuelve los user_data guardados (PTB lo llama una vez al arrancar).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[int, dict]
+            Datos de cada usuario.
+        """
+        return self._cargar("user")
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        """
+        Devuelve los chat_data guardados (PTB lo llama una vez al arrancar).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[int, dict]
+            Datos de cada chat.
+        """
+        return self._cargar("chat")
+
+    async def get_bot_data(self) -> dict:
+        """
+        Devuelve el bot_data guardado (PTB lo llama una vez al arrancar).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            Datos del bot (vacío si no hay nada guardado).
+        """
+        return self._cargar("bot").get(0, {})
+
+    async def get_callback_data(self) -> None:
+        """
+        No se guardan datos de callback.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        """
+        El bot no usa ConversationHandler: no hay conversaciones guardadas.
+
+        Parameters
+        ----------
+        name : str
+            Nombre del ConversationHandler.
+
+        Returns
+        -------
+        dict
+            Siempre vacío.
+        """
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        """
+        El bot no usa ConversationHandler: no hay nada que guardar.
+
+        Parameters
+        ----------
+        name : str
+            Nombre del ConversationHandler.
+        key : tuple
+            Clave de la conversación.
+        new_state : Optional[object]
+            Nuevo estado de la conversación.
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        """
+        Apunta los user_data modificados de un usuario.
+
+        Parameters
+        ----------
+        user_id : int
+            Identificador del usuario.
+        data : dict
+            Datos del usuario.
+
+        Returns
+        -------
+        None
+        """
+        self._anotar(("user", user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        """
+        Apunta los chat_data modificados de un chat.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        data : dict
+            Datos del chat.
+
+        Returns
+        -------
+        None
+        """
+        self._anotar(("chat", chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        """
+        Apunta el bot_data (solo se escribe si ha cambiado).
+
+        Parameters
+        ----------
+        data : dict
+            Datos del bot.
+
+        Returns
+        -------
+        None
+        """
+        self._anotar(("bot", 0), data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        """
+        No se guardan datos de callback.
+
+        Parameters
+        ----------
+        data : Any
+            Datos de callback de PTB.
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        """
+        Apunta el borrado de los user_data de un usuario.
+
+        Parameters
+        ----------
+        user_id : int
+            Identificador del usuario.
+
+        Returns
+        -------
+        None
+        """
+        self._anotar(("user", user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        """
+        Apunta el borrado de los chat_data de un chat.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+
+        Returns
+        -------
+        None
+        """
+        self._anotar(("chat", chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """
+        Los datos en memoria son siempre los más recientes: no hay nada que refrescar.
+
+        Parameters
+        ----------
+        user_id : int
+            Identificador del usuario.
+        user_data : dict
+            Datos del usuario en memoria.
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        """
+        Los datos en memoria son siempre los más recientes: no hay nada que refrescar.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        chat_data : dict
+            Datos del chat en memoria.
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        """
+        Los datos en memoria son siempre los más recientes: no hay nada que refrescar.
+
+        Parameters
+        ----------
+        bot_data : dict
+            Datos del bot en memoria.
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    async def flush(self) -> None:
+        """
+        Escribe lo que quede pendiente (PTB lo llama al detener la aplicación).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._volcado is not None:
+            await self._volcado
+        self._escribir(self._sacar_pendientes())
+        with self._lock:
+            self._conexion.close()
+
+    def _anotar(self, clave: Tuple[str, int], data: Optional[dict]) -> None:
+        """
+        Apunta un cambio y programa la escritura del lote (una por pasada de PTB).
+
+        Parameters
+        ----------
+        clave : Tuple[str, int]
+            Tipo ('user', 'chat' o 'bot') e id.
+        data : Optional[dict]
+            Datos nuevos, o None si hay que borrarlos.
+
+        Returns
+        -------
+        None
+        """
+        blob = None if data is None else pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        if blob is not None and self._escrito.get(clave) == blob:
+            return
+        if blob is None and clave not in self._escrito:
+            return
+        self._pendientes[clave] = blob
+        if blob is None:
+            self._escrito.pop(clave, None)
+        else:
+            self._escrito[clave] = blob
+        if self._volcado is None or self._volcado.done():
+            self._volcado = asyncio.get_running_loop().create_task(self._volcar())
+
+    async def _volcar(self) -> None:
+        """
+        Espera a que PTB termine de pasar los cambios de esta pasada y los escribe en el pool de disco.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        await asyncio.sleep(0)
+        try:
+            await en_hilo(self._escribir, self._sacar_pendientes())
+        except Exception as e:
+            logger.error(f"Error al guardar el estado de los usuarios: {e}")
+
+    def _sacar_pendientes(self) -> Dict[Tuple[str, int], Optional[bytes]]:
+        """
+        Devuelve los cambios pendientes y vacía la lista.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[Tuple[str, int], Optional[bytes]]
+            Cambios pendientes.
+        """
+        pendientes, self._pendientes = self._pendientes, {}
+        return pendientes
+
+    def _escribir(self, pendientes: Dict[Tuple[str, int], Optional[bytes]]) -> None:
+        """
+        Escribe un lote de cambios en una sola transacción.
+
+        Parameters
+        ----------
+        pendientes : Dict[Tuple[str, int], Optional[bytes]]
+            Cambios a escribir.
+
+        Returns
+        -------
+        None
+        """
+        if not pendientes:
+            return
+        with self._lock, self._conexion:
+            self._conexion.executemany("INSERT OR REPLACE INTO estado (tipo, id, datos) VALUES (?, ?, ?)",
+                                       [(t, i, b) for (t, i), b in pendientes.items() if b is not None])
+            self._conexion.executemany("DELETE FROM estado WHERE tipo = ? AND id = ?",
+                                       [(t, i) for (t, i), b in pendientes.items() if b is None])
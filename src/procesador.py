@@ -0,0 +1,517 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from limitador import PRIORIDAD_LIMPIEZA
+from texto import clave_consulta
+from log.logger import logger
+
+
+# Prioridad de las actualizaciones: los botones y comandos pasan antes que las búsquedas
+PRIORIDAD_ALTA = 0
+PRIORIDAD_BAJA = 1
+
+# Respuesta a las búsquedas que se descartan porque el bot está saturado
+MENSAJE_OCUPADO = "⏳ Ahora mismo hay muchas búsquedas en curso. Inténtalo de nuevo en unos segundos."
+# Segundos mínimos entre dos avisos de 'ocupado' al mismo chat (si el intervalo de rebote es menor)
+INTERVALO_MINIMO_AVISOS = 1.0
+
+
+class SemaforoPrioridad:
+    """
+    Semáforo que, cuando no quedan plazas, las va dando a quien espera con
+    menor prioridad (y, a igual prioridad, por orden de llegada).
+    """
+
+    def __init__(self, valor: int) -> None:
+        """
+        Parameters
+        ----------
+        valor : int
+            Número de plazas.
+
+        Returns
+        -------
+        None
+        """
+        self._libres = valor
+        # Montículo de (prioridad, orden de llegada, futuro que se completa al dar la plaza)
+        self._esperando: List[Tuple[int, int, asyncio.Future]] = []
+        self._orden = itertools.count()
+
+    def pedir(self, prioridad: int) -> asyncio.Future:
+        """
+        Pide una plaza (hay que esperarla con 'esperar').
+
+        Parameters
+        ----------
+        prioridad : int
+            Prioridad de quien la pide (menor = antes).
+
+        Returns
+        -------
+        asyncio.Future
+            Futuro que se completa al dar la plaza (ya completado si había una libre).
+        """
+        plaza = asyncio.get_running_loop().create_future()
+        if self._libres > 0 and not self._esperando:
+            self._libres -= 1
+            plaza.set_result(None)
+        else:
+            heapq.heappush(self._esperando, (prioridad, next(self._orden), plaza))
+        return plaza
+
+    def adelantar(self, plaza: asyncio.Future, prioridad: int) -> None:
+        """
+        Sube la prioridad de una plaza que todavía se está esperando.
+
+        Parameters
+        ----------
+        plaza : asyncio.Future
+            Plaza devuelta por 'pedir'.
+        prioridad : int
+            Nueva prioridad (la entrada antigua se queda en el montículo y se
+            salta cuando le toca, porque la plaza ya estará dada).
+
+        Returns
+        -------
+        None
+        """
+        if not plaza.done():
+            heapq.heappush(self._esperando, (prioridad, next(self._orden), plaza))
+
+    async def esperar(self, plaza: asyncio.Future) -> None:
+        """
+        Espera a que se dé una plaza pedida.
+
+        Parameters
+        ----------
+        plaza : asyncio.Future
+            Plaza devuelta por 'pedir'.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            await plaza
+        except asyncio.CancelledError:
+            # Si ya se le había dado la plaza, se pasa al siguiente
+            if plaza.done() and not plaza.cancelled():
+                self.liberar()
+            raise
+
+    def liberar(self) -> None:
+        """
+        Devuelve una plaza: se la queda el primero que espera, si hay alguno.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        while self._esperando:
+            plaza = heapq.heappop(self._esperando)[2]
+            if not plaza.done():
+                plaza.set_result(None)
+                return
+        self._libres += 1
+
+
+class EstadoChat:
+    """Turno de un chat con actualizaciones en curso o esperando turno."""
+
+    __slots__ = ("turno", "pendientes", "urgentes", "plaza")
+
+    def __init__(self) -> None:
+        """
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        # Un Lock atiende a quien espera en orden de llegada
+        self.turno = asyncio.Lock()
+        # Actualizaciones en curso o esperando turno, y cuántas de ellas tienen prioridad alta
+        self.pendientes = 0
+        self.urgentes = 0
+        # Plaza de ejecución que espera la actualización a la que le toca el turno (None si no espera)
+        self.plaza: Optional[asyncio.Future] = None
+
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """
+    Procesa a la vez las actualizaciones de chats distintos, pero una detrás
+    de otra (en el orden en que llegan) las de un mismo chat. Así el envío
+    lento de una receta no hace esperar a los demás usuarios, y un 'reset' no
+    se cruza con el '/start' que el mismo usuario pulsa justo después.
+
+    Como mucho se ejecutan 'max_concurrentes' actualizaciones a la vez y,
+    cuando hay que esperar, los botones y comandos pasan antes que las
+    búsquedas. Cada chat puede tener como mucho 'max_pendientes_chat'
+    actualizaciones en curso o esperando turno. Con más de 'umbral_descarte'
+    actualizaciones pendientes en total se descartan las búsquedas (con un
+    aviso de que el bot está ocupado) y con 'limite_cola' se descarta todo.
+
+    Las búsquedas que un mismo chat envía seguidas (menos de 'intervalo_rebote'
+    segundos entre una y otra) se agrupan: se descarta el mensaje que repite
+    la anterior y, si la anterior aún no ha empezado, solo se atiende la última.
+    A cada chat se le avisa de que el bot está ocupado una vez por intervalo
+    como mucho: cuando está saturado, un aviso por actualización descartada
+    solo añadiría más carga.
+    """
+
+    def __init__(self, max_concurrentes: int, max_pendientes_chat: int, limite_cola: int,
+                 umbral_descarte: int, intervalo_rebote: float = 0) -> None:
+        """
+        Parameters
+        ----------
+        max_concurrentes : int
+            Actualizaciones que se ejecutan a la vez como máximo.
+        max_pendientes_chat : int
+            Actualizaciones de un mismo chat en curso o esperando turno como máximo.
+        limite_cola : int
+            Actualizaciones en curso o esperando turno en total como máximo.
+        umbral_descarte : int
+            Actualizaciones pendientes en total a partir de las que se descartan las búsquedas.
+        intervalo_rebote : float
+            Segundos en los que dos búsquedas seguidas de un chat se agrupan (0 = no se agrupan).
+
+        Returns
+        -------
+        None
+        """
+        # PTB crea una tarea por actualización y las hace esperar en este semáforo, sin límite.
+        # Con una plaza más que la cola, todas llegan a do_process_update, que es quien
+        # decide cuáles esperan y cuáles se descartan
+        super().__init__(limite_cola + 1)
+        self.max_concurrentes = max_concurrentes
+        self.max_pendientes_chat = max_pendientes_chat
+        self.limite_cola = limite_cola
+        self.umbral_descarte = umbral_descarte
+        self.intervalo_rebote = intervalo_rebote
+        # Actualizaciones en curso o esperando turno
+        self.pendientes = 0
+        # Motivo ('chat', 'cola', 'ocupado', 'rebote') -> actualizaciones descartadas
+        self.descartadas: Dict[str, int] = {}
+        self._ejecucion = SemaforoPrioridad(max_concurrentes)
+        self._chats: Dict[int, EstadoChat] = {}
+        # (chat, tipo de búsqueda) -> (número de la última búsqueda, consulta normalizada, instante de llegada)
+        self._busquedas: "OrderedDict[Tuple[int, str], Tuple[int, str, float]]" = OrderedDict()
+        self._numero_busqueda = itertools.count()
+        # Avisos de 'ocupado' en curso (se guarda la referencia para que no se pierdan las tareas)
+        self._avisos: Set[asyncio.Task] = set()
+        # Chat -> instante del último aviso de 'ocupado'
+        self._avisados: "OrderedDict[int, float]" = OrderedDict()
+
+    @staticmethod
+    def clave(update: object) -> Optional[int]:
+        """
+        Devuelve el chat por el que se ordena una actualización.
+
+        Parameters
+        ----------
+        update : object
+            Actualización recibida.
+
+        Returns
+        -------
+        Optional[int]
+            Id del chat (o del usuario, en las consultas inline, que no tienen
+            chat), o None si la actualización no tiene ninguno de los dos.
+        """
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
+
+    @staticmethod
+    def busqueda(update: object) -> Optional[Tuple[str, str]]:
+        """
+        Indica si una actualización es una búsqueda y de qué tipo.
+
+        Parameters
+        ----------
+        update : object
+            Actualización recibida.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            Tipo ('texto' o 'inline') y consulta normalizada, o None si no es
+            una búsqueda (botones, comandos...).
+        """
+        if not isinstance(update, Update):
+            return None
+        if update.inline_query is not None:
+            return "inline", clave_consulta(update.inline_query.query)
+        if update.message is not None and update.message.text and not update.message.text.startswith("/"):
+            return "texto", clave_consulta(update.message.text)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """
+        Descarta la actualización si el bot está saturado o es una búsqueda
+        repetida; si no, espera el turno del chat y un hueco de ejecución y la
+        procesa.
+
+        Parameters
+        ----------
+        update : object
+            Actualización recibida.
+        coroutine : Awaitable[Any]
+            Corrutina que procesa la actualización.
+
+        Returns
+        -------
+        None
+        """
+        busqueda = self.busqueda(update)
+        prioridad = PRIORIDAD_BAJA if busqueda else PRIORIDAD_ALTA
+        if self.pendientes >= self.limite_cola or (busqueda and self.pendientes >= self.umbral_descarte):
+            self._descartar(update, coroutine, "cola" if self.pendientes >= self.limite_cola else "ocupado")
+            return
+
+        clave = self.clave(update)
+        if clave is None:
+            self.pendientes += 1
+            try:
+                await self._ejecutar(coroutine, prioridad)
+            finally:
+                self.pendientes -= 1
+            return
+
+        estado = self._chats.get(clave)
+        if estado is not None and estado.pendientes >= self.max_pendientes_chat:
+            self._descartar(update, coroutine, "chat")
+            return
+
+        numero = None
+        if busqueda and self.intervalo_rebote > 0:
+            numero = self._anotar_busqueda(clave, *busqueda)
+            if numero is None:
+                self._descartar(update, coroutine, "rebote")
+                return
+
+        if estado is None:
+            estado = self._chats[clave] = EstadoChat()
+        estado.pendientes += 1
+        if prioridad == PRIORIDAD_ALTA:
+            estado.urgentes += 1
+            # Si lo que va delante en el chat es una búsqueda esperando hueco, pasa con prioridad
+            # alta: si no, el botón esperaría detrás de ella a que se atiendan todos los demás botones
+            if estado.plaza is not None:
+                self._ejecucion.adelantar(estado.plaza, PRIORIDAD_ALTA)
+        self.pendientes += 1
+        try:
+            async with estado.turno:
+                # Mientras esperaba turno ha llegado otra búsqueda del mismo chat: solo se atiende la última
+                if numero is not None and self._superada(clave, busqueda[0], numero):
+                    self._descartar(update, coroutine, "rebote")
+                    return
+                await self._ejecutar(coroutine, PRIORIDAD_ALTA if estado.urgentes else prioridad, estado)
+        finally:
+            self.pendientes -= 1
+            estado.pendientes -= 1
+            if prioridad == PRIORIDAD_ALTA:
+                estado.urgentes -= 1
+            if estado.pendientes == 0:
+                del self._chats[clave]
+
+    async def _ejecutar(self, coroutine: Awaitable[Any], prioridad: int, estado: Optional[EstadoChat] = None) -> None:
+        """
+        Espera un hueco de ejecución según la prioridad y procesa la actualización.
+
+        Parameters
+        ----------
+        coroutine : Awaitable[Any]
+            Corrutina que procesa la actualización.
+        prioridad : int
+            PRIORIDAD_ALTA o PRIORIDAD_BAJA.
+        estado : Optional[EstadoChat]
+            Turno del chat de la actualización (para que otras puedan adelantar la espera).
+
+        Returns
+        -------
+        None
+        """
+        plaza = self._ejecucion.pedir(prioridad)
+        if estado is not None:
+            estado.plaza = plaza
+        try:
+            await self._ejecucion.esperar(plaza)
+        finally:
+            if estado is not None:
+                estado.plaza = None
+        try:
+            await coroutine
+        finally:
+            self._ejecucion.liberar()
+
+    def _anotar_busqueda(self, clave: int, tipo: str, consulta: str) -> Optional[int]:
+        """
+        Anota la llegada de una búsqueda de un chat.
+
+        Parameters
+        ----------
+        clave : int
+            Chat de la búsqueda.
+        tipo : str
+            'texto' o 'inline'.
+        consulta : str
+            Consulta normalizada.
+
+        Returns
+        -------
+        Optional[int]
+            Número de la búsqueda, o None si es un mensaje que repite la
+            búsqueda anterior del mismo chat (misma consulta hace menos de
+            'intervalo_rebote' segundos).
+        """
+        ahora = time.monotonic()
+        anterior = self._busquedas.get((clave, tipo))
+        # Las consultas inline repetidas (p. ej. al escribir un espacio) sí se responden: si no, el
+        # usuario se quedaría sin resultados si deja de escribir justo ahí
+        if (tipo == "texto" and anterior is not None and anterior[1] == consulta
+                and ahora - anterior[2] < self.intervalo_rebote):
+            return None
+
+        numero = next(self._numero_busqueda)
+        self._busquedas[(clave, tipo)] = (numero, consulta, ahora)
+        self._busquedas.move_to_end((clave, tipo))
+        # Las búsquedas más antiguas que el intervalo ya no agrupan a ninguna otra
+        while self._busquedas:
+            primera = next(iter(self._busquedas.values()))
+            if ahora - primera[2] < self.intervalo_rebote:
+                break
+            self._busquedas.popitem(last=False)
+        return numero
+
+    def _superada(self, clave: int, tipo: str, numero: int) -> bool:
+        """
+        Indica si después de una búsqueda ha llegado otra del mismo chat dentro del intervalo.
+
+        Parameters
+        ----------
+        clave : int
+            Chat de la búsqueda.
+        tipo : str
+            'texto' o 'inline'.
+        numero : int
+            Número de la búsqueda (devuelto por '_anotar_busqueda').
+
+        Returns
+        -------
+        bool
+            True si hay una búsqueda más reciente del mismo chat y tipo.
+        """
+        ultima = self._busquedas.get((clave, tipo))
+        return ultima is not None and ultima[0] != numero
+
+    def _descartar(self, update: object, coroutine: Awaitable[Any], motivo: str) -> None:
+        """
+        Descarta una actualización sin procesarla y, si el bot está saturado,
+        avisa al usuario en segundo plano.
+
+        Parameters
+        ----------
+        update : object
+            Actualización descartada.
+        coroutine : Awaitable[Any]
+            Corrutina que la habría procesado (se cierra sin ejecutarla).
+        motivo : str
+            'chat', 'cola', 'ocupado' o 'rebote'.
+
+        Returns
+        -------
+        None
+        """
+        self.descartadas[motivo] = self.descartadas.get(motivo, 0) + 1
+        if asyncio.iscoroutine(coroutine):
+            coroutine.close()
+        if motivo == "rebote":
+            return
+
+        logger.warning(f"Actualización descartada ({motivo}), {self.pendientes} pendientes",
+                       extra={"muestrear": True})
+        if motivo in ("cola", "ocupado") and isinstance(update, Update) and self._toca_avisar(update):
+            aviso = asyncio.get_running_loop().create_task(self._avisar_ocupado(update))
+            self._avisos.add(aviso)
+            aviso.add_done_callback(self._avisos.discard)
+
+    def _toca_avisar(self, update: Update) -> bool:
+        """
+        Indica si se puede avisar al chat de una actualización de que el bot
+        está ocupado (no se le ha avisado en el último intervalo) y lo anota.
+
+        Parameters
+        ----------
+        update : Update
+            Actualización descartada.
+
+        Returns
+        -------
+        bool
+            True si hay que avisar.
+        """
+        clave = self.clave(update)
+        if clave is None:
+            return False
+        ahora = time.monotonic()
+        intervalo = max(self.intervalo_rebote, INTERVALO_MINIMO_AVISOS)
+        # Los avisos más antiguos que el intervalo ya no frenan ningún otro
+        while self._avisados:
+            primero = next(iter(self._avisados.values()))
+            if ahora - primero < intervalo:
+                break
+            self._avisados.popitem(last=False)
+        if clave in self._avisados:
+            return False
+        self._avisados[clave] = ahora
+        return True
+
+    @staticmethod
+    async def _avisar_ocupado(update: Update) -> None:
+        """
+        Avisa al usuario de que su actualización no se ha atendido porque el bot está saturado.
+
+        Parameters
+        ----------
+        update : Update
+            Actualización descartada.
+
+        Returns
+        -------
+        None
+        """
+        # Con la prioridad de la limpieza: no compiten con las respuestas a las actualizaciones que sí se atienden
+        try:
+            if update.callback_query is not None:
+                # Quita el reloj del botón pulsado
+                await update.callback_query.answer(MENSAJE_OCUPADO, rate_limit_args=PRIORIDAD_LIMPIEZA)
+            elif update.message is not None:
+                await update.message.reply_text(MENSAJE_OCUPADO, rate_limit_args=PRIORIDAD_LIMPIEZA)
+            # Las consultas inline sin respuesta simplemente no muestran resultados
+        except Exception as e:
+            logger.warning(f"No se pudo avisar de que el bot está ocupado: {e}", extra={"muestrear": True})
+
+    async def initialize(self) -> None:
+        """No necesita preparar nada."""
+        pass
+
+    async def shutdown(self) -> None:
+        """No necesita liberar nada."""
+        pass
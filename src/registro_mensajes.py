@@ -0,0 +1,201 @@
+from collections import OrderedDict, deque
+from typing import Any, Deque, Iterable, List, Optional
+from settings import MESSAGE_LEDGER_PATH, MESSAGE_LEDGER_SIZE, MESSAGE_LEDGER_CHATS, MESSAGE_LEDGER_FLUSH_INTERVAL
+from disco import EscritorDiferido
+
+# Operaciones pendientes de escribir en SQLite
+SQL_ANOTAR = "INSERT OR IGNORE INTO mensajes (chat_id, message_id) VALUES (?, ?)"
+SQL_OLVIDAR = "DELETE FROM mensajes WHERE chat_id = ? AND message_id = ?"
+SQL_VACIAR_CHAT = "DELETE FROM mensajes WHERE chat_id = ?"
+
+
+class RegistroMensajes:
+    """
+    Registro, por chat, de los mensajes que hay en la conversación con el bot
+    (los que envía el bot y los que escribe el usuario), para que el reseteo
+    borre exactamente esos mensajes.
+
+    La memoria está acotada: se guardan como mucho 'max_mensajes' por chat y
+    'max_chats' chats (se olvidan los que llevan más tiempo sin actividad).
+    Opcionalmente se guarda también en SQLite para no perderlo al reiniciar
+    (con escrituras diferidas: se anota un mensaje en cada envío).
+    """
+
+    def __init__(self, ruta_db: Optional[str], max_mensajes: int = 500, max_chats: int = 10000,
+                 intervalo: float = 2.0) -> None:
+        """
+        Parameters
+        ----------
+        ruta_db : Optional[str]
+            Ruta del archivo SQLite, o None para mantener el registro solo en memoria.
+        max_mensajes : int
+            Mensajes que se recuerdan por chat (los más antiguos se olvidan).
+        max_chats : int
+            Chats que se recuerdan.
+        intervalo : float
+            Segundos entre dos escrituras de los cambios acumulados.
+
+        Returns
+        -------
+        None
+        """
+        self.max_mensajes = max_mensajes
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, Deque[int]]" = OrderedDict()
+        self._escritor = None
+        if ruta_db:
+            self._escritor = EscritorDiferido(ruta_db, intervalo, "el registro de mensajes")
+            conexion = self._escritor.conexion
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS mensajes ("
+                "chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, PRIMARY KEY (chat_id, message_id))"
+            )
+            conexion.commit()
+            for chat_id, message_id in conexion.execute("SELECT chat_id, message_id FROM mensajes ORDER BY rowid"):
+                self._anotar_en_memoria(chat_id, message_id)
+
+    def anotar(self, chat_id: int, message_id: int) -> None:
+        """
+        Registra un mensaje de un chat.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        message_id : int
+            Identificador del mensaje.
+
+        Returns
+        -------
+        None
+        """
+        olvidados = self._anotar_en_memoria(chat_id, message_id)
+        if self._escritor is not None:
+            self._escritor.anotar(SQL_ANOTAR, (chat_id, message_id))
+            for par in olvidados:
+                self._escritor.anotar(SQL_OLVIDAR, par)
+
+    def anotar_respuesta(self, endpoint: str, data: dict, resultado: Any) -> None:
+        """
+        Actualiza el registro con el resultado de una llamada a la API: anota
+        los mensajes enviados y olvida los borrados.
+
+        Parameters
+        ----------
+        endpoint : str
+            Método de la API (p. ej. 'sendMessage').
+        data : dict
+            Parámetros de la llamada.
+        resultado : Any
+            Respuesta de Telegram (un mensaje, una lista de mensajes o un booleano).
+
+        Returns
+        -------
+        None
+        """
+        if endpoint.startswith(("send", "forward", "copy")):
+            for mensaje in resultado if isinstance(resultado, list) else [resultado]:
+                if isinstance(mensaje, dict) and "message_id" in mensaje:
+                    self.anotar(mensaje.get("chat", {}).get("id", data.get("chat_id")), mensaje["message_id"])
+        elif endpoint == "deleteMessage" and resultado:
+            self.olvidar(data.get("chat_id"), [data.get("message_id")])
+        elif endpoint == "deleteMessages" and resultado:
+            self.olvidar(data.get("chat_id"), data.get("message_ids", []))
+
+    def extraer(self, chat_id: int) -> List[int]:
+        """
+        Devuelve los mensajes registrados de un chat (del más antiguo al más
+        reciente) y los quita del registro.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+
+        Returns
+        -------
+        List[int]
+            Identificadores de los mensajes.
+        """
+        mensajes = list(self._chats.pop(chat_id, []))
+        if self._escritor is not None:
+            self._escritor.anotar(SQL_VACIAR_CHAT, (chat_id,))
+        return mensajes
+
+    def olvidar(self, chat_id: int, message_ids: Iterable[int]) -> None:
+        """
+        Quita del registro mensajes que ya se han borrado.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        message_ids : Iterable[int]
+            Identificadores de los mensajes.
+
+        Returns
+        -------
+        None
+        """
+        mensajes = self._chats.get(chat_id)
+        if not mensajes:
+            return
+        borrados = set(message_ids) & set(mensajes)
+        if not borrados:
+            return
+        self._chats[chat_id] = deque((m for m in mensajes if m not in borrados), maxlen=self.max_mensajes)
+        if self._escritor is not None:
+            for m in borrados:
+                self._escritor.anotar(SQL_OLVIDAR, (chat_id, m))
+
+    async def guardar(self) -> None:
+        """
+        Escribe ya todo lo pendiente, sin esperar al intervalo (al detener la aplicación).
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self._escritor is not None:
+            await self._escritor.guardar()
+
+    def _anotar_en_memoria(self, chat_id: int, message_id: int) -> List[tuple]:
+        """
+        Añade un mensaje al registro en memoria y aplica los límites de tamaño.
+
+        Parameters
+        ----------
+        chat_id : int
+            Identificador del chat.
+        message_id : int
+            Identificador del mensaje.
+
+        Returns
+        -------
+        List[tuple]
+            Pares (chat_id, message_id) que se han olvidado por falta de espacio.
+        """
+        olvidados = []
+        mensajes = self._chats.get(chat_id)
+        if mensajes is None:
+            mensajes = self._chats[chat_id] = deque(maxlen=self.max_mensajes)
+            while len(self._chats) > self.max_chats:
+                chat_antiguo, mensajes_antiguos = self._chats.popitem(last=False)
+                olvidados.extend((chat_antiguo, m) for m in mensajes_antiguos)
+        else:
+            self._chats.move_to_end(chat_id)
+            if message_id in mensajes:
+                return olvidados
+        if len(mensajes) == self.max_mensajes:
+            olvidados.append((chat_id, mensajes[0]))
+        mensajes.append(message_id)
+        return olvidados
+
+
+# Instancia única del registro que comparten el limitador de envíos y los manejadores
+registro_mensajes = RegistroMensajes(MESSAGE_LEDGER_PATH, MESSAGE_LEDGER_SIZE, MESSAGE_LEDGER_CHATS,
+                                     MESSAGE_LEDGER_FLUSH_INTERVAL)
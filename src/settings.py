@@ -1,6 +1,7 @@
 import os
+import re
 from dotenv import load_dotenv
-from typing import List
+from typing import Set
 from log.logger import logger
 
 
@@ -56,7 +57,15 @@ USER_ID_E = int(os.getenv('USER_ID_E'))
 # ---------------------------------------------------------------
 # USUARIOS AUTORIZADOS
 # ---------------------------------------------------------------
-AUTHORIZED_USERS: List[int] = [USER_ID_R, USER_ID_C, USER_ID_E]
+# Los del .env están siempre autorizados; el resto se añaden en AUTHORIZED_USERS_FILE
+AUTHORIZED_USERS: Set[int] = {USER_ID_R, USER_ID_C, USER_ID_E}
+
+# Archivo con más usuarios autorizados: un id por línea, lo que sigue a '#' es un comentario.
+# Se vuelve a leer sin reiniciar el bot cuando cambia (si no existe, solo valen los del .env)
+AUTHORIZED_USERS_FILE = os.getenv('AUTHORIZED_USERS_FILE', 'usuarios_autorizados.txt')
+
+# Segundos mínimos entre dos comprobaciones de si ha cambiado el archivo
+AUTHORIZED_USERS_REFRESH_INTERVAL = float(os.getenv('AUTHORIZED_USERS_REFRESH_INTERVAL', '10'))
 
 
 # ---------------------------------------------------------------
@@ -66,6 +75,109 @@ WELCOME_MESSAGE = "🍽 *Bienvenido/a al bot de recetas* 🍽"
 UNAUTHORIZED_MESSAGE = "Lo siento, no tienes autorización para usar este bot."
 
 
+# ---------------------------------------------------------------
+# ENVÍO DE RECETAS
+# ---------------------------------------------------------------
+# Modo de mostrar el progreso al enviar una receta:
+#   "accion"    -> indicador de Telegram "enviando archivo" (termina al llegar el documento)
+#   "animacion" -> barra de progreso simulada (añade 5 segundos y 10 ediciones por envío)
+PROGRESS_MODE = os.getenv('PROGRESS_MODE', 'accion')
+
+
+# ---------------------------------------------------------------
+# RECEPCIÓN DE ACTUALIZACIONES
+# ---------------------------------------------------------------
+# Modo en que el bot recibe las actualizaciones de Telegram:
+#   "polling" -> consulta continua a Telegram (no necesita puerto abierto)
+#   "webhook" -> Telegram envía cada actualización por HTTPS al servidor del bot
+SERVING_MODE = os.getenv('SERVING_MODE', 'polling')
+
+# URL pública a la que Telegram envía las actualizaciones (p. ej. https://dominio/recetas)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+
+# Dirección, puerto y ruta en los que escucha el servidor del webhook (detrás del proxy)
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'recetas')
+
+# Token secreto que Telegram manda en la cabecera X-Telegram-Bot-Api-Secret-Token;
+# el servidor rechaza (403) las peticiones que no lo llevan
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Actualizaciones que se procesan a la vez (las de un mismo chat se procesan siempre en orden)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
+
+# Actualizaciones de un mismo chat en curso o esperando turno; las que lleguen por encima se descartan
+CHAT_QUEUE_LIMIT = int(os.getenv('CHAT_QUEUE_LIMIT', '20'))
+
+# Actualizaciones en curso o esperando turno en total. Por encima de UPDATE_QUEUE_SHED_THRESHOLD las búsquedas
+# se descartan con un aviso de que el bot está ocupado (los botones se siguen atendiendo, y antes que las
+# búsquedas); por encima de UPDATE_QUEUE_LIMIT se descarta todo lo que llegue
+UPDATE_QUEUE_LIMIT = int(os.getenv('UPDATE_QUEUE_LIMIT', '1000'))
+UPDATE_QUEUE_SHED_THRESHOLD = int(os.getenv('UPDATE_QUEUE_SHED_THRESHOLD', '200'))
+
+# Segundos en los que las búsquedas seguidas de un mismo chat se agrupan: se ignora la repetida y, si la
+# anterior aún esperaba turno, solo se atiende la última (0 = no se agrupan)
+SEARCH_DEBOUNCE = float(os.getenv('SEARCH_DEBOUNCE', '1.0'))
+
+if SERVING_MODE not in ('polling', 'webhook'):
+    logger.error(f"SERVING_MODE '{SERVING_MODE}' no válido")
+    raise ValueError(f"SERVING_MODE debe ser 'polling' o 'webhook', no '{SERVING_MODE}'")
+
+if SERVING_MODE == 'webhook':
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        logger.error("En modo webhook hay que definir WEBHOOK_URL y WEBHOOK_SECRET en el archivo .env")
+        raise ValueError("Faltan WEBHOOK_URL o WEBHOOK_SECRET en el archivo .env")
+    # Telegram solo admite 1-256 caracteres A-Z, a-z, 0-9, _ y -
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+        logger.error("WEBHOOK_SECRET contiene caracteres no permitidos")
+        raise ValueError("WEBHOOK_SECRET solo puede tener 1-256 caracteres A-Z, a-z, 0-9, _ y -")
+
+
+# ---------------------------------------------------------------
+# LÍMITES DE ENVÍO A TELEGRAM
+# ---------------------------------------------------------------
+# Llamadas a la API en total en cualquier segundo (Telegram permite unas 30) y cuántas de ellas pueden
+# salir seguidas tras un rato sin llamadas (las demás se reparten a lo largo del segundo)
+RATE_LIMIT_GLOBAL = float(os.getenv('RATE_LIMIT_GLOBAL', '30'))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv('RATE_LIMIT_GLOBAL_BURST', '3'))
+
+# Mensajes por segundo en un mismo chat y ráfaga que se permite antes de frenar
+RATE_LIMIT_CHAT = float(os.getenv('RATE_LIMIT_CHAT', '1'))
+RATE_LIMIT_CHAT_BURST = float(os.getenv('RATE_LIMIT_CHAT_BURST', '3'))
+
+# Reintentos de una llamada rechazada por Telegram con RetryAfter
+RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', '3'))
+
+
+# ---------------------------------------------------------------
+# MÉTRICAS
+# ---------------------------------------------------------------
+# Puerto local en el que se publican las métricas en formato Prometheus (0 = desactivadas)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+
+# ---------------------------------------------------------------
+# BÚSQUEDA DE RECETAS
+# ---------------------------------------------------------------
+# Número máximo de resultados por búsqueda (por nombre y por contenido)
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', '20'))
+
+# Número de recetas por página en los teclados de categorías y de resultados
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '8'))
+
+# Búsquedas distintas (por consulta normalizada) y teclados que se guardan en las cachés LRU en memoria
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '2048'))
+MENU_CACHE_SIZE = int(os.getenv('MENU_CACHE_SIZE', '1024'))
+
+# Búsqueda inline ('@bot lentejas' desde cualquier chat; hay que activar el modo inline en @BotFather).
+# Telegram admite como mucho 50 resultados por respuesta
+INLINE_RESULTS = min(int(os.getenv('INLINE_RESULTS', '50')), 50)
+# Segundos que Telegram puede reutilizar una respuesta sin volver a preguntar al bot
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+
+
 # ---------------------------------------------------------------
 # RUTA BASE DE ARCHIVOS
 # ---------------------------------------------------------------
@@ -79,3 +191,84 @@ if not os.path.isdir(BASE_DIR):
     raise FileNotFoundError(f"La ruta de recetas '{BASE_DIR}' no existe.")
 
 logger.info(f"Base de datos de recetas ubicada en: {BASE_DIR}")
+
+# Segundos mínimos entre dos comprobaciones de cambios en el catálogo de recetas
+CATALOG_REFRESH_INTERVAL = float(os.getenv('CATALOG_REFRESH_INTERVAL', '5'))
+
+# Segundos entre dos repasos de todos los PDF (índice de texto, miniaturas y versiones optimizadas)
+# aunque no cambie el catálogo: sobrescribir un PDF no cambia el mtime de su directorio
+PDF_RESCAN_INTERVAL = float(os.getenv('PDF_RESCAN_INTERVAL', '300'))
+
+
+# ---------------------------------------------------------------
+# ACCESO A DISCO
+# ---------------------------------------------------------------
+# Hilos para las lecturas de disco de los manejadores (listar recetas, leer PDF...)
+IO_WORKERS = int(os.getenv('IO_WORKERS', '4'))
+
+# Bytes que se leen de una vez al cargar un PDF
+IO_CHUNK_SIZE = int(os.getenv('IO_CHUNK_SIZE', str(1 << 20)))
+
+
+# ---------------------------------------------------------------
+# CACHÉS EN DISCO
+# ---------------------------------------------------------------
+# Directorio donde se guardan las cachés del bot (file_id de Telegram, índices...)
+# CACHE_DIR = "../cache" <--- Para server
+CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+
+# Base de datos con los file_id de Telegram de cada receta ya subida
+FILE_ID_CACHE_PATH = os.path.join(CACHE_DIR, 'file_ids.sqlite3')
+
+# Identificadores numéricos de categorías y recetas que se usan en los botones
+ID_TABLE_PATH = os.path.join(CACHE_DIR, 'ids.sqlite3')
+
+# Registro de los mensajes de cada chat que se borran al reiniciar (vacío = solo en memoria)
+MESSAGE_LEDGER_PATH = os.getenv('MESSAGE_LEDGER_PATH', os.path.join(CACHE_DIR, 'mensajes.sqlite3'))
+
+# Mensajes que se recuerdan por chat y número de chats que se recuerdan
+MESSAGE_LEDGER_SIZE = int(os.getenv('MESSAGE_LEDGER_SIZE', '500'))
+MESSAGE_LEDGER_CHATS = int(os.getenv('MESSAGE_LEDGER_CHATS', '10000'))
+
+# Segundos entre dos escrituras del registro de mensajes en disco (los cambios se acumulan entre tanto)
+MESSAGE_LEDGER_FLUSH_INTERVAL = float(os.getenv('MESSAGE_LEDGER_FLUSH_INTERVAL', '2'))
+
+# Estado de los usuarios y chats (user_data, chat_data y bot_data) y segundos entre escrituras
+PERSISTENCE_PATH = os.path.join(CACHE_DIR, 'estado.sqlite3')
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '30'))
+
+# Índice invertido con el texto de los PDF (búsqueda por ingredientes)
+TEXT_INDEX_PATH = os.path.join(CACHE_DIR, 'indice_texto.json')
+
+# Procesos para extraer el texto de los PDF (0 = uno por CPU)
+INDEX_WORKERS = int(os.getenv('INDEX_WORKERS', '0')) or None
+
+# Miniaturas JPEG de la primera página de cada receta (con el hash del PDF como nombre)
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, 'miniaturas')
+THUMBNAIL_INDEX_PATH = os.path.join(CACHE_DIR, 'miniaturas.json')
+
+# Lado mayor de las miniaturas en píxeles (Telegram admite hasta 320) y calidad JPEG
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '320'))
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+
+# Procesos para dibujar las miniaturas (0 = uno por CPU)
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '0')) or None
+
+
+# ---------------------------------------------------------------
+# VERSIONES OPTIMIZADAS DE LOS PDF
+# ---------------------------------------------------------------
+# Directorio, junto al de recetas, con las versiones ligeras de los PDF (misma estructura de carpetas)
+OPTIMIZED_DIR = os.getenv('OPTIMIZED_DIR', os.path.join(os.path.dirname(os.path.normpath(BASE_DIR)),
+                                                        'recetas_optimizadas'))
+OPTIMIZED_INDEX_PATH = os.path.join(CACHE_DIR, 'variantes.json')
+
+# Lado mayor en píxeles de las imágenes (páginas escaneadas) y calidad JPEG con que se recomprimen
+OPTIMIZE_MAX_SIDE = int(os.getenv('OPTIMIZE_MAX_SIDE', '1600'))
+OPTIMIZE_QUALITY = int(os.getenv('OPTIMIZE_QUALITY', '70'))
+
+# Fracción mínima del tamaño que hay que ahorrar para enviar la versión optimizada en lugar del original
+OPTIMIZE_MIN_SAVING = float(os.getenv('OPTIMIZE_MIN_SAVING', '0.1'))
+
+# Procesos para optimizar los PDF (0 = uno por CPU)
+OPTIMIZE_WORKERS = int(os.getenv('OPTIMIZE_WORKERS', '0')) or None
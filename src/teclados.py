@@ -0,0 +1,268 @@
+import math
+from typing import Hashable, List, Sequence, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from settings import PAGE_SIZE
+from catalogo import catalogo
+from cache_lru import CacheLRU, cache_menus
+from miniaturas import miniaturas
+
+
+def boton_receta(categoria: str, receta: str) -> InlineKeyboardButton:
+    """
+    Crea el botón que envía una receta.
+
+    Parameters
+    ----------
+    categoria : str
+        Nombre de la categoría.
+    receta : str
+        Nombre del archivo PDF.
+
+    Returns
+    -------
+    InlineKeyboardButton
+        Botón con el nombre de la receta (el callback_data lleva solo su identificador).
+    """
+    return InlineKeyboardButton(f" - {receta.replace('.pdf', '').capitalize()}",
+                                callback_data=f"receta|{catalogo.ids.id_receta(categoria, receta)}")
+
+
+def fila_receta(categoria: str, receta: str) -> List[InlineKeyboardButton]:
+    """
+    Crea la fila de una receta: el botón que la envía y, si ya tiene miniatura,
+    otro que muestra la vista previa (una imagen pequeña en lugar del PDF).
+
+    Parameters
+    ----------
+    categoria : str
+        Nombre de la categoría.
+    receta : str
+        Nombre del archivo PDF.
+
+    Returns
+    -------
+    List[InlineKeyboardButton]
+        Botones de la fila.
+    """
+    fila = [boton_receta(categoria, receta)]
+    if miniaturas.tiene(categoria, receta):
+        fila.append(InlineKeyboardButton("👁", callback_data=f"vista|{catalogo.ids.id_receta(categoria, receta)}"))
+    return fila
+
+
+def paginar(elementos: Sequence, pagina: int) -> Tuple[Sequence, int, int]:
+    """
+    Devuelve solo los elementos de una página.
+
+    Parameters
+    ----------
+    elementos : Sequence
+        Lista completa.
+    pagina : int
+        Página pedida (empezando en 0). Se ajusta si está fuera de rango.
+
+    Returns
+    -------
+    Tuple[Sequence, int, int]
+        Elementos de la página, página ajustada y número total de páginas.
+    """
+    total_paginas = max(1, math.ceil(len(elementos) / PAGE_SIZE))
+    pagina = min(max(pagina, 0), total_paginas - 1)
+    return elementos[pagina * PAGE_SIZE:(pagina + 1) * PAGE_SIZE], pagina, total_paginas
+
+
+def completar_teclado(keyboard: List[List[InlineKeyboardButton]], prefijo: str,
+                      pagina: int, total_paginas: int) -> InlineKeyboardMarkup:
+    """
+    Añade al teclado los botones de página anterior/siguiente (si hacen falta)
+    y los de volver al menú principal y reiniciar.
+
+    Parameters
+    ----------
+    keyboard : List[List[InlineKeyboardButton]]
+        Filas con los botones de las recetas de la página.
+    prefijo : str
+        Comienzo del callback_data de la navegación; se le añade el número de página.
+    pagina : int
+        Página actual (empezando en 0).
+    total_paginas : int
+        Número total de páginas.
+
+    Returns
+    -------
+    InlineKeyboardMarkup
+        Teclado completo.
+    """
+    navegacion = []
+    if pagina > 0:
+        navegacion.append(InlineKeyboardButton("◀️ Anterior", callback_data=f"{prefijo}{pagina - 1}"))
+    if pagina < total_paginas - 1:
+        navegacion.append(InlineKeyboardButton("Siguiente ▶️", callback_data=f"{prefijo}{pagina + 1}"))
+    if navegacion:
+        keyboard.append(navegacion)
+
+    keyboard.append([InlineKeyboardButton("⬅️ Volver al menú principal", callback_data="volver")])
+    keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def pagina_resultados(resultados: Sequence[Tuple[str, str]], pagina: int) -> Tuple[InlineKeyboardMarkup, int, int]:
+    """
+    Construye el teclado de una página de resultados de búsqueda.
+
+    Parameters
+    ----------
+    resultados : Sequence[Tuple[str, str]]
+        Pares (categoria, receta) encontrados.
+    pagina : int
+        Página pedida (empezando en 0).
+
+    Returns
+    -------
+    Tuple[InlineKeyboardMarkup, int, int]
+        Teclado, página ajustada y número total de páginas.
+    """
+    visibles, pagina, total_paginas = paginar(resultados, pagina)
+    keyboard = [fila_receta(categoria, receta) for categoria, receta in visibles]
+    return completar_teclado(keyboard, "busqueda|", pagina, total_paginas), pagina, total_paginas
+
+
+class CacheTeclados:
+    """
+    Teclados ya construidos (menú principal, páginas de categorías y de
+    resultados), guardados en la caché LRU de menús. Cada teclado se guarda
+    con la versión de los datos que muestra, así que al cambiar las recetas
+    o aparecer miniaturas nuevas se vuelven a construir solos.
+    """
+
+    def __init__(self, cache: CacheLRU) -> None:
+        """
+        Parameters
+        ----------
+        cache : CacheLRU
+            Caché donde se guardan los teclados.
+
+        Returns
+        -------
+        None
+        """
+        self._cache = cache
+
+    def menu_principal(self) -> InlineKeyboardMarkup:
+        """
+        Devuelve el teclado del menú principal con las categorías en dos columnas.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        InlineKeyboardMarkup
+            Teclado del menú principal.
+        """
+        return self._cache.obtener(("principal",), catalogo.version, self._construir_menu_principal)
+
+    @staticmethod
+    def _construir_menu_principal() -> InlineKeyboardMarkup:
+        """
+        Construye el teclado del menú principal.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        InlineKeyboardMarkup
+            Teclado del menú principal.
+        """
+        keyboard = []
+        row = []
+        for i, categoria in enumerate(catalogo.categorias(), 1):
+            row.append(InlineKeyboardButton(f"📂 {categoria.capitalize()}",
+                                            callback_data=f"categoria|{catalogo.ids.id_categoria(categoria)}"))
+            if i % 2 == 0:
+                keyboard.append(row)
+                row = []
+        if row:
+            keyboard.append(row)
+
+        # Agregar un botón para buscar recetas y el botón de reiniciar
+        keyboard.append([InlineKeyboardButton("🔍 Buscar recetas", callback_data="buscar_recetas")])
+        keyboard.append([InlineKeyboardButton("❌ Reiniciar el bot", callback_data="reset")])
+        return InlineKeyboardMarkup(keyboard)
+
+    def pagina_categoria(self, categoria: str, pagina: int) -> Tuple[InlineKeyboardMarkup, int, int]:
+        """
+        Devuelve el teclado de una página de recetas de una categoría.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        pagina : int
+            Página pedida (empezando en 0).
+
+        Returns
+        -------
+        Tuple[InlineKeyboardMarkup, int, int]
+            Teclado, página ajustada y número total de páginas.
+        """
+        return self._cache.obtener(("categoria", categoria, pagina), (catalogo.version, miniaturas.version),
+                                   lambda: self._construir_pagina_categoria(categoria, pagina))
+
+    @staticmethod
+    def _construir_pagina_categoria(categoria: str, pagina: int) -> Tuple[InlineKeyboardMarkup, int, int]:
+        """
+        Construye el teclado de una página de recetas de una categoría.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        pagina : int
+            Página pedida (empezando en 0).
+
+        Returns
+        -------
+        Tuple[InlineKeyboardMarkup, int, int]
+            Teclado, página ajustada y número total de páginas.
+        """
+        recetas, pagina_real, total_paginas = paginar(catalogo.recetas(categoria), pagina)
+        id_categoria = catalogo.ids.id_categoria(categoria)
+        keyboard = [fila_receta(categoria, receta) for receta in recetas]
+        n_recetas = len(catalogo.recetas(categoria))
+        if n_recetas > 1:
+            keyboard.append([InlineKeyboardButton(f"📦 Enviar todas ({n_recetas})",
+                                                  callback_data=f"todas|{id_categoria}")])
+        reply_markup = completar_teclado(keyboard, f"categoria|{id_categoria}|", pagina_real, total_paginas)
+        return reply_markup, pagina_real, total_paginas
+
+    def pagina_busqueda(self, clave: str, version: Hashable, resultados: Sequence[Tuple[str, str]],
+                        pagina: int) -> Tuple[InlineKeyboardMarkup, int, int]:
+        """
+        Devuelve el teclado de una página de resultados de búsqueda.
+
+        Parameters
+        ----------
+        clave : str
+            Consulta normalizada (ver texto.clave_consulta).
+        version : Hashable
+            Versión de los datos con los que se obtuvieron los resultados.
+        resultados : Sequence[Tuple[str, str]]
+            Pares (categoria, receta) encontrados para esa consulta y versión.
+        pagina : int
+            Página pedida (empezando en 0).
+
+        Returns
+        -------
+        Tuple[InlineKeyboardMarkup, int, int]
+            Teclado, página ajustada y número total de páginas.
+        """
+        return self._cache.obtener(("busqueda", clave, pagina), (version, miniaturas.version),
+                                   lambda: pagina_resultados(resultados, pagina))
+
+
+# Instancia única de la caché de teclados que comparten todos los manejadores
+cache_teclados = CacheTeclados(cache_menus)
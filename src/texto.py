@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from typing import List
+
+
+# Palabras demasiado frecuentes en las recetas como para servir en una búsqueda
+PALABRAS_VACIAS = {
+    "de", "del", "la", "las", "el", "los", "un", "una", "unos", "unas", "y", "o", "e",
+    "con", "sin", "en", "a", "al", "por", "para", "que", "se", "su", "sus", "lo", "le",
+    "es", "muy", "mas", "pero", "si", "como",
+}
+
+_PALABRA = re.compile(r"[a-z0-9ñ]+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Pasa el texto a minúsculas y elimina tildes y diéresis (la 'ñ' se conserva).
+
+    Parameters
+    ----------
+    texto : str
+        Texto original.
+
+    Returns
+    -------
+    str
+        Texto normalizado.
+    """
+    texto = unicodedata.normalize("NFD", texto.lower())
+    # La tilde de la 'ñ' es también un diacrítico combinado, así que se recompone antes de filtrar
+    texto = texto.replace("n\u0303", "\u00f1")
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def clave_consulta(consulta: str) -> str:
+    """
+    Normaliza una consulta para usarla como clave de caché (sin tildes, en
+    minúsculas y con los espacios simplificados).
+
+    Parameters
+    ----------
+    consulta : str
+        Texto escrito por el usuario.
+
+    Returns
+    -------
+    str
+        Consulta normalizada.
+    """
+    return " ".join(normalizar(consulta).split())
+
+
+def tokenizar(texto: str) -> List[str]:
+    """
+    Divide un texto en palabras normalizadas, descartando las palabras vacías
+    y las de un solo carácter.
+
+    Parameters
+    ----------
+    texto : str
+        Texto original.
+
+    Returns
+    -------
+    List[str]
+        Palabras normalizadas en el orden en que aparecen.
+    """
+    return [p for p in _PALABRA.findall(normalizar(texto)) if len(p) > 1 and p not in PALABRAS_VACIAS]
@@ -0,0 +1,112 @@
+import os
+import time
+from typing import Optional, Set
+from settings import AUTHORIZED_USERS, AUTHORIZED_USERS_FILE, AUTHORIZED_USERS_REFRESH_INTERVAL
+from disco import en_hilo
+from log.logger import logger
+
+
+class UsuariosAutorizados:
+    """
+    Conjunto de usuarios autorizados: los del archivo .env más los de un
+    archivo de texto (un id por línea; lo que sigue a '#' se ignora).
+
+    El archivo se vuelve a leer, sin reiniciar el bot, cuando cambia su
+    mtime. La comprobación se hace como mucho una vez cada
+    'intervalo_refresco' segundos y en el pool de disco, así que comprobar
+    un usuario es normalmente una búsqueda en un set.
+    """
+
+    def __init__(self, fijos: Set[int], ruta: Optional[str], intervalo_refresco: float = 10.0) -> None:
+        """
+        Parameters
+        ----------
+        fijos : Set[int]
+            Usuarios que siempre están autorizados (los del archivo .env).
+        ruta : Optional[str]
+            Archivo con más usuarios autorizados (None o inexistente = ninguno más).
+        intervalo_refresco : float
+            Segundos mínimos entre dos comprobaciones de cambios en el archivo.
+
+        Returns
+        -------
+        None
+        """
+        self.fijos = set(fijos)
+        self.ruta = ruta
+        self.intervalo_refresco = intervalo_refresco
+        self._usuarios = frozenset(self.fijos)
+        self._mtime: Optional[float] = None
+        self._ultima_comprobacion = 0.0
+        self.recargar()
+
+    def recargar(self) -> bool:
+        """
+        Vuelve a leer el archivo si ha cambiado desde la última lectura.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True si la lista de usuarios ha cambiado.
+        """
+        self._ultima_comprobacion = time.monotonic()
+        if not self.ruta:
+            return False
+        try:
+            mtime = os.stat(self.ruta).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        usuarios = set(self.fijos)
+        if mtime is not None:
+            try:
+                with open(self.ruta, encoding="utf-8") as f:
+                    for n, linea in enumerate(f, 1):
+                        linea = linea.split("#", 1)[0].strip()
+                        if not linea:
+                            continue
+                        try:
+                            usuarios.add(int(linea))
+                        except ValueError:
+                            logger.warning(f"Línea {n} de {self.ruta} no es un id de usuario: '{linea}'")
+            except OSError as e:
+                # Si no se puede leer, se mantiene la lista anterior
+                logger.error(f"No se pudo leer la lista de usuarios autorizados '{self.ruta}': {e}")
+                return False
+
+        cambiado = usuarios != self._usuarios
+        self._usuarios = frozenset(usuarios)
+        if cambiado:
+            logger.info(f"Lista de usuarios autorizados cargada: {len(self._usuarios)} usuarios")
+        return cambiado
+
+    async def autorizado(self, user_id: int) -> bool:
+        """
+        Indica si un usuario está autorizado (recargando antes el archivo si toca).
+
+        Parameters
+        ----------
+        user_id : int
+            Identificador del usuario de Telegram.
+
+        Returns
+        -------
+        bool
+            True si está autorizado.
+        """
+        if time.monotonic() - self._ultima_comprobacion >= self.intervalo_refresco:
+            # Se marca ya para que las actualizaciones que lleguen mientras tanto no lancen otra lectura
+            self._ultima_comprobacion = time.monotonic()
+            await en_hilo(self.recargar)
+        return user_id in self._usuarios
+
+
+# Instancia única de la lista de usuarios autorizados
+usuarios_autorizados = UsuariosAutorizados(AUTHORIZED_USERS, AUTHORIZED_USERS_FILE, AUTHORIZED_USERS_REFRESH_INTERVAL)
@@ -0,0 +1,266 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from settings import (OPTIMIZED_DIR, OPTIMIZED_INDEX_PATH, OPTIMIZE_MAX_SIDE, OPTIMIZE_QUALITY, OPTIMIZE_MIN_SAVING,
+                      OPTIMIZE_WORKERS)
+from incremental import IndiceIncremental, procesar_en_paralelo
+from log.logger import logger
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from PIL import Image  # noqa: F401 (pypdf la necesita para recomprimir las imágenes)
+except ImportError:
+    # Sin pypdf o sin Pillow se envían siempre los PDF originales
+    PdfWriter = None
+
+
+def optimizar_pdf(ruta: str, destino: str, lado_maximo: int, calidad: int,
+                  ahorro_minimo: float) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Crea una versión más ligera de un PDF. Se ejecuta en el pool de procesos.
+
+    Las imágenes (las páginas escaneadas) se reducen a 'lado_maximo' píxeles
+    y se recomprimen en JPEG, se comprimen los contenidos de las páginas, se
+    eliminan los objetos repetidos y se quitan los metadatos.
+
+    Parameters
+    ----------
+    ruta : str
+        Ruta del PDF original.
+    destino : str
+        Ruta donde se guarda la versión optimizada.
+    lado_maximo : int
+        Tamaño máximo en píxeles del lado mayor de cada imagen.
+    calidad : int
+        Calidad JPEG (1-95) de las imágenes recomprimidas.
+    ahorro_minimo : float
+        Fracción mínima (0-1) del tamaño original que hay que ahorrar para guardar la versión.
+
+    Returns
+    -------
+    Tuple[Optional[int], Optional[str]]
+        Tamaño de la versión optimizada (None si no se ha guardado) y, si el
+        PDF no se ha podido procesar, el motivo (el proceso principal lo anota
+        en el log: desde el pool de procesos no se ve).
+    """
+    try:
+        escritor = PdfWriter(clone_from=PdfReader(ruta))
+        for pagina in escritor.pages:
+            for imagen in pagina.images:
+                contenido = imagen.image
+                # Las imágenes en blanco y negro ya vienen muy comprimidas y las que
+                # tienen transparencia perderían la máscara al sustituirlas
+                if contenido.mode == "1" or "/SMask" in imagen.indirect_reference.get_object():
+                    continue
+                contenido.thumbnail((lado_maximo, lado_maximo))
+                if contenido.mode not in ("RGB", "L"):
+                    contenido = contenido.convert("RGB")
+                imagen.replace(contenido, quality=calidad)
+            pagina.compress_content_streams()
+        # compress_identical_objects falla si el PDF no tiene diccionario /Info (pypdf 5.4): se crea
+        # uno vacío y se quita después junto con el resto de metadatos
+        escritor.add_metadata({})
+        escritor.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+        escritor.metadata = None
+        escritor.xmp_metadata = None
+
+        # Cada proceso escribe su temporal y lo renombra al terminar
+        temporal = f"{destino}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with open(temporal, "wb") as f:
+            escritor.write(f)
+        tamano = os.path.getsize(temporal)
+        if tamano > os.path.getsize(ruta) * (1 - ahorro_minimo):
+            os.remove(temporal)
+            return None, None
+        os.replace(temporal, destino)
+        return tamano, None
+    except Exception as e:
+        # PDF dañado o con imágenes que no se pueden leer: se envía el original
+        return None, f"{type(e).__name__}: {e}"
+
+
+class VariantesPdf(IndiceIncremental):
+    """
+    Versiones optimizadas (más ligeras) de los PDF de las recetas, guardadas
+    con la misma estructura de carpetas que el directorio de recetas.
+
+    Se generan en segundo plano y de forma incremental: solo se vuelven a
+    procesar los PDF cuyo tamaño o mtime han cambiado. Si la versión no
+    ahorra lo suficiente no se guarda y se envía el original.
+    """
+
+    descripcion = "versiones optimizadas"
+
+    def __init__(self, dir_variantes: str, ruta_indice: str, lado_maximo: int = 1600, calidad: int = 70,
+                 ahorro_minimo: float = 0.1, procesos: Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        dir_variantes : str
+            Directorio donde se guardan las versiones optimizadas.
+        ruta_indice : str
+            Archivo JSON con el tamaño y la fecha de cada PDF procesado.
+        lado_maximo : int
+            Tamaño máximo en píxeles del lado mayor de cada imagen.
+        calidad : int
+            Calidad JPEG (1-95) de las imágenes recomprimidas.
+        ahorro_minimo : float
+            Fracción mínima (0-1) del tamaño que hay que ahorrar para usar la versión optimizada.
+        procesos : Optional[int]
+            Número de procesos para optimizar los PDF (None = uno por CPU).
+
+        Returns
+        -------
+        None
+        """
+        super().__init__(ruta_indice, procesos)
+        self.dir_variantes = dir_variantes
+        self.lado_maximo = lado_maximo
+        self.calidad = calidad
+        self.ahorro_minimo = ahorro_minimo
+        # Los documentos guardan también el tamaño de la versión optimizada (None si no hay)
+        self._cargar()
+
+    @property
+    def activas(self) -> bool:
+        """True si están instaladas las librerías para optimizar los PDF."""
+        return PdfWriter is not None
+
+    def ruta(self, categoria: str, receta: str, stat: os.stat_result) -> Optional[str]:
+        """
+        Devuelve la ruta de la versión optimizada de una receta, si existe y
+        corresponde al original actual.
+
+        Parameters
+        ----------
+        categoria : str
+            Nombre de la categoría.
+        receta : str
+            Nombre del archivo PDF.
+        stat : os.stat_result
+            Resultado de os.stat del PDF original (si ha cambiado, la versión ya no vale).
+
+        Returns
+        -------
+        Optional[str]
+            Ruta de la versión optimizada, o None si hay que enviar el original.
+        """
+        documento = self._documentos.get(f"{categoria}/{receta}")
+        if (documento is None or documento["tamano_variante"] is None
+                or documento["tamano"] != stat.st_size or documento["mtime_ns"] != stat.st_mtime_ns):
+            return None
+        return os.path.join(self.dir_variantes, categoria, receta)
+
+    def _procesar(self, base_dir: str, pendientes: List[str], procesos: Optional[int]) -> List[Any]:
+        """
+        Optimiza los PDF nuevos o modificados en el pool de procesos.
+
+        Parameters
+        ----------
+        base_dir : str
+            Ruta donde se encuentran las recetas organizadas por categorías.
+        pendientes : List[str]
+            Rutas relativas 'categoria/receta.pdf' que hay que procesar.
+        procesos : Optional[int]
+            Número de procesos (None = uno por CPU).
+
+        Returns
+        -------
+        List[Any]
+            Tamaño de cada versión optimizada y motivo del error, si lo hay (ver 'optimizar_pdf').
+        """
+        rutas = [os.path.join(base_dir, *clave.split("/", 1)) for clave in pendientes]
+        destinos = [os.path.join(self.dir_variantes, *clave.split("/", 1)) for clave in pendientes]
+        n = len(rutas)
+        return procesar_en_paralelo(optimizar_pdf, procesos, rutas, destinos, [self.lado_maximo] * n,
+                                    [self.calidad] * n, [self.ahorro_minimo] * n)
+
+    def _aplicar(self, en_disco: Dict[str, os.stat_result], eliminados: List[str], pendientes: List[str],
+                 resultados: List[Any]) -> int:
+        """
+        Sustituye el índice de versiones optimizadas por uno nuevo y borra las que ya no valen.
+
+        Parameters
+        ----------
+        en_disco : Dict[str, os.stat_result]
+            Resultado de os.stat de cada PDF que hay ahora en disco.
+        eliminados : List[str]
+            PDF del índice que ya no existen.
+        pendientes : List[str]
+            PDF que se han procesado.
+        resultados : List[Any]
+            Resultado de 'optimizar_pdf' para cada PDF de 'pendientes'.
+
+        Returns
+        -------
+        int
+            Número de archivos que se han vuelto a procesar.
+        """
+        # Se construye un diccionario nuevo y se sustituye de una vez: las consultas
+        # desde el bucle de eventos nunca ven el índice a medias
+        documentos = {clave: documento for clave, documento in self._documentos.items() if clave in en_disco}
+        errores = [(clave, error) for clave, (_, error) in zip(pendientes, resultados) if error is not None]
+        if errores:
+            # Un solo aviso por actualización (si falla algo del entorno fallan todos los PDF)
+            logger.warning(f"No se pudieron optimizar {len(errores)} de {len(pendientes)} PDF, se enviarán los "
+                           f"originales. Primero: {errores[0][0]}: {errores[0][1]}")
+        for clave, (tamano_variante, _) in zip(pendientes, resultados):
+            stat = en_disco[clave]
+            documentos[clave] = {"tamano": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                 "tamano_variante": tamano_variante}
+            if tamano_variante is None:
+                # Una versión anterior de este PDF ya no corresponde al original
+                self._borrar(clave)
+        self._documentos = documentos
+        for clave in eliminados:
+            self._borrar(clave)
+        return len(pendientes)
+
+    def informe(self) -> Dict[str, Tuple[int, int, int]]:
+        """
+        Devuelve, por categoría, cuántos bytes se ahorran enviando las versiones optimizadas.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[str, Tuple[int, int, int]]
+            Para cada categoría: número de recetas optimizadas, bytes de los
+            originales y bytes que se envían (versión optimizada u original).
+        """
+        informe: Dict[str, Tuple[int, int, int]] = {}
+        for clave, documento in self._documentos.items():
+            categoria = clave.split("/", 1)[0]
+            optimizadas, originales, enviados = informe.get(categoria, (0, 0, 0))
+            tamano_variante = documento["tamano_variante"]
+            informe[categoria] = (optimizadas + (tamano_variante is not None),
+                                  originales + documento["tamano"],
+                                  enviados + (tamano_variante if tamano_variante is not None else documento["tamano"]))
+        return informe
+
+    def _borrar(self, clave: str) -> None:
+        """
+        Borra del disco la versión optimizada de una receta, si existe.
+
+        Parameters
+        ----------
+        clave : str
+            Ruta relativa 'categoria/receta.pdf'.
+
+        Returns
+        -------
+        None
+        """
+        try:
+            os.remove(os.path.join(self.dir_variantes, *clave.split("/", 1)))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"No se pudo borrar la versión optimizada de {clave}: {e}")
+
+
+# Instancia única de las versiones optimizadas que comparten todos los manejadores
+variantes_pdf = VariantesPdf(OPTIMIZED_DIR, OPTIMIZED_INDEX_PATH, OPTIMIZE_MAX_SIDE, OPTIMIZE_QUALITY,
+                             OPTIMIZE_MIN_SAVING, OPTIMIZE_WORKERS)